@@ -0,0 +1,319 @@
+"""
+Helper I/O Backup Dramamu
+=========================
+Dipakai export_database.py dan import_database.py:
+- Tulis backup terkompresi (gzip / zstd) secara streaming
+- Checksum SHA-256 + jumlah byte per section (per tabel) untuk manifest
+- Baca backup terkompresi secara transparan (deteksi dari magic bytes)
+- Parse file SQL per statement secara streaming (termasuk section COPY ... FROM stdin)
+
+zstd butuh package `zstandard` (opsional): pip install zstandard
+"""
+
+import gzip
+import hashlib
+import io
+import os
+import re
+
+COMPRESSIONS = {
+    'none': '',
+    'gzip': '.gz',
+    'zstd': '.zst',
+}
+
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+# Buffer file (1 MB) supaya write/read ke disk tidak kecil-kecil
+BUFFER_SIZE = 1024 * 1024
+
+# COPY TO STDOUT menulis per baris; kumpulkan dulu sebelum hash + kompres
+CHUNK_SIZE = 256 * 1024
+
+
+def _require_zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError("Kompresi zstd butuh package zstandard: pip install zstandard")
+    return zstandard
+
+
+def compressed_name(filename, compression):
+    """Tambahkan ekstensi kompresi ke nama file"""
+    return filename + COMPRESSIONS[compression]
+
+
+def sidecar_manifest_path(path):
+    """backup_x.sql(.gz/.zst) → backup_x.manifest.json"""
+    for ext in COMPRESSIONS.values():
+        if ext and path.endswith(ext):
+            path = path[:-len(ext)]
+    if path.endswith('.sql'):
+        path = path[:-len('.sql')]
+    return path + '.manifest.json'
+
+
+class BackupWriter:
+    """
+    Binary writer (opsional terkompresi) yang menghitung checksum
+    dari data *sebelum* dikompresi, baik untuk seluruh file maupun
+    per section (begin_section / end_section).
+
+    Bisa langsung dipakai sebagai target cursor.copy_expert().
+    """
+
+    def __init__(self, path, compression='none', level=None):
+        self.path = path
+        self._raw = open(path, 'wb', buffering=BUFFER_SIZE)
+        if compression == 'gzip':
+            self._stream = gzip.GzipFile(fileobj=self._raw, mode='wb', compresslevel=level or 6)
+        elif compression == 'zstd':
+            zstandard = _require_zstandard()
+            self._stream = zstandard.ZstdCompressor(level=level or 3).stream_writer(self._raw, closefd=False)
+        else:
+            self._stream = self._raw
+        self._file_hash = hashlib.sha256()
+        self._section_hash = None
+        self._pending = bytearray()
+        self.bytes_written = 0
+        self._section_start = 0
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        self._pending += data
+        self.bytes_written += len(data)
+        if len(self._pending) >= CHUNK_SIZE:
+            self._flush_pending()
+        return len(data)
+
+    def _flush_pending(self):
+        if not self._pending:
+            return
+        data = bytes(self._pending)
+        self._pending.clear()
+        self._file_hash.update(data)
+        if self._section_hash is not None:
+            self._section_hash.update(data)
+        self._stream.write(data)
+
+    def begin_section(self):
+        self._flush_pending()
+        self._section_hash = hashlib.sha256()
+        self._section_start = self.bytes_written
+
+    def end_section(self):
+        """Return (sha256 hex, jumlah byte) untuk section yang baru selesai"""
+        self._flush_pending()
+        digest = self._section_hash.hexdigest()
+        size = self.bytes_written - self._section_start
+        self._section_hash = None
+        return digest, size
+
+    @property
+    def sha256(self):
+        self._flush_pending()
+        return self._file_hash.hexdigest()
+
+    def close(self):
+        self._flush_pending()
+        if self._stream is not self._raw:
+            self._stream.close()
+        self._raw.close()
+
+    @property
+    def compressed_bytes(self):
+        return os.path.getsize(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ChecksumReader(io.RawIOBase):
+    """Wrapper reader yang menghitung SHA-256 dari data yang dibaca"""
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._hash = hashlib.sha256()
+        self.bytes_read = 0
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        data = self._stream.read(size)
+        self._hash.update(data)
+        self.bytes_read += len(data)
+        return data
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    @property
+    def sha256(self):
+        return self._hash.hexdigest()
+
+    def close(self):
+        self._stream.close()
+        super().close()
+
+
+def open_backup_reader(path):
+    """
+    Buka file backup untuk dibaca (binary), otomatis dekompresi
+    gzip/zstd berdasarkan magic bytes di awal file.
+    """
+    with open(path, 'rb') as f:
+        magic = f.read(4)
+    if magic.startswith(GZIP_MAGIC):
+        return gzip.open(path, 'rb')
+    raw = open(path, 'rb', buffering=BUFFER_SIZE)
+    if magic.startswith(ZSTD_MAGIC):
+        zstandard = _require_zstandard()
+        return zstandard.ZstdDecompressor().stream_reader(raw, closefd=True)
+    return raw
+
+
+def hash_backup_file(path):
+    """SHA-256 + jumlah byte isi backup (setelah dekompresi), tanpa load ke memori"""
+    with ChecksumReader(open_backup_reader(path)) as f:
+        while f.read(BUFFER_SIZE):
+            pass
+        return f.sha256, f.bytes_read
+
+
+# ==========================================================
+# 📜 PARSER SQL STREAMING
+# ==========================================================
+# Token yang mengubah state parser: komentar, string, identifier
+# ber-quote, dollar quote ($$ / $tag$) dan akhir statement
+SQL_TOKEN = re.compile(r"--|/\*|'|\"|\$(?:[A-Za-z_]\w*)?\$|;")
+COPY_FROM_STDIN = re.compile(r"^COPY\b.*\bFROM\s+stdin\b", re.IGNORECASE | re.DOTALL)
+
+
+class SqlStatement:
+    """Satu statement hasil parse + lokasi barisnya di file"""
+
+    def __init__(self, sql, first_line, last_line, copy_data=None):
+        self.sql = sql
+        self.first_line = first_line
+        self.last_line = last_line
+        # Untuk COPY ... FROM stdin: reader data sampai baris "\."
+        self.copy_data = copy_data
+
+
+class CopyDataReader:
+    """
+    File-like untuk cursor.copy_expert(): baca baris data COPY dari
+    iterator baris yang sama dengan parser, berhenti di terminator "\.".
+    """
+
+    def __init__(self, lines):
+        self._lines = lines
+        self.done = False
+        self.lines_read = 0
+        self.rows = 0
+
+    def read(self, size=-1):
+        chunks = []
+        length = 0
+        while not self.done and (size < 0 or length < size):
+            line = next(self._lines, None)
+            if line is None:
+                raise ValueError("Section COPY tidak ditutup dengan \\.")
+            self.lines_read += 1
+            if line.rstrip('\r\n') == '\\.':
+                self.done = True
+                break
+            chunks.append(line)
+            length += len(line)
+            self.rows += 1
+        return ''.join(chunks)
+
+    def drain(self):
+        """Lewati sisa data COPY yang belum dibaca"""
+        while not self.done:
+            self.read(BUFFER_SIZE)
+
+
+def iter_sql_statements(lines):
+    """
+    Yield SqlStatement satu per satu dari iterator baris SQL tanpa
+    membaca seluruh file. Komentar dibuang; string '...', identifier "...",
+    dan dollar quote dihormati saat mencari ';'.
+
+    Catatan: string E'...' dengan backslash escape tidak didukung
+    (export_database.py dan pg_dump memakai '' untuk escape).
+    """
+    lines = iter(lines)
+    parts = []
+    state = None
+    first_line = None
+    line_no = 0
+
+    for line in lines:
+        line_no += 1
+        pos = 0
+        while pos < len(line):
+            if state is None:
+                match = SQL_TOKEN.search(line, pos)
+                chunk = line[pos:match.start() if match else len(line)]
+                if first_line is None and chunk.strip():
+                    first_line = line_no
+                parts.append(chunk)
+                if match is None:
+                    break
+                token = match.group()
+                pos = match.end()
+                if token == '--':
+                    parts.append('\n')
+                    break
+                if token == '/*':
+                    state = '*/'
+                    continue
+                if first_line is None:
+                    first_line = line_no
+                parts.append(token)
+                if token != ';':
+                    state = token
+                    continue
+
+                sql = ''.join(parts).strip()
+                parts = []
+                start, first_line = first_line, None
+                if sql == ';':
+                    continue
+                if COPY_FROM_STDIN.match(sql):
+                    copy_data = CopyDataReader(lines)
+                    yield SqlStatement(sql, start, line_no, copy_data)
+                    copy_data.drain()
+                    line_no += copy_data.lines_read
+                    # Data COPY mulai di baris berikutnya
+                    break
+                yield SqlStatement(sql, start, line_no)
+            else:
+                end = line.find(state, pos)
+                if end < 0:
+                    if state != '*/':
+                        parts.append(line[pos:])
+                    break
+                if state in ("'", '"') and line.startswith(state, end + 1):
+                    # Quote di-escape dengan menggandakannya ('' atau "")
+                    parts.append(line[pos:end + 2])
+                    pos = end + 2
+                    continue
+                if state != '*/':
+                    parts.append(line[pos:end + len(state)])
+                pos = end + len(state)
+                state = None
+
+    sql = ''.join(parts).strip()
+    if sql:
+        yield SqlStatement(sql, first_line, line_no)
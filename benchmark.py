@@ -0,0 +1,507 @@
+#!/usr/bin/env python3
+"""
+Benchmark API Dramamu
+=====================
+Jalankan API (uvicorn) terhadap Postgres lokal berisi data sintetis, dengan
+Telegram dan Midtrans diganti fake server lokal, lalu tembak workload
+campuran dengan concurrency tertentu. Hasil per endpoint:
+- throughput (req/s) dan error rate
+- latency mean / p50 / p90 / p95 / p99 / max
+disimpan ke JSON supaya run sebelum/sesudah perubahan bisa dibandingkan.
+
+Usage:
+    python benchmark.py                                   # seed + 30 detik, concurrency 20
+    python benchmark.py --users 5000 --movies 500 --queue 20000 --concurrency 50
+    python benchmark.py --mix movies=1,hold=1,release=1 --duration 60 --json after.json --compare before.json
+    python benchmark.py --api-url http://127.0.0.1:8000 --no-seed   # server yang sudah jalan
+
+Environment:
+    BENCH_DATABASE_URL   database benchmark (default postgresql://localhost/dramamu_bench)
+                         ⚠️  DI-DROP dan dibuat ulang setiap run (kecuali --no-seed)!
+"""
+
+import argparse
+import asyncio
+import csv
+import hashlib
+import hmac
+import io
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlencode
+
+import httpx
+import psycopg2
+from psycopg2.extensions import parse_dsn
+
+from verify_backup import recreate_scratch_database
+
+DEFAULT_BENCH_URL = 'postgresql://localhost/dramamu_bench'
+BENCH_BOT_TOKEN = '123456789:bench-token'
+DEFAULT_MIX = "movies=5,hold=3,release=3,user_status=2,create_payment=1"
+
+PACKAGES = [(1, "VIP 1 Hari", 2000), (2, "VIP 7 Hari", 10000), (3, "VIP 30 Hari", 30000)]
+GENRES = ["drama", "romance", "action", "comedy", "thriller"]
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+# ==========================================================
+# 🌱 SEED DATA SINTETIS
+# ==========================================================
+def copy_rows(cursor, table, columns, rows):
+    """COPY baris hasil generator lewat buffer CSV"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(['' if value is None else value for value in row])
+    buffer.seek(0)
+    cursor.copy_expert(
+        f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer
+    )
+
+
+def seed_database(db_url, users, movies, queue, vip_ratio, seed):
+    """
+    Isi database benchmark. Return (telegram_id semua user, telegram_id VIP,
+    token intermediary_queue yang masih waiting_start).
+    """
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    user_ids = [100000 + i for i in range(users)]
+    vip_ids = [uid for uid in user_ids if rng.random() < vip_ratio] or user_ids[:1]
+    vip_set = set(vip_ids)
+
+    conn = psycopg2.connect(db_url)
+    cursor = conn.cursor()
+    copy_rows(cursor, "users", ["telegram_id", "username", "first_name", "is_vip", "vip_expires_at", "referral_code"], (
+        (uid, f"bench{uid}", "Bench", uid in vip_set,
+         (now + timedelta(days=30)).isoformat() if uid in vip_set else None, f"DRAMA{uid}")
+        for uid in user_ids
+    ))
+    copy_rows(cursor, "movies", ["title", "description", "poster_url", "video_link", "genre", "year", "rating", "active"], (
+        (f"Drama Benchmark {i}", "Film sintetis untuk benchmark " * 4,
+         f"https://example.com/poster/{i}.jpg", f"https://example.com/watch/{i}",
+         rng.choice(GENRES), rng.randint(2000, 2025), round(rng.uniform(5, 9.5), 1), True)
+        for i in range(1, movies + 1)
+    ))
+    cursor.execute("SELECT id, title, video_link, poster_url FROM movies ORDER BY id")
+    movie_rows = cursor.fetchall()
+
+    tokens = [f"bench-seed-{i}-{rng.getrandbits(64):016x}" for i in range(queue)]
+
+    def queue_rows():
+        for token in tokens:
+            movie_id, title, video_link, poster_url = rng.choice(movie_rows)
+            movie_data = json.dumps({"title": title, "video_link": video_link, "poster_url": poster_url})
+            yield (rng.choice(vip_ids), movie_id, token, movie_data, 'waiting_start',
+                   f"https://t.me/dramamu_bot?start={token}", (now + timedelta(hours=6)).isoformat(),
+                   hashlib.md5(token.encode()).hexdigest())
+
+    copy_rows(cursor, "intermediary_queue",
+              ["telegram_id", "movie_id", "start_token", "movie_data", "status", "start_link", "expires_at", "trace_id"],
+              queue_rows())
+    conn.commit()
+    cursor.execute("ANALYZE")
+    cursor.close()
+    conn.close()
+    return user_ids, vip_ids, [row[0] for row in movie_rows], tokens
+
+
+def load_existing_data(db_url):
+    """--no-seed: pakai data yang sudah ada di database benchmark"""
+    conn = psycopg2.connect(db_url)
+    cursor = conn.cursor()
+    cursor.execute("SELECT telegram_id, is_vip AND (vip_expires_at IS NULL OR vip_expires_at > NOW()) FROM users")
+    users = cursor.fetchall()
+    cursor.execute("SELECT id FROM movies WHERE active")
+    movie_ids = [row[0] for row in cursor.fetchall()]
+    cursor.execute("SELECT start_token FROM intermediary_queue WHERE status = 'waiting_start' AND expires_at > NOW()")
+    tokens = [row[0] for row in cursor.fetchall()]
+    cursor.close()
+    conn.close()
+    user_ids = [uid for uid, _ in users]
+    vip_ids = [uid for uid, is_vip in users if is_vip] or user_ids[:1]
+    return user_ids, vip_ids, movie_ids, tokens
+
+
+def sign_init_data(telegram_id, bot_token=BENCH_BOT_TOKEN):
+    """init_data WebApp bertanda tangan valid (algoritma sama dengan verify_telegram_init_data)"""
+    fields = {
+        "auth_date": str(int(time.time())),
+        "query_id": f"bench{telegram_id}",
+        "user": json.dumps({"id": telegram_id, "first_name": "Bench"}, separators=(",", ":")),
+    }
+    data_check_string = "\n".join(f"{k}={fields[k]}" for k in sorted(fields))
+    secret_key = hmac.new(b"WebAppData", bot_token.encode(), hashlib.sha256).digest()
+    fields["hash"] = hmac.new(secret_key, data_check_string.encode(), hashlib.sha256).hexdigest()
+    return urlencode(fields)
+
+
+# ==========================================================
+# 🧪 PROSES: FAKE SERVER + API
+# ==========================================================
+def start_process(name, args, log_dir, env=None):
+    log = open(os.path.join(log_dir, f"{name}.log"), "wb")
+    return subprocess.Popen([sys.executable] + args, cwd=BASE_DIR, env=env,
+                            stdout=log, stderr=subprocess.STDOUT)
+
+
+def wait_until_up(url, process, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Proses keluar dengan kode {process.returncode} sebelum {url} siap")
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} tidak merespon dalam {timeout}s")
+
+
+def stop_processes(processes):
+    for process in processes:
+        if process.poll() is None:
+            process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+# ==========================================================
+# 🏋️ WORKLOAD
+# ==========================================================
+def parse_mix(spec):
+    """'movies=5,hold=3' → {'movies': 5.0, 'hold': 3.0}"""
+    mix = {}
+    for part in spec.split(","):
+        if not part.strip():
+            continue
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"operasi tidak dikenal: {name} (pilihan: {', '.join(OPERATIONS)})")
+        mix[name] = float(weight or 1)
+    if not mix:
+        raise argparse.ArgumentTypeError("mix kosong")
+    return mix
+
+
+async def op_movies(client, state, rng):
+    return await client.get("/api/v1/movies")
+
+
+async def op_user_status(client, state, rng):
+    return await client.get(f"/api/v1/user_status/{rng.choice(state['users'])}")
+
+
+async def op_hold(client, state, rng):
+    telegram_id = rng.choice(state["vip_users"])
+    response = await client.post("/api/v1/hold_movie_data", json={
+        "chat_id": telegram_id,
+        "movie_id": rng.choice(state["movies"]),
+        "init_data": sign_init_data(telegram_id, state["bot_token"]),
+    })
+    if response.status_code == 200 and response.json().get("token"):
+        # Token baru ikut di-release oleh worker lain (alur hold → release)
+        state["tokens"].append(response.json()["token"])
+    return response
+
+
+async def op_release(client, state, rng):
+    token = state["tokens"].popleft() if state["tokens"] else f"bench-missing-{rng.getrandbits(32)}"
+    return await client.post(f"/api/v1/release_movie_data/{token}", params={"received_at": f"{time.time():.3f}"})
+
+
+async def op_create_payment(client, state, rng):
+    paket_id, nama_paket, amount = rng.choice(PACKAGES)
+    return await client.post("/api/v1/create_payment", json={
+        "telegram_id": rng.choice(state["users"]),
+        "paket_id": paket_id,
+        "gross_amount": amount,
+        "nama_paket": nama_paket,
+    })
+
+
+OPERATIONS = {
+    "movies": op_movies,
+    "user_status": op_user_status,
+    "hold": op_hold,
+    "release": op_release,
+    "create_payment": op_create_payment,
+}
+
+
+async def run_workload(api_url, state, mix, concurrency, duration, warmup, seed):
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    samples = {name: {"latencies": [], "status": {}, "errors": 0} for name in names}
+    started = time.monotonic()
+    record_from = started + warmup
+    deadline = record_from + duration
+
+    async def worker(index):
+        rng = random.Random(seed + index)
+        while True:
+            now = time.monotonic()
+            if now >= deadline:
+                return
+            name = rng.choices(names, weights)[0]
+            begin = time.perf_counter()
+            try:
+                response = await OPERATIONS[name](client, state, rng)
+                status = str(response.status_code)
+                failed = response.status_code >= 400
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+                failed = True
+            elapsed = time.perf_counter() - begin
+            if now >= record_from:
+                sample = samples[name]
+                sample["latencies"].append(elapsed)
+                sample["status"][status] = sample["status"].get(status, 0) + 1
+                sample["errors"] += failed
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=api_url, limits=limits, timeout=30.0) as client:
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    return samples
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile dari list yang sudah urut"""
+    if not sorted_values:
+        return None
+    rank = math.ceil(p / 100 * len(sorted_values))
+    return sorted_values[max(0, min(len(sorted_values), rank) - 1)]
+
+
+def summarize(latencies, errors, duration, status=None):
+    values = sorted(latencies)
+    count = len(values)
+    ms = lambda v: round(v * 1000, 2) if v is not None else None
+    summary = {
+        "requests": count,
+        "rps": round(count / duration, 1),
+        "errors": errors,
+        "error_rate": round(errors / count, 4) if count else 0.0,
+        "latency_ms": {
+            "mean": ms(sum(values) / count) if count else None,
+            "p50": ms(percentile(values, 50)),
+            "p90": ms(percentile(values, 90)),
+            "p95": ms(percentile(values, 95)),
+            "p99": ms(percentile(values, 99)),
+            "max": ms(values[-1]) if count else None,
+        },
+    }
+    if status is not None:
+        summary["status"] = status
+    return summary
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def fake_stats(url):
+    try:
+        return httpx.get(f"{url}/_stats", timeout=2.0).json()
+    except (httpx.HTTPError, ValueError):
+        return None
+
+
+# ==========================================================
+# 📊 LAPORAN
+# ==========================================================
+def print_results(result):
+    print()
+    print("=" * 78)
+    print(f"📊 HASIL BENCHMARK ({result['config']['duration']}s, concurrency {result['config']['concurrency']})")
+    print("=" * 78)
+    print(f"{'Endpoint':<16}{'req':>8}{'req/s':>9}{'err%':>7}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}")
+    rows = list(result["endpoints"].items()) + [("TOTAL", result["total"])]
+    for name, s in rows:
+        lat = s["latency_ms"]
+        fmt = lambda v: f"{v:.1f}" if v is not None else "-"
+        print(f"{name:<16}{s['requests']:>8}{s['rps']:>9.1f}{s['error_rate'] * 100:>6.1f}%"
+              f"{fmt(lat['p50']):>9}{fmt(lat['p95']):>9}{fmt(lat['p99']):>9}{fmt(lat['max']):>9}")
+    print("(latency dalam ms)")
+
+
+def print_comparison(result, baseline_path):
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+
+    def delta(new, old):
+        if new is None or not old:
+            return "-"
+        return f"{(new - old) / old * 100:+.1f}%"
+
+    print()
+    print(f"🔁 Dibanding {baseline_path} (commit {baseline.get('git_commit') or '?'})")
+    print(f"{'Endpoint':<16}{'req/s':>10}{'p50':>10}{'p95':>10}{'p99':>10}")
+    rows = list(result["endpoints"].items()) + [("TOTAL", result["total"])]
+    for name, s in rows:
+        old = baseline["total"] if name == "TOTAL" else baseline.get("endpoints", {}).get(name)
+        if not old:
+            print(f"{name:<16}{'(baru)':>10}")
+            continue
+        print(f"{name:<16}{delta(s['rps'], old['rps']):>10}"
+              + "".join(f"{delta(s['latency_ms'][p], old['latency_ms'][p]):>10}" for p in ("p50", "p95", "p99")))
+
+
+def benchmark(args):
+    processes = []
+    log_dir = tempfile.mkdtemp(prefix="dramamu_bench_")
+    api_url = args.api_url
+    bot_token = os.getenv("BOT_TOKEN", BENCH_BOT_TOKEN) if api_url else BENCH_BOT_TOKEN
+    midtrans_url = f"http://127.0.0.1:{args.port + 1}"
+    telegram_url = f"http://127.0.0.1:{args.port + 2}"
+
+    try:
+        if not args.no_seed:
+            if os.getenv('DATABASE_URL') and parse_dsn(args.db_url) == parse_dsn(os.environ['DATABASE_URL']):
+                print("❌ ERROR: BENCH_DATABASE_URL sama dengan DATABASE_URL!")
+                sys.exit(1)
+            print(f"🌱 Seed {args.users} users, {args.movies} movies, {args.queue} antrian...")
+            started = time.perf_counter()
+            recreate_scratch_database(args.db_url)
+            users, vip_users, movies, tokens = seed_database(
+                args.db_url, args.users, args.movies, args.queue, args.vip_ratio, args.seed
+            )
+            print(f"   selesai dalam {time.perf_counter() - started:.1f}s")
+        else:
+            users, vip_users, movies, tokens = load_existing_data(args.db_url)
+
+        if not api_url:
+            print(f"🧪 Menjalankan fake Midtrans, fake Telegram dan API ({args.workers} worker)...")
+            processes.append(start_process("fake_midtrans", [
+                "fake_midtrans.py", "--port", str(args.port + 1), "--latency-ms", str(args.midtrans_latency_ms)
+            ], log_dir))
+            processes.append(start_process("fake_telegram", [
+                "fake_telegram.py", "--port", str(args.port + 2), "--latency-ms", str(args.telegram_latency_ms)
+            ], log_dir))
+            env = dict(os.environ,
+                       DATABASE_URL=args.db_url,
+                       DB_POOL_MAX=str(args.db_pool),
+                       BOT_TOKEN=bot_token,
+                       MIDTRANS_SERVER_KEY="SB-Mid-server-bench",
+                       MIDTRANS_SNAP_BASE_URL=f"{midtrans_url}/snap/v1",
+                       MIDTRANS_API_BASE_URL=midtrans_url,
+                       TELEGRAM_API_BASE_URL=telegram_url,
+                       RATE_LIMIT_ENABLED="false",
+                       RECONCILE_INTERVAL_SECONDS="0",
+                       VIP_SWEEP_INTERVAL_SECONDS="0",
+                       LOG_LEVEL="WARNING")
+            processes.append(start_process("api", [
+                "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(args.port),
+                "--workers", str(args.workers), "--log-level", "warning", "--no-access-log",
+            ], log_dir, env))
+            api_url = f"http://127.0.0.1:{args.port}"
+            wait_until_up(f"{midtrans_url}/_stats", processes[0])
+            wait_until_up(f"{telegram_url}/_stats", processes[1])
+            wait_until_up(f"{api_url}/livez", processes[2])
+
+        state = {
+            "users": users,
+            "vip_users": vip_users,
+            "movies": movies,
+            "tokens": deque(tokens),
+            "bot_token": bot_token,
+        }
+        print(f"🏋️  Workload {args.mix} selama {args.duration}s (+{args.warmup}s warmup), "
+              f"concurrency {args.concurrency}...")
+        samples = asyncio.run(run_workload(
+            api_url, state, parse_mix(args.mix), args.concurrency, args.duration, args.warmup, args.seed
+        ))
+    except Exception as e:
+        print(f"❌ Benchmark gagal: {e}")
+        print(f"   Log proses: {log_dir}")
+        raise
+    finally:
+        servers = {}
+        if not args.api_url:
+            servers = {"midtrans": fake_stats(midtrans_url), "telegram": fake_stats(telegram_url)}
+        stop_processes(processes)
+
+    endpoints = {
+        name: summarize(s["latencies"], s["errors"], args.duration, s["status"])
+        for name, s in samples.items()
+    }
+    all_latencies = [v for s in samples.values() for v in s["latencies"]]
+    result = {
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "git_commit": git_commit(),
+        "config": {
+            "api_url": args.api_url or "local",
+            "workers": args.workers,
+            "db_pool": args.db_pool,
+            "users": args.users,
+            "movies": args.movies,
+            "queue": args.queue,
+            "vip_ratio": args.vip_ratio,
+            "seeded": not args.no_seed,
+            "mix": args.mix,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "warmup": args.warmup,
+            "seed": args.seed,
+            "midtrans_latency_ms": args.midtrans_latency_ms,
+            "telegram_latency_ms": args.telegram_latency_ms,
+        },
+        "endpoints": endpoints,
+        "total": summarize(all_latencies, sum(s["errors"] for s in samples.values()), args.duration),
+        "fake_servers": servers,
+    }
+
+    print_results(result)
+    if args.compare:
+        print_comparison(result, args.compare)
+    json_out = args.json_out or f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(json_out, 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=2)
+    print(f"\n💾 Hasil disimpan: {json_out}")
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark API Dramamu dengan data sintetis + fake Telegram/Midtrans")
+    parser.add_argument("--api-url", help="Benchmark server yang sudah jalan (tanpa start API/fake server)")
+    parser.add_argument("--db-url", default=os.getenv('BENCH_DATABASE_URL', DEFAULT_BENCH_URL),
+                        help="Database benchmark (di-drop dan dibuat ulang kecuali --no-seed)")
+    parser.add_argument("--no-seed", action="store_true", help="Pakai data yang sudah ada")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--movies", type=int, default=200)
+    parser.add_argument("--queue", type=int, default=5000, help="Baris intermediary_queue waiting_start")
+    parser.add_argument("--vip-ratio", type=float, default=0.5)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Bobot operasi (default {DEFAULT_MIX})")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=30.0, help="Detik pengukuran")
+    parser.add_argument("--warmup", type=float, default=5.0, help="Detik pemanasan (tidak dicatat)")
+    parser.add_argument("--workers", type=int, default=1, help="Worker uvicorn")
+    parser.add_argument("--db-pool", type=int, default=10, help="DB_POOL_MAX untuk API")
+    parser.add_argument("--port", type=int, default=8100, help="Port API (fake Midtrans +1, fake Telegram +2)")
+    parser.add_argument("--midtrans-latency-ms", type=float, default=50.0)
+    parser.add_argument("--telegram-latency-ms", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=42, help="Seed random (data + workload)")
+    parser.add_argument("--json", dest="json_out", help="File hasil (default benchmark_<waktu>.json)")
+    parser.add_argument("--compare", help="Bandingkan dengan hasil JSON sebelumnya")
+    args = parser.parse_args()
+
+    parse_mix(args.mix)
+    benchmark(args)
@@ -1,17 +1,23 @@
-import logging
-import psycopg2
+import asyncio
+import functools
 import json
 import os
 import secrets
 import hashlib
 import hmac
+import time
 import httpx
 from typing import Optional
 from urllib.parse import parse_qs
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, WebAppInfo
 from telegram.ext import Application, CommandHandler, ContextTypes, MessageHandler, filters
 from telegram.constants import ParseMode
-from telegram.error import TelegramError, BadRequest, NetworkError, Forbidden
+from telegram.error import TelegramError, BadRequest, NetworkError, Forbidden, RetryAfter, TimedOut
+from telegram.request import HTTPXRequest
+import db
+from logging_setup import REQUEST_ID_HEADER, log_context, request_id_var, setup_logging
+from metrics import Counter, Histogram, start_metrics_server
+from profiling import PROFILE_MAX_SECONDS, ProfileBusyError, capture, render_folded, top_frames
 
 # ==========================================================
 # 🔧 KONFIGURASI DASAR
@@ -19,6 +25,8 @@ from telegram.error import TelegramError, BadRequest, NetworkError, Forbidden
 BOT_TOKEN = os.environ.get("BOT_TOKEN")
 BOT_USERNAME = os.environ.get("BOT_USERNAME", "dramamu_bot")
 ADMIN_ID = os.environ.get("ADMIN_ID")
+# Override base URL Bot API (mis. fake_telegram.py untuk testing / benchmark bot)
+TELEGRAM_API_BASE_URL = os.environ.get("TELEGRAM_API_BASE_URL", "https://api.telegram.org").rstrip("/")
 
 BASE_URL = os.environ.get("FRONTEND_URL", "https://famous-semolina-e06e90.netlify.app")
 URL_CARI_JUDUL = f"{BASE_URL}/index.html"
@@ -35,25 +43,175 @@ DATABASE_URL = os.environ.get("DATABASE_URL")
 # ==========================================================
 # 🪵 LOGGING
 # ==========================================================
-logging.basicConfig(
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", 
-    level=logging.INFO,
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler('bot.log', encoding='utf-8')
-    ]
+# JSON via QueueListener (thread terpisah); bot.log dirotasi per LOG_MAX_BYTES
+logger = setup_logging("bot", log_file="bot.log")
+
+# ==========================================================
+# 🤝 HANDSHAKE STARTUP (bot mulai polling setelah API siap)
+# ==========================================================
+# Default: <backend>/readyz; start.sh mengarahkannya ke API lokal
+BACKEND_READY_URL = os.environ.get("BACKEND_READY_URL")
+BACKEND_READY_TIMEOUT = float(os.environ.get("BACKEND_READY_TIMEOUT", "60"))  # 0 = tidak menunggu
+
+def get_backend_url() -> Optional[str]:
+    """BACKEND_URL, fallback ke RAILWAY_PUBLIC_DOMAIN (auto-set oleh Railway)"""
+    backend_url = os.environ.get("BACKEND_URL")
+    if not backend_url:
+        railway_domain = os.environ.get("RAILWAY_PUBLIC_DOMAIN")
+        if railway_domain:
+            backend_url = f"https://{railway_domain}"
+    return backend_url
+
+async def wait_for_backend(application: Application):
+    """
+    post_init PTB: tunggu /readyz API menjawab 200 sebelum getUpdates pertama,
+    supaya update awal tidak gagal karena API masih warm-up. Lewat
+    BACKEND_READY_TIMEOUT bot tetap jalan (dengan warning).
+    """
+    backend_url = get_backend_url()
+    ready_url = BACKEND_READY_URL or (f"{backend_url.rstrip('/')}/readyz" if backend_url else None)
+    if not ready_url or BACKEND_READY_TIMEOUT <= 0:
+        return
+
+    started = time.monotonic()
+    status = "no response"
+    async with httpx.AsyncClient(timeout=2.0) as client:
+        while time.monotonic() - started < BACKEND_READY_TIMEOUT:
+            try:
+                response = await client.get(ready_url)
+                if response.status_code == 200:
+                    logger.info(f"🤝 API siap setelah {time.monotonic() - started:.2f}s")
+                    return
+                status = f"HTTP {response.status_code}"
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            await asyncio.sleep(0.25)
+    logger.warning(f"API belum siap setelah {BACKEND_READY_TIMEOUT:.0f}s ({status}), bot tetap jalan")
+
+# ==========================================================
+# 📈 METRICS (GET http://BOT_METRICS_HOST:BOT_METRICS_PORT/metrics)
+# ==========================================================
+BOT_METRICS_HOST = os.environ.get("BOT_METRICS_HOST", "127.0.0.1")
+BOT_METRICS_PORT = int(os.environ.get("BOT_METRICS_PORT", "9101"))  # 0 = nonaktif
+
+BOT_HANDLER_SECONDS = Histogram(
+    "dramamu_bot_handler_duration_seconds",
+    "Durasi handler bot per handler dan outcome (ok / kelas error)",
+    ["handler", "outcome"],
+)
+BOT_API_SECONDS = Histogram(
+    "dramamu_bot_telegram_api_duration_seconds",
+    "Latency call Bot API per method dan outcome (ok / kelas error)",
+    ["method", "outcome"],
+)
+BOT_BACKEND_SECONDS = Histogram(
+    "dramamu_bot_backend_request_duration_seconds",
+    "Latency call bot ke API Dramamu per endpoint dan status",
+    ["endpoint", "outcome"],
 )
-logger = logging.getLogger("dramamu-bot")
+BOT_ERRORS = Counter(
+    "dramamu_bot_errors_total",
+    "Error per sumber (handler / langkah) dan kelas error",
+    ["source", "error"],
+)
+BOT_DELIVERIES = Counter(
+    "dramamu_bot_deliveries_total",
+    "Pengiriman film: photo, text, photo_fallback_text (photo gagal → text), failed",
+    ["result"],
+)
+
+# Status HTTP Bot API → kelas error yang akan di-raise PTB
+TELEGRAM_STATUS_OUTCOMES = {
+    400: "BadRequest",
+    401: "InvalidToken",
+    403: "Forbidden",
+    404: "InvalidToken",
+    409: "Conflict",
+    429: "RetryAfter",
+    502: "NetworkError",
+}
+
+def error_class(error: BaseException) -> str:
+    """Taksonomi error dengan kardinalitas terbatas untuk label metric"""
+    for cls in (RetryAfter, TimedOut, Forbidden, BadRequest, NetworkError, TelegramError):
+        if isinstance(error, cls):
+            return cls.__name__
+    return "other"
+
+def update_log_fields(update) -> dict:
+    fields = {"request_id": f"tg-{update.update_id}"}
+    if update.effective_user:
+        fields["user_id"] = update.effective_user.id
+    return fields
+
+def instrumented(handler_name: str, bind: tuple = ()):
+    """
+    Decorator: catat durasi + outcome handler async. Handler dengan argumen
+    Update otomatis diberi field log request_id/user_id; `bind` memetakan
+    argumen posisi lain ke field log (mis. ("user_id", "token")).
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            if args and isinstance(args[0], Update):
+                fields = update_log_fields(args[0])
+            else:
+                fields = dict(zip(bind, args))
+            started = time.perf_counter()
+            outcome = "ok"
+            try:
+                with log_context(**fields):
+                    return await fn(*args, **kwargs)
+            except Exception as e:
+                outcome = error_class(e)
+                BOT_ERRORS.inc(source=handler_name, error=outcome)
+                raise
+            finally:
+                BOT_HANDLER_SECONDS.observe(time.perf_counter() - started, handler=handler_name, outcome=outcome)
+        return wrapper
+    return decorator
+
+class InstrumentedRequest(HTTPXRequest):
+    """HTTPXRequest yang mencatat latency + outcome setiap call Bot API"""
+
+    async def do_request(self, url, method, *args, **kwargs):
+        started = time.perf_counter()
+        outcome = "NetworkError"
+        try:
+            code, payload = await super().do_request(url, method, *args, **kwargs)
+            outcome = "ok" if 200 <= code <= 299 else TELEGRAM_STATUS_OUTCOMES.get(code, f"http_{code}")
+            return code, payload
+        except Exception as e:
+            outcome = error_class(e)
+            raise
+        finally:
+            BOT_API_SECONDS.observe(time.perf_counter() - started,
+                                    method=url.rsplit("/", 1)[-1], outcome=outcome)
+
+async def call_backend(client: httpx.AsyncClient, url: str, endpoint: str, **kwargs) -> httpx.Response:
+    """POST ke API Dramamu dengan pencatatan latency (kwargs diteruskan ke client.post)"""
+    started = time.perf_counter()
+    outcome = "network_error"
+    try:
+        # Request ID update Telegram ikut ke log API
+        request_id = request_id_var.get()
+        headers = {REQUEST_ID_HEADER: request_id} if request_id else None
+        response = await client.post(url, headers=headers, **kwargs)
+        outcome = str(response.status_code)
+        return response
+    finally:
+        BOT_BACKEND_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint, outcome=outcome)
 
 # ==========================================================
 # 🧩 HELPER: DATABASE CONNECTION
 # ==========================================================
 def get_db_connection():
+    """Koneksi dari pool bersama (db.py); close() = kembali ke pool, query ter-instrumentasi"""
     if not DATABASE_URL:
         logger.error("DATABASE_URL tidak tersedia!")
         return None
     try:
-        conn = psycopg2.connect(DATABASE_URL)
+        conn = db.get_connection()
         return conn
     except Exception as e:
         logger.error(f"Gagal konek DB: {e}")
@@ -123,7 +281,7 @@ def check_vip_status(telegram_id: int) -> bool:
             VALUES (%s, %s, NOW())
             ON CONFLICT (telegram_id) 
             DO UPDATE SET telegram_id = EXCLUDED.telegram_id
-            RETURNING is_vip;
+            RETURNING is_vip AND (vip_expires_at IS NULL OR vip_expires_at > NOW());
         """, (telegram_id, False))
 
         result = cur.fetchone()
@@ -180,6 +338,8 @@ def get_movie_details(movie_id: int) -> Optional[dict]:
 # ==========================================================
 async def handle_pending_action(telegram_id: int, context: ContextTypes.DEFAULT_TYPE):
     """Cek dan eksekusi pending actions setelah user start bot"""
+    # Koneksi hanya dipegang selama query: send_movie_to_user butuh koneksi
+    # pool sendiri (get_movie_details) dan bisa lama menunggu Telegram
     conn = get_db_connection()
     if not conn:
         return
@@ -191,26 +351,41 @@ async def handle_pending_action(telegram_id: int, context: ContextTypes.DEFAULT_
             (telegram_id,)
         )
         pending_actions = cur.fetchall()
+        cur.close()
+    except Exception as e:
+        logger.error(f"Error ambil pending action: {e}")
+        return
+    finally:
+        try:
+            conn.close()
+        except:
+            pass
 
-        processed_movies = []
-        for action in pending_actions:
-            movie_id = action[0]
-            movie = get_movie_details(movie_id)
-            if movie:
-                success = await send_movie_to_user(telegram_id, movie, context)
-                if success:
-                    processed_movies.append(movie_id)
-
-        # Hapus pending actions yang sudah diproses
-        if processed_movies:
-            cur.execute(
-                "DELETE FROM pending_actions WHERE telegram_id = %s AND movie_id = ANY(%s);",
-                (telegram_id, processed_movies)
-            )
-            conn.commit()
+    processed_movies = []
+    for action in pending_actions:
+        movie_id = action[0]
+        movie = get_movie_details(movie_id)
+        if movie:
+            success = await send_movie_to_user(telegram_id, movie, context)
+            if success:
+                processed_movies.append(movie_id)
 
-        cur.close()
+    if not processed_movies:
+        return
+
+    # Hapus pending actions yang sudah diproses (koneksi baru, singkat)
+    conn = get_db_connection()
+    if not conn:
+        return
 
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            "DELETE FROM pending_actions WHERE telegram_id = %s AND movie_id = ANY(%s);",
+            (telegram_id, processed_movies)
+        )
+        conn.commit()
+        cur.close()
     except Exception as e:
         logger.error(f"Error handle pending action: {e}")
         try:
@@ -219,16 +394,17 @@ async def handle_pending_action(telegram_id: int, context: ContextTypes.DEFAULT_
             pass
     finally:
         try:
-            if conn:
-                conn.close()
+            conn.close()
         except:
             pass
 
 # ==========================================================
 # 📤 FUNGSI KIRIM FILM KE USER (Dengan Comprehensive Error Handling)
 # ==========================================================
+@instrumented("send_movie_to_user", bind=("user_id",))
 async def send_movie_to_user(chat_id: int, movie: dict, context: ContextTypes.DEFAULT_TYPE) -> bool:
     """Kirim film ke user dengan fallback ke link"""
+    photo_failed = False
     try:
         # Validasi data movie
         if not movie or not movie.get("video_link"):
@@ -255,9 +431,12 @@ async def send_movie_to_user(chat_id: int, movie: dict, context: ContextTypes.DE
                         InlineKeyboardButton("🎬 Tonton Sekarang", url=video_link)
                     ]])
                 )
+                BOT_DELIVERIES.inc(result="photo")
                 return True
             except (BadRequest, NetworkError) as e:
                 logger.warning(f"Gagal kirim photo, fallback ke text: {e}")
+                BOT_ERRORS.inc(source="send_photo", error=error_class(e))
+                photo_failed = True
                 # Fallback ke text message
 
         # Kirim sebagai text message
@@ -266,27 +445,64 @@ async def send_movie_to_user(chat_id: int, movie: dict, context: ContextTypes.DE
             text=f"🎥 <b>{title}</b>\n\n{video_link}",
             parse_mode=ParseMode.HTML
         )
+        BOT_DELIVERIES.inc(result="photo_fallback_text" if photo_failed else "text")
         return True
 
     except Forbidden as e:
         logger.error(f"Bot blocked by user {chat_id}: {e}")
+        record_delivery_failure(e)
         return False
     except BadRequest as e:
         logger.error(f"BadRequest sending to {chat_id}: {e}")
+        record_delivery_failure(e)
         return False
     except NetworkError as e:
         logger.error(f"NetworkError sending to {chat_id}: {e}")
+        record_delivery_failure(e)
         return False
     except TelegramError as e:
         logger.error(f"TelegramError sending to {chat_id}: {e}")
+        record_delivery_failure(e)
         return False
     except Exception as e:
         logger.error(f"Unexpected error sending to {chat_id}: {e}")
+        record_delivery_failure(e)
         return False
 
+def record_delivery_failure(error: BaseException):
+    BOT_DELIVERIES.inc(result="failed")
+    BOT_ERRORS.inc(source="send_movie_to_user", error=error_class(error))
+
+# ==========================================================
+# 🧭 FUNNEL PENGIRIMAN (hold → bot → release → delivered)
+# ==========================================================
+async def release_movie(client: httpx.AsyncClient, backend_url: str, token: str,
+                        received_at: float) -> httpx.Response:
+    """Release data dari pelantara, sekalian kirim waktu bot menerima token"""
+    return await call_backend(
+        client, f"{backend_url}/api/v1/release_movie_data/{token}", "release_movie_data",
+        params={"received_at": f"{received_at:.3f}"},
+    )
+
+async def deliver_released_movie(client: httpx.AsyncClient, backend_url: str, token: str,
+                                 user_id: int, data: dict, context: ContextTypes.DEFAULT_TYPE) -> bool:
+    """Kirim film hasil release lalu laporkan hasilnya ke API (tahap akhir funnel)"""
+    with log_context(trace_id=data.get("trace_id")):
+        success = await send_movie_to_user(user_id, data.get("movie_data"), context)
+        try:
+            await call_backend(
+                client, f"{backend_url}/api/v1/delivery_status/{token}", "delivery_status",
+                json={"delivered": success},
+            )
+        except Exception as e:
+            # Gagal lapor tidak boleh menggagalkan pengiriman
+            logger.warning(f"Gagal lapor delivery status: {e}")
+    return success
+
 # ==========================================================
 # 🚀 HANDLER /start DENGAN TOKEN SUPPORT
 # ==========================================================
+@instrumented("start")
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not update.effective_user or not update.message:
         return
@@ -348,6 +564,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Cek pending actions untuk user ini
     await handle_pending_action(user_id, context)
 
+@instrumented("handle_start_token", bind=("user_id", "token"))
 async def handle_start_token(user_id: int, token: str, context: ContextTypes.DEFAULT_TYPE):
     """
     Handle start token - SISTEM PELANTARA BARU
@@ -355,24 +572,17 @@ async def handle_start_token(user_id: int, token: str, context: ContextTypes.DEF
     2. Panggil endpoint pelantara untuk ambil data yang ditahan
     3. Kirim film ke user
     """
+    received_at = time.time()
     try:
-        # Ambil backend URL dari environment
-        backend_url = os.environ.get("BACKEND_URL")
+        backend_url = get_backend_url()
         if not backend_url:
-            # Fallback ke RAILWAY_PUBLIC_DOMAIN (auto-set oleh Railway)
-            railway_domain = os.environ.get("RAILWAY_PUBLIC_DOMAIN")
-            if railway_domain:
-                backend_url = f"https://{railway_domain}"
-            else:
-                logger.error("BACKEND_URL atau RAILWAY_PUBLIC_DOMAIN tidak tersedia!")
-                return
+            logger.error("BACKEND_URL atau RAILWAY_PUBLIC_DOMAIN tidak tersedia!")
+            return
 
         # Panggil endpoint pelantara untuk release data
         import httpx
         async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(
-                f"{backend_url}/api/v1/release_movie_data/{token}"
-            )
+            response = await release_movie(client, backend_url, token, received_at)
             
             if response.status_code == 200:
                 data = response.json()
@@ -383,10 +593,10 @@ async def handle_start_token(user_id: int, token: str, context: ContextTypes.DEF
                     telegram_id = data.get("telegram_id")
                     
                     if movie_data and telegram_id == user_id:
-                        success = await send_movie_to_user(user_id, movie_data, context)
+                        success = await deliver_released_movie(client, backend_url, token, user_id, data, context)
                         
                         if success:
-                            logger.info(f"✅ Film berhasil dikirim dari pelantara ke user {user_id}")
+                            logger.info(f"✅ Film berhasil dikirim dari pelantara ke user {user_id}", extra={"sample": True})
                             await context.bot.send_message(
                                 chat_id=user_id,
                                 text="✅ Film berhasil dikirim! Selamat menonton! 🍿"
@@ -426,38 +636,54 @@ async def handle_start_token_legacy(user_id: int, token: str, context: ContextTy
             (user_id, token)
         )
         result = cur.fetchone()
+        cur.close()
+    except Exception as e:
+        logger.error(f"Error handle legacy start token: {e}")
+        return
+    finally:
+        try:
+            conn.close()
+        except:
+            pass
 
-        if result:
-            movie_id = result[0]
-            movie = get_movie_details(movie_id)
-            if movie:
-                success = await send_movie_to_user(user_id, movie, context)
-                if success:
-                    # Update status jadi processed
-                    cur.execute(
-                        "UPDATE pending_actions SET status = 'processed' WHERE telegram_id = %s AND start_token = %s;",
-                        (user_id, token)
-                    )
-                    conn.commit()
-                    logger.info(f"Successfully processed legacy pending action for user {user_id}, movie {movie_id}")
+    if not result:
+        return
+
+    movie_id = result[0]
+    movie = get_movie_details(movie_id)
+    if not movie or not await send_movie_to_user(user_id, movie, context):
+        return
+
+    # Update status jadi processed (koneksi baru, tidak dipegang selama kirim film)
+    conn = get_db_connection()
+    if not conn:
+        return
 
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            "UPDATE pending_actions SET status = 'processed' WHERE telegram_id = %s AND start_token = %s;",
+            (user_id, token)
+        )
+        conn.commit()
         cur.close()
+        logger.info(f"Successfully processed legacy pending action for user {user_id}, movie {movie_id}")
     except Exception as e:
-        logger.error(f"Error handle legacy start token: {e}")
+        logger.error(f"Error update legacy pending action: {e}")
         try:
             conn.rollback()
         except:
             pass
     finally:
         try:
-            if conn:
-                conn.close()
+            conn.close()
         except:
             pass
 
 # ==========================================================
 # 📡 HANDLER WEBAPP DATA YANG DIPERBAIKI
 # ==========================================================
+@instrumented("handle_webapp_data")
 async def handle_webapp_data(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not update.message or not update.message.web_app_data or not update.effective_user:
         return
@@ -465,7 +691,7 @@ async def handle_webapp_data(update: Update, context: ContextTypes.DEFAULT_TYPE)
     user_id = update.effective_user.id
     data_str = update.message.web_app_data.data
 
-    logger.info(f"Received webapp data from user {user_id}: {data_str[:100]}...")
+    logger.info(f"Received webapp data from user {user_id}: {data_str[:100]}...", extra={"sample": True})
 
     try:
         data = json.loads(data_str)
@@ -494,6 +720,7 @@ async def handle_webapp_data(update: Update, context: ContextTypes.DEFAULT_TYPE)
             text="❌ Terjadi kesalahan sistem."
         )
 
+@instrumented("handle_transaction_id", bind=("user_id", "token"))
 async def handle_transaction_id(user_id: int, transaction_id: str, context: ContextTypes.DEFAULT_TYPE):
     """
     Handle transaction_id dari Mini App sendData()
@@ -504,6 +731,7 @@ async def handle_transaction_id(user_id: int, transaction_id: str, context: Cont
     2. Panggil backend untuk release data film
     3. Kirim film ke user
     """
+    received_at = time.time()
     try:
         transaction_id = transaction_id.strip()
         
@@ -513,24 +741,17 @@ async def handle_transaction_id(user_id: int, transaction_id: str, context: Cont
             
         logger.info(f"Processing transaction_id {transaction_id} for user {user_id}")
         
-        backend_url = os.environ.get("BACKEND_URL")
+        backend_url = get_backend_url()
         if not backend_url:
-            # Fallback ke RAILWAY_PUBLIC_DOMAIN (auto-set oleh Railway)
-            railway_domain = os.environ.get("RAILWAY_PUBLIC_DOMAIN")
-            if railway_domain:
-                backend_url = f"https://{railway_domain}"
-            else:
-                logger.error("BACKEND_URL atau RAILWAY_PUBLIC_DOMAIN tidak tersedia!")
-                await context.bot.send_message(
-                    chat_id=user_id,
-                    text="❌ Konfigurasi server error. Silakan hubungi admin."
-                )
-                return
+            logger.error("BACKEND_URL atau RAILWAY_PUBLIC_DOMAIN tidak tersedia!")
+            await context.bot.send_message(
+                chat_id=user_id,
+                text="❌ Konfigurasi server error. Silakan hubungi admin."
+            )
+            return
         
         async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(
-                f"{backend_url}/api/v1/release_movie_data/{transaction_id}"
-            )
+            response = await release_movie(client, backend_url, transaction_id, received_at)
             
             if response.status_code == 200:
                 data = response.json()
@@ -540,10 +761,10 @@ async def handle_transaction_id(user_id: int, transaction_id: str, context: Cont
                     telegram_id = data.get("telegram_id")
                     
                     if movie_data and telegram_id == user_id:
-                        success = await send_movie_to_user(user_id, movie_data, context)
+                        success = await deliver_released_movie(client, backend_url, transaction_id, user_id, data, context)
                         
                         if success:
-                            logger.info(f"✅ Film berhasil dikirim via sendData ke user {user_id}")
+                            logger.info(f"✅ Film berhasil dikirim via sendData ke user {user_id}", extra={"sample": True})
                         else:
                             logger.error(f"❌ Gagal kirim film ke user {user_id}")
                             await context.bot.send_message(
@@ -576,6 +797,7 @@ async def handle_transaction_id(user_id: int, transaction_id: str, context: Cont
             text="❌ Terjadi kesalahan sistem. Silakan coba lagi."
         )
 
+@instrumented("handle_watch_action", bind=("user_id",))
 async def handle_watch_action(user_id: int, data: dict, context: ContextTypes.DEFAULT_TYPE, update: Optional[Update] = None):
     """Handle aksi nonton film dengan fallback mechanism"""
     try:
@@ -662,7 +884,7 @@ async def handle_watch_action(user_id: int, data: dict, context: ContextTypes.DE
                             InlineKeyboardButton("🔙 Kembali ke Menu", web_app=WebAppInfo(url=URL_CARI_JUDUL))
                         ]])
                     )
-                logger.info(f"Successfully sent movie {movie_id} to user {user_id}")
+                logger.info(f"Successfully sent movie {movie_id} to user {user_id}", extra={"sample": True})
             except Exception as e:
                 logger.error(f"Error sending success message to user {user_id}: {e}")
 
@@ -756,6 +978,7 @@ async def handle_withdraw_action(user_id: int, data: dict, context: ContextTypes
 # ==========================================================
 # 💬 HANDLER PESAN BIASA (AI AGENT)
 # ==========================================================
+@instrumented("ai_agent_handler")
 async def ai_agent_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         msg = update.effective_message
@@ -786,12 +1009,49 @@ async def ai_agent_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     except Exception as e:
         logger.error(f"Error in AI agent handler: {e}")
 
+# ==========================================================
+# 🔬 HANDLER /profile (ADMIN_ID saja)
+# ==========================================================
+PROFILE_DEFAULT_SECONDS = 10
+
+@instrumented("profile")
+async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/profile [detik]: sample semua thread bot, kirim hasil folded stacks ke admin"""
+    if not update.effective_user or not update.message:
+        return
+    if not ADMIN_ID or str(update.effective_user.id) != str(ADMIN_ID):
+        return
+
+    try:
+        seconds = float(context.args[0]) if context.args else PROFILE_DEFAULT_SECONDS
+    except ValueError:
+        await update.message.reply_text("Format: /profile [detik]")
+        return
+    seconds = max(1.0, min(seconds, PROFILE_MAX_SECONDS))
+
+    await update.message.reply_text(f"🔬 Profiling bot {seconds:.0f} detik...")
+    try:
+        # Jalan di thread terpisah supaya event loop (yang di-profile) tetap melayani update
+        sampler = await asyncio.to_thread(capture, seconds)
+    except ProfileBusyError:
+        await update.message.reply_text("⏳ Profiling lain masih berjalan")
+        return
+
+    top = "\n".join(f"{count:>6}  {frame}" for frame, count in top_frames(sampler.stacks, 8))
+    await context.bot.send_document(
+        chat_id=update.effective_chat.id,
+        document=render_folded(sampler.stacks).encode(),
+        filename=f"bot-profile-{int(time.time())}.folded",
+        caption=f"📊 {sampler.samples} sample / {sampler.elapsed:.1f}s\n\nTop frame:\n{top}"[:1024],
+    )
+
 # ==========================================================
 # ⚠️ GLOBAL ERROR HANDLER
 # ==========================================================
 async def global_error_handler(update: object, context: ContextTypes.DEFAULT_TYPE):
     error_msg = f"Global error: {context.error}"
     logger.error(error_msg, exc_info=context.error)
+    BOT_ERRORS.inc(source="global", error=error_class(context.error))
 
     if ADMIN_ID:
         try:
@@ -812,11 +1072,30 @@ def main():
 
     logger.info("🚀 Dramamu Bot sudah jalan...")
 
+    if BOT_METRICS_PORT:
+        try:
+            start_metrics_server(BOT_METRICS_PORT, BOT_METRICS_HOST)
+            logger.info(f"📈 Metrics bot di http://{BOT_METRICS_HOST}:{BOT_METRICS_PORT}/metrics")
+        except OSError as e:
+            logger.warning(f"Metrics server tidak bisa jalan: {e}")
+
     try:
-        app = Application.builder().token(BOT_TOKEN).build()
+        app = (
+            Application.builder()
+            .token(BOT_TOKEN)
+            .base_url(f"{TELEGRAM_API_BASE_URL}/bot")
+            .base_file_url(f"{TELEGRAM_API_BASE_URL}/file/bot")
+            # Pool size sama dengan default PTB; getUpdates pakai koneksi sendiri
+            .request(InstrumentedRequest(connection_pool_size=256))
+            .get_updates_request(InstrumentedRequest(connection_pool_size=1))
+            .post_init(wait_for_backend)
+            .build()
+        )
 
         # === HANDLER ===
         app.add_handler(CommandHandler("start", start))
+        # block=False: update lain tetap diproses selama capture berjalan
+        app.add_handler(CommandHandler("profile", profile_command, block=False))
         app.add_handler(MessageHandler(filters.StatusUpdate.WEB_APP_DATA, handle_webapp_data))
         app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, ai_agent_handler))
 
@@ -22,6 +22,8 @@ CREATE TABLE IF NOT EXISTS users (
 
 CREATE INDEX IF NOT EXISTS idx_users_telegram_id ON users(telegram_id);
 CREATE INDEX IF NOT EXISTS idx_users_referral_code ON users(referral_code);
+-- Partial index untuk sweep VIP expired (hanya baris VIP yang diindex)
+CREATE INDEX IF NOT EXISTS idx_users_vip_expires ON users(vip_expires_at) WHERE is_vip;
 
 -- 2. TABEL MOVIES (Data film/drama)
 CREATE TABLE IF NOT EXISTS movies (
@@ -53,7 +55,10 @@ CREATE TABLE IF NOT EXISTS intermediary_queue (
     expires_at TIMESTAMPTZ NOT NULL,
     created_at TIMESTAMPTZ DEFAULT NOW(),
     sent_to_bot_at TIMESTAMPTZ,
-    bot_received_start_at TIMESTAMPTZ
+    bot_received_start_at TIMESTAMPTZ,
+    updated_at TIMESTAMPTZ DEFAULT NOW(),
+    trace_id VARCHAR(32),
+    delivered_at TIMESTAMPTZ
 );
 
 CREATE INDEX IF NOT EXISTS idx_intermediary_telegram_id ON intermediary_queue(telegram_id);
@@ -61,6 +66,11 @@ CREATE INDEX IF NOT EXISTS idx_intermediary_token ON intermediary_queue(start_to
 CREATE INDEX IF NOT EXISTS idx_intermediary_status ON intermediary_queue(status);
 CREATE INDEX IF NOT EXISTS idx_intermediary_expires ON intermediary_queue(expires_at);
 
+-- Trace funnel pengiriman film (hold → bot → release → delivered), lihat funnel_report.py
+ALTER TABLE intermediary_queue ADD COLUMN IF NOT EXISTS trace_id VARCHAR(32);
+ALTER TABLE intermediary_queue ADD COLUMN IF NOT EXISTS delivered_at TIMESTAMPTZ;
+CREATE INDEX IF NOT EXISTS idx_intermediary_created_at ON intermediary_queue(created_at);
+
 -- 4. TABEL PENDING_ACTIONS (Legacy - untuk backward compatibility)
 CREATE TABLE IF NOT EXISTS pending_actions (
     id BIGSERIAL PRIMARY KEY,
@@ -70,7 +80,8 @@ CREATE TABLE IF NOT EXISTS pending_actions (
     status VARCHAR(50) DEFAULT 'pending',
     expires_at TIMESTAMPTZ NOT NULL,
     created_at TIMESTAMPTZ DEFAULT NOW(),
-    processed_at TIMESTAMPTZ
+    processed_at TIMESTAMPTZ,
+    updated_at TIMESTAMPTZ DEFAULT NOW()
 );
 
 CREATE INDEX IF NOT EXISTS idx_pending_telegram_id ON pending_actions(telegram_id);
@@ -87,13 +98,24 @@ CREATE TABLE IF NOT EXISTS payments (
     status VARCHAR(50) DEFAULT 'pending',
     payment_method VARCHAR(100),
     midtrans_transaction_id VARCHAR(255),
+    snap_token VARCHAR(255),
+    idempotency_key VARCHAR(255),
     created_at TIMESTAMPTZ DEFAULT NOW(),
     updated_at TIMESTAMPTZ DEFAULT NOW()
 );
 
+-- Kolom baru untuk database yang sudah ada (idempotent create_payment)
+ALTER TABLE payments ADD COLUMN IF NOT EXISTS snap_token VARCHAR(255);
+ALTER TABLE payments ADD COLUMN IF NOT EXISTS idempotency_key VARCHAR(255);
+
 CREATE INDEX IF NOT EXISTS idx_payments_telegram_id ON payments(telegram_id);
 CREATE INDEX IF NOT EXISTS idx_payments_order_id ON payments(order_id);
 CREATE INDEX IF NOT EXISTS idx_payments_status ON payments(status);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_payments_idempotency ON payments(telegram_id, idempotency_key);
+-- Lookup snap token yang masih bisa dipakai ulang
+CREATE INDEX IF NOT EXISTS idx_payments_pending_reuse ON payments(telegram_id, created_at) WHERE status = 'pending';
+-- Export selektif per rentang waktu (export_database.py --since/--until)
+CREATE INDEX IF NOT EXISTS idx_payments_created_at ON payments(created_at);
 
 -- 6. TABEL ACTIVITY_LOGS (Log aktivitas user)
 CREATE TABLE IF NOT EXISTS activity_logs (
@@ -120,7 +142,8 @@ CREATE TABLE IF NOT EXISTS requests (
     status VARCHAR(50) DEFAULT 'pending',
     admin_notes TEXT,
     created_at TIMESTAMPTZ DEFAULT NOW(),
-    processed_at TIMESTAMPTZ
+    processed_at TIMESTAMPTZ,
+    updated_at TIMESTAMPTZ DEFAULT NOW()
 );
 
 CREATE INDEX IF NOT EXISTS idx_requests_telegram_id ON requests(telegram_id);
@@ -137,12 +160,29 @@ CREATE TABLE IF NOT EXISTS withdrawal_requests (
     status VARCHAR(50) DEFAULT 'pending',
     admin_notes TEXT,
     created_at TIMESTAMPTZ DEFAULT NOW(),
-    processed_at TIMESTAMPTZ
+    processed_at TIMESTAMPTZ,
+    updated_at TIMESTAMPTZ DEFAULT NOW()
 );
 
 CREATE INDEX IF NOT EXISTS idx_withdrawals_telegram_id ON withdrawal_requests(telegram_id);
 CREATE INDEX IF NOT EXISTS idx_withdrawals_status ON withdrawal_requests(status);
 
+-- Kolom updated_at untuk tabel yang berubah setelah insert
+-- (watermark export incremental: export_database.py --incremental)
+ALTER TABLE intermediary_queue ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ DEFAULT NOW();
+ALTER TABLE pending_actions ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ DEFAULT NOW();
+ALTER TABLE requests ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ DEFAULT NOW();
+ALTER TABLE withdrawal_requests ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ DEFAULT NOW();
+
+-- Scan perubahan per watermark
+CREATE INDEX IF NOT EXISTS idx_users_updated_at ON users(updated_at);
+CREATE INDEX IF NOT EXISTS idx_movies_updated_at ON movies(updated_at);
+CREATE INDEX IF NOT EXISTS idx_payments_updated_at ON payments(updated_at);
+CREATE INDEX IF NOT EXISTS idx_intermediary_updated_at ON intermediary_queue(updated_at);
+CREATE INDEX IF NOT EXISTS idx_pending_updated_at ON pending_actions(updated_at);
+CREATE INDEX IF NOT EXISTS idx_requests_updated_at ON requests(updated_at);
+CREATE INDEX IF NOT EXISTS idx_withdrawals_updated_at ON withdrawal_requests(updated_at);
+
 -- =====================================================
 -- FUNCTIONS & TRIGGERS
 -- =====================================================
@@ -169,6 +209,50 @@ DROP TRIGGER IF EXISTS update_payments_updated_at ON payments;
 CREATE TRIGGER update_payments_updated_at BEFORE UPDATE ON payments
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
+DROP TRIGGER IF EXISTS update_intermediary_queue_updated_at ON intermediary_queue;
+CREATE TRIGGER update_intermediary_queue_updated_at BEFORE UPDATE ON intermediary_queue
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+DROP TRIGGER IF EXISTS update_pending_actions_updated_at ON pending_actions;
+CREATE TRIGGER update_pending_actions_updated_at BEFORE UPDATE ON pending_actions
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+DROP TRIGGER IF EXISTS update_requests_updated_at ON requests;
+CREATE TRIGGER update_requests_updated_at BEFORE UPDATE ON requests
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+DROP TRIGGER IF EXISTS update_withdrawal_requests_updated_at ON withdrawal_requests;
+CREATE TRIGGER update_withdrawal_requests_updated_at BEFORE UPDATE ON withdrawal_requests
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+-- =====================================================
+-- NATURAL KEY MOVIES (title + year)
+-- =====================================================
+-- Upsert katalog (import_movies.py) pakai ON CONFLICT ke unique index ini.
+-- Migrasi database lama (di sini karena butuh semua tabel): duplikat
+-- digabung ke id terkecil, referensi intermediary_queue / pending_actions /
+-- activity_logs dipindah dulu, baru unique index dibuat. Hanya jalan
+-- sekali, selama index belum ada.
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_class WHERE relname = 'idx_movies_natural_key') THEN
+        CREATE TEMP TABLE movie_duplicates AS
+        SELECT id, keep_id FROM (
+            SELECT id, MIN(id) OVER (PARTITION BY title, COALESCE(year, 0)) AS keep_id FROM movies
+        ) ranked
+        WHERE id <> keep_id;
+
+        UPDATE intermediary_queue q SET movie_id = d.keep_id FROM movie_duplicates d WHERE q.movie_id = d.id;
+        UPDATE pending_actions p SET movie_id = d.keep_id FROM movie_duplicates d WHERE p.movie_id = d.id;
+        UPDATE activity_logs a SET movie_id = d.keep_id FROM movie_duplicates d WHERE a.movie_id = d.id;
+        DELETE FROM movies m USING movie_duplicates d WHERE m.id = d.id;
+
+        DROP TABLE movie_duplicates;
+    END IF;
+END $$;
+DROP INDEX IF EXISTS idx_movies_title_year;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_movies_natural_key ON movies(title, (COALESCE(year, 0)));
+
 -- =====================================================
 -- SAMPLE DATA (untuk testing)
 -- =====================================================
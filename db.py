@@ -0,0 +1,627 @@
+"""
+Connection Pool Database Dramamu
+================================
+Pool koneksi psycopg2 bersama untuk API. `get_connection()` mengembalikan
+proxy koneksi: kode lama yang memanggil `conn.close()` tetap jalan, tapi
+koneksi dikembalikan ke pool, bukan diputus.
+
+Setiap query dicatat ke metric (durasi per jenis statement), dan pool
+punya gauge untuk koneksi in-use/idle serta waktu tunggu.
+
+Statistik per statement (fingerprint SQL ternormalisasi: literal dan
+parameter jadi ?) disimpan di memori: jumlah call, total/max durasi,
+jumlah baris. Query di atas DB_SLOW_QUERY_MS di-log dengan parameter
+disensor; di luar production SELECT lambat bisa otomatis di-EXPLAIN.
+Lihat statement_report() / endpoint /debug/queries. Multi-worker
+(METRICS_MULTIPROC_DIR): tiap worker menulis statistiknya ke
+<dir>/queries-<pid>.json bersama snapshot metric, report menggabungkan semua
+worker; reset berlaku ke semua worker lewat nomor generasi.
+
+Pool dibuat per proses (pid): worker gunicorn hasil fork tidak memakai
+socket milik master. AdvisoryLock dipakai supaya job background hanya
+jalan di satu worker.
+
+Environment:
+    DB_POOL_MIN            koneksi minimum (default 1)
+    DB_POOL_MAX            koneksi maksimum (default 10)
+    DB_POOL_TIMEOUT        detik menunggu koneksi kosong (default 5)
+    DB_SLOW_QUERY_MS       batas query lambat (default 200, 0 = nonaktif)
+    DB_EXPLAIN_SLOW        true = EXPLAIN (ANALYZE, BUFFERS) SELECT lambat
+                           (diabaikan kalau ENVIRONMENT=production)
+"""
+
+import glob
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from functools import lru_cache
+from typing import Optional, Tuple
+
+import psycopg2
+from psycopg2 import pool as pg_pool
+
+import metrics
+from metrics import Counter, Gauge, Histogram, read_json, write_json
+
+DATABASE_URL = os.environ.get("DATABASE_URL")
+DB_POOL_MIN = int(os.environ.get("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.environ.get("DB_POOL_MAX", "10"))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "5"))
+DB_SLOW_QUERY_MS = float(os.environ.get("DB_SLOW_QUERY_MS", "200"))
+IS_PRODUCTION = os.environ.get("ENVIRONMENT", "").lower() == "production"
+DB_EXPLAIN_SLOW = os.environ.get("DB_EXPLAIN_SLOW", "false").lower() == "true" and not IS_PRODUCTION
+
+# EXPLAIN ANALYZE menjalankan ulang query: maksimal sekali per fingerprint per interval
+EXPLAIN_INTERVAL_SECONDS = 60
+# Batas jumlah fingerprint yang disimpan (SQL dinamis tidak boleh bikin memori bocor)
+MAX_FINGERPRINTS = 500
+
+logger = logging.getLogger("dramamu-db")
+
+DB_QUERY_SECONDS = Histogram(
+    "dramamu_db_query_duration_seconds",
+    "Durasi eksekusi query per jenis statement",
+    ["operation", "outcome"],
+)
+DB_POOL_CONNECTIONS = Gauge("dramamu_db_pool_connections", "Koneksi pool per state", ["state"])
+DB_POOL_WAIT_SECONDS = Histogram(
+    "dramamu_db_pool_wait_seconds",
+    "Waktu menunggu koneksi dari pool",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0),
+)
+DB_POOL_ERRORS = Counter("dramamu_db_pool_errors_total", "Gagal ambil koneksi dari pool", ["reason"])
+
+
+def query_operation(sql) -> str:
+    """Kata pertama statement (SELECT/INSERT/...) sebagai label metric"""
+    if isinstance(sql, bytes):
+        sql = sql.decode("utf-8", "replace")
+    sql = str(sql).lstrip()
+    # Lewati komentar di awal query
+    while sql.startswith("--"):
+        sql = sql.split("\n", 1)[1].lstrip() if "\n" in sql else ""
+    return sql.split(None, 1)[0].upper() if sql else "UNKNOWN"
+
+
+# ==========================================================
+# 🔍 STATISTIK PER STATEMENT
+# ==========================================================
+_QUOTED = re.compile(r"'(?:[^']|'')*'")
+_COMMENT = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+_PARAM = re.compile(r"%\(\w+\)s|%s|\$\d+")
+_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=1024)
+def _fingerprint(sql: str) -> str:
+    sql = _COMMENT.sub(" ", sql)
+    sql = _QUOTED.sub("?", sql)
+    sql = _PARAM.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _LIST.sub("(?...)", sql)
+    return _SPACE.sub(" ", sql).strip().rstrip(";").strip()
+
+
+def fingerprint(sql) -> str:
+    """SQL ternormalisasi: literal, angka dan placeholder jadi ?, spasi dirapikan"""
+    if isinstance(sql, bytes):
+        sql = sql.decode("utf-8", "replace")
+    return _fingerprint(str(sql))
+
+
+def redact(params):
+    """Ganti nilai parameter dengan tipenya (nilai asli bisa berisi token / data user)"""
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {key: redact(value) for key, value in params.items()}
+    if isinstance(params, (list, tuple)):
+        return [redact(value) for value in params]
+    if isinstance(params, str):
+        return f"<str:{len(params)}>"
+    return f"<{type(params).__name__}>"
+
+
+class QueryStats:
+    """Agregat per fingerprint: calls, total/max detik, rows, errors, plan terakhir"""
+
+    def __init__(self, max_entries: int = MAX_FINGERPRINTS):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: dict = {}
+        self.dropped = 0
+        # Naik setiap reset multi-worker (lihat reset_statements)
+        self.generation = 0
+
+    def record(self, fp: str, seconds: float, rows: int, failed: bool):
+        with self._lock:
+            entry = self._entries.get(fp)
+            if entry is None:
+                if len(self._entries) >= self.max_entries:
+                    self.dropped += 1
+                    return
+                entry = self._entries[fp] = {
+                    "calls": 0, "total_seconds": 0.0, "max_seconds": 0.0, "rows": 0, "errors": 0,
+                    "last_plan": None, "last_explain": 0.0,
+                }
+            entry["calls"] += 1
+            entry["total_seconds"] += seconds
+            entry["max_seconds"] = max(entry["max_seconds"], seconds)
+            entry["rows"] += rows
+            entry["errors"] += failed
+
+    def claim_explain(self, fp: str) -> bool:
+        """True kalau fingerprint ini boleh di-EXPLAIN sekarang (rate limit)"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(fp)
+            if entry is None or now - entry["last_explain"] < EXPLAIN_INTERVAL_SECONDS:
+                return False
+            entry["last_explain"] = now
+            return True
+
+    def set_plan(self, fp: str, plan: str):
+        with self._lock:
+            if fp in self._entries:
+                self._entries[fp]["last_plan"] = plan
+
+    def entries(self) -> dict:
+        """Salinan statistik per fingerprint (tanpa state internal EXPLAIN)"""
+        with self._lock:
+            return {
+                fp: {k: v for k, v in entry.items() if k != "last_explain"}
+                for fp, entry in self._entries.items()
+            }
+
+    def top(self, limit: int = 20, order_by: str = "total") -> list:
+        return rank_statements(self.entries(), limit, order_by)
+
+    def reset(self):
+        with self._lock:
+            self._entries.clear()
+            self.dropped = 0
+
+
+query_stats = QueryStats()
+
+
+def rank_statements(entries: dict, limit: int = 20, order_by: str = "total") -> list:
+    keys = {
+        "total": lambda item: item[1]["total_seconds"],
+        "mean": lambda item: item[1]["total_seconds"] / item[1]["calls"],
+        "max": lambda item: item[1]["max_seconds"],
+        "calls": lambda item: item[1]["calls"],
+        "rows": lambda item: item[1]["rows"],
+    }
+    items = sorted(entries.items(), key=keys[order_by], reverse=True)
+    return [{
+        "fingerprint": fp,
+        "calls": entry["calls"],
+        "total_ms": round(entry["total_seconds"] * 1000, 2),
+        "mean_ms": round(entry["total_seconds"] * 1000 / entry["calls"], 3),
+        "max_ms": round(entry["max_seconds"] * 1000, 2),
+        "rows": entry["rows"],
+        "rows_per_call": round(entry["rows"] / entry["calls"], 2),
+        "errors": entry["errors"],
+        "last_plan": entry["last_plan"],
+    } for fp, entry in items[:limit]]
+
+
+# ==========================================================
+# 🧮 STATISTIK QUERY MULTI-WORKER
+# ==========================================================
+QUERY_RESET_FILE = "queries-reset.json"
+
+
+def _shared_dir() -> Optional[str]:
+    return metrics.METRICS_MULTIPROC_DIR
+
+
+def _current_generation() -> int:
+    return read_json(os.path.join(_shared_dir(), QUERY_RESET_FILE)).get("generation", 0)
+
+
+def write_query_snapshot():
+    """Tulis statistik proses ini ke queries-<pid>.json (reset dari worker lain diterapkan dulu)"""
+    directory = _shared_dir()
+    if not directory:
+        return
+    generation = _current_generation()
+    if generation > query_stats.generation:
+        query_stats.reset()
+        query_stats.generation = generation
+    write_json(os.path.join(directory, f"queries-{os.getpid()}.json"), {
+        "pid": os.getpid(),
+        "generation": query_stats.generation,
+        "dropped": query_stats.dropped,
+        "entries": query_stats.entries(),
+    })
+
+
+def _merge_statements() -> Tuple[dict, int, list]:
+    """Gabungan statistik worker dengan generasi terbaru: (entries, dropped, pid)"""
+    write_query_snapshot()
+    generation = query_stats.generation
+    merged: dict = {}
+    dropped = 0
+    pids = []
+    for path in sorted(glob.glob(os.path.join(_shared_dir(), "queries-[0-9]*.json"))):
+        data = read_json(path)
+        if data.get("generation") != generation:
+            # Worker yang belum menerapkan reset terakhir
+            continue
+        pids.append(data["pid"])
+        dropped += data["dropped"]
+        for fp, entry in data["entries"].items():
+            current = merged.get(fp)
+            if current is None:
+                merged[fp] = dict(entry)
+                continue
+            current["calls"] += entry["calls"]
+            current["total_seconds"] += entry["total_seconds"]
+            current["max_seconds"] = max(current["max_seconds"], entry["max_seconds"])
+            current["rows"] += entry["rows"]
+            current["errors"] += entry["errors"]
+            current["last_plan"] = current["last_plan"] or entry["last_plan"]
+    return merged, dropped, pids
+
+
+def statement_report(limit: int = 20, order_by: str = "total") -> dict:
+    """Top statement + jumlah fingerprint yang dibuang; gabungan semua worker kalau multi-worker"""
+    if not _shared_dir():
+        return {
+            "statements": query_stats.top(limit, order_by),
+            "dropped_fingerprints": query_stats.dropped,
+            "workers": [os.getpid()],
+        }
+    entries, dropped, pids = _merge_statements()
+    return {
+        "statements": rank_statements(entries, limit, order_by),
+        "dropped_fingerprints": dropped,
+        "workers": pids,
+    }
+
+
+def top_statements(limit: int = 20, order_by: str = "total") -> list:
+    return statement_report(limit, order_by)["statements"]
+
+
+def reset_statements():
+    """Kosongkan statistik; multi-worker: generasi baru, worker lain reset di flush berikutnya"""
+    directory = _shared_dir()
+    if directory:
+        write_json(os.path.join(directory, QUERY_RESET_FILE), {"generation": _current_generation() + 1})
+        write_query_snapshot()
+    else:
+        query_stats.reset()
+
+
+metrics.add_flush_hook(write_query_snapshot)
+
+
+class TimedCursor:
+    """
+    Wrapper cursor: execute/executemany diukur durasinya (metric per jenis
+    statement + statistik per fingerprint), query lambat di-log.
+    """
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, query, vars=None):
+        return self._timed(self._cursor.execute, query, vars, many=False)
+
+    def executemany(self, query, vars_list):
+        return self._timed(self._cursor.executemany, query, vars_list, many=True)
+
+    def _timed(self, method, query, vars, many):
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            result = method(query, vars)
+            outcome = "success"
+            return result
+        finally:
+            elapsed = time.perf_counter() - started
+            DB_QUERY_SECONDS.observe(elapsed, operation=query_operation(query), outcome=outcome)
+            fp = fingerprint(query)
+            rows = max(self._cursor.rowcount, 0) if outcome == "success" else 0
+            query_stats.record(fp, elapsed, rows, outcome == "error")
+            if DB_SLOW_QUERY_MS and elapsed * 1000 >= DB_SLOW_QUERY_MS:
+                self._log_slow(query, vars, fp, elapsed, rows, outcome, many)
+
+    def _log_slow(self, query, vars, fp, elapsed, rows, outcome, many):
+        logger.warning("🐢 Slow query", extra={
+            "fingerprint": fp,
+            "duration_ms": round(elapsed * 1000, 2),
+            "rows": rows,
+            "outcome": outcome,
+            "params": f"<{len(vars)} set>" if many and vars is not None else redact(vars),
+        })
+        if (DB_EXPLAIN_SLOW and outcome == "success" and not many
+                and query_operation(query) == "SELECT" and query_stats.claim_explain(fp)):
+            self._explain(query, vars, fp)
+
+    def _explain(self, query, vars, fp):
+        """EXPLAIN (ANALYZE, BUFFERS) di cursor terpisah (hasil query asli tidak terganggu)"""
+        if isinstance(query, bytes):
+            query = query.decode("utf-8", "replace")
+        conn = self._cursor.connection
+        # Savepoint: EXPLAIN yang gagal tidak boleh membatalkan transaksi pemanggil
+        savepoint = not conn.autocommit
+        try:
+            cursor = conn.cursor()
+            try:
+                if savepoint:
+                    cursor.execute("SAVEPOINT dramamu_explain")
+                try:
+                    cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS) {query}", vars)
+                    plan = "\n".join(row[0] for row in cursor.fetchall())
+                except Exception:
+                    if savepoint:
+                        cursor.execute("ROLLBACK TO SAVEPOINT dramamu_explain")
+                    raise
+                if savepoint:
+                    cursor.execute("RELEASE SAVEPOINT dramamu_explain")
+            finally:
+                cursor.close()
+        except Exception as e:
+            logger.warning(f"EXPLAIN gagal untuk query lambat: {e}", extra={"fingerprint": fp})
+            return
+        query_stats.set_plan(fp, plan)
+        logger.warning("🐢 Plan query lambat", extra={"fingerprint": fp, "plan": plan})
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cursor.close()
+
+
+class PooledConnection:
+    """Proxy koneksi dari pool; close() mengembalikan koneksi ke pool"""
+
+    def __init__(self, pool: "ConnectionPool", conn):
+        self._pool = pool
+        self._conn = conn
+
+    def cursor(self, *args, **kwargs):
+        return TimedCursor(self._conn.cursor(*args, **kwargs))
+
+    def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.release(conn)
+
+    @property
+    def closed(self):
+        return self._conn is None or self._conn.closed
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise psycopg2.InterfaceError("connection already returned to pool")
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Sama seperti psycopg2: commit kalau sukses, rollback kalau error
+        if self._conn is not None:
+            if exc_type is None:
+                self._conn.commit()
+            else:
+                self._conn.rollback()
+
+    def __del__(self):
+        # Jaga-jaga kalau ada jalur yang lupa close()
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """
+    ThreadedConnectionPool + semaphore: kalau semua koneksi terpakai,
+    pemanggil menunggu (maks DB_POOL_TIMEOUT) alih-alih langsung PoolError.
+    """
+
+    def __init__(self, dsn: str, minconn: int = DB_POOL_MIN, maxconn: int = DB_POOL_MAX,
+                 timeout: float = DB_POOL_TIMEOUT):
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self._pool = pg_pool.ThreadedConnectionPool(minconn, maxconn, dsn)
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        self.in_use = 0
+
+    def acquire(self) -> PooledConnection:
+        started = time.perf_counter()
+        if not self._slots.acquire(timeout=self.timeout):
+            DB_POOL_ERRORS.inc(reason="timeout")
+            raise pg_pool.PoolError(f"Tidak ada koneksi kosong dalam {self.timeout}s")
+        try:
+            conn = self._pool.getconn()
+        except Exception:
+            self._slots.release()
+            DB_POOL_ERRORS.inc(reason="connect")
+            raise
+        DB_POOL_WAIT_SECONDS.observe(time.perf_counter() - started)
+        with self._lock:
+            self.in_use += 1
+        return PooledConnection(self, conn)
+
+    def release(self, conn):
+        with self._lock:
+            self.in_use -= 1
+        try:
+            # Koneksi putus dibuang dari pool; transaksi terbuka di-rollback oleh pool
+            self._pool.putconn(conn, close=bool(conn.closed))
+        finally:
+            self._slots.release()
+
+    def stats(self) -> dict:
+        with self._lock:
+            in_use = self.in_use
+        idle = len(self._pool._pool)
+        return {"in_use": in_use, "idle": idle, "max": self.maxconn}
+
+    def closeall(self):
+        self._pool.closeall()
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_pid: Optional[int] = None
+_pool_lock = threading.Lock()
+
+
+# Pool warisan parent setelah fork: referensinya disimpan supaya tidak
+# di-GC (dealloc koneksi psycopg2 mengirim Terminate lewat socket parent)
+_inherited_pools: list = []
+
+
+def _reset_after_fork():
+    global _pool, _pool_pid, _pool_lock
+    if _pool is not None:
+        _inherited_pools.append(_pool)
+    _pool, _pool_pid = None, None
+    _pool_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_pool() -> Optional[ConnectionPool]:
+    """Pool dibuat lazy di pemakaian pertama, satu per proses"""
+    global _pool, _pool_pid
+    if (_pool is None or _pool_pid != os.getpid()) and DATABASE_URL:
+        with _pool_lock:
+            if _pool is None or _pool_pid != os.getpid():
+                _pool = ConnectionPool(DATABASE_URL)
+                _pool_pid = os.getpid()
+    return _pool if _pool_pid == os.getpid() else None
+
+
+def get_connection() -> PooledConnection:
+    pool = get_pool()
+    if pool is None:
+        raise RuntimeError("DATABASE_URL tidak tersedia!")
+    return pool.acquire()
+
+
+def warm_up() -> Optional[dict]:
+    """
+    Buat pool (DB_POOL_MIN koneksi dibuka di depan) + satu round-trip, supaya
+    request pertama setelah deploy tidak menanggung connect + TLS.
+    """
+    pool = get_pool()
+    if pool is None:
+        return None
+    conn = pool.acquire()
+    try:
+        cur = conn.cursor()
+        started = time.perf_counter()
+        cur.execute("SELECT 1")
+        cur.fetchone()
+        rtt = time.perf_counter() - started
+        cur.close()
+    finally:
+        conn.close()
+    return {"connections": pool.minconn, "rtt_ms": round(rtt * 1000, 2)}
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.closeall()
+        _pool = None
+
+
+# ==========================================================
+# 🔒 ADVISORY LOCK (job singleton antar worker / instance)
+# ==========================================================
+def advisory_key(name: str) -> int:
+    """Nama lock → bigint stabil untuk pg_try_advisory_lock"""
+    return int.from_bytes(hashlib.sha256(name.encode()).digest()[:8], "big", signed=True)
+
+
+class AdvisoryLock:
+    """
+    Session-level pg_try_advisory_lock di koneksi khusus (di luar pool).
+    Pemegang lock menyimpan koneksinya; kalau worker mati atau koneksi
+    putus, Postgres melepas lock dan worker lain mengambil alih di
+    percobaan berikutnya.
+    """
+
+    def __init__(self, name: str, dsn: Optional[str] = None):
+        self.name = name
+        self.key = advisory_key(name)
+        self.dsn = dsn or DATABASE_URL
+        self._conn = None
+
+    @property
+    def held(self) -> bool:
+        return self._conn is not None
+
+    def try_acquire(self) -> bool:
+        """True kalau proses ini (masih) memegang lock. Blocking, panggil lewat to_thread."""
+        if self._conn is not None:
+            try:
+                cur = self._conn.cursor()
+                cur.execute("SELECT 1")
+                cur.close()
+                return True
+            except psycopg2.Error:
+                logger.warning(f"Koneksi advisory lock {self.name} putus, lock dilepas")
+                self.release()
+
+        conn = psycopg2.connect(self.dsn)
+        conn.autocommit = True
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT pg_try_advisory_lock(%s)", (self.key,))
+            acquired = cur.fetchone()[0]
+            cur.close()
+        except Exception:
+            conn.close()
+            raise
+        if not acquired:
+            conn.close()
+            return False
+        self._conn = conn
+        return True
+
+    def release(self):
+        # Tutup koneksi = lock session-level ikut lepas
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except psycopg2.Error:
+                pass
+            self._conn = None
+
+
+def _pool_gauge():
+    pool = _pool
+    if pool is None:
+        return {}
+    stats = pool.stats()
+    return {("in_use",): stats["in_use"], ("idle",): stats["idle"], ("max",): stats["max"]}
+
+
+DB_POOL_CONNECTIONS.set_function(_pool_gauge)
@@ -7,16 +7,51 @@ Bisa digunakan untuk backup atau migrasi ke platform lain (Railway, Render, dll)
 
 Usage:
     python export_database.py
+    python export_database.py --itersize 10000
+    python export_database.py --format csv --jobs 4
+    python export_database.py --compress gzip
+    python export_database.py --format csv --incremental backup_YYYYMMDD_HHMMSS/
+    python export_database.py --tables movies,activity_logs,payments --since 7d
+    python export_database.py --exclude activity_logs --where "payments:status = 'settlement'"
     
 Output:
-    - backup_YYYYMMDD_HHMMSS.sql
+    - backup_YYYYMMDD_HHMMSS.sql[.gz|.zst] + backup_YYYYMMDD_HHMMSS.manifest.json
+      (format sql, default)
+    - backup_YYYYMMDD_HHMMSS/ berisi <table>.csv / <table>.bin (+ .gz/.zst) + manifest.json
+      (format csv/binary, pakai COPY ... TO STDOUT, tabel di-export paralel)
+
+Manifest mencatat jumlah baris dan checksum SHA-256 per tabel, dicek ulang
+oleh import_database.py saat restore.
+
+Incremental (--incremental <backup sebelumnya>): hanya baris yang baru/berubah
+sejak high-watermark backup sebelumnya (updated_at, atau created_at untuk
+tabel append-only, plus id). Restore: import base lalu increment berurutan:
+    python import_database.py backup_base/ backup_inc1/ backup_inc2/
+Catatan: baris yang di-DELETE tidak ikut increment, jadi tetap buat full
+backup berkala sebagai base baru.
+
+Export selektif (--tables / --exclude / --since / --until / --where):
+--since/--until memfilter created_at di semua tabel kecuali tabel referensi
+(users, movies); --where TABLE:PREDIKAT menggantikan filter waktu untuk
+tabel itu. Baris users/movies yang direferensikan (telegram_id, movie_id,
+rantai referred_by) ikut di-export supaya hasil restore tetap konsisten.
+Backup selektif tidak men-TRUNCATE apa pun: baris di-upsert berdasarkan id
+(INSERT ... ON CONFLICT (id) DO UPDATE), data di luar pilihan/rentang tetap.
 """
 
+import argparse
+import json
 import os
 import sys
-from datetime import datetime
+import math
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, time as dt_time, timedelta
+from decimal import Decimal
 import psycopg2
-from psycopg2.extras import RealDictCursor
+
+from backup_io import BackupWriter, COMPRESSIONS, compressed_name, sidecar_manifest_path
 
 def get_database_url():
     """Get DATABASE_URL dari environment variable"""
@@ -27,11 +62,141 @@ def get_database_url():
         sys.exit(1)
     return db_url
 
-def export_database():
-    """Export database ke file SQL"""
+# List of tables in correct order (respect foreign keys)
+TABLES = [
+    'users',
+    'movies',
+    'intermediary_queue',
+    'pending_actions',
+    'payments',
+    'activity_logs',
+    'requests',
+    'withdrawal_requests'
+]
+
+# Jumlah baris yang diambil per round-trip dari server-side cursor
+DEFAULT_ITERSIZE = 5000
+
+# Format COPY yang didukung → ekstensi file
+COPY_FORMATS = {'csv': 'csv', 'binary': 'bin'}
+MANIFEST_FILE = 'manifest.json'
+
+# Tabel referensi: tidak difilter --since/--until, isinya ditarik lewat
+# referential closure dari tabel lain (kolom penghubung → kolom kunci)
+REFERENCE_TABLES = {
+    'users': ('telegram_id', 'telegram_id'),
+    'movies': ('movie_id', 'id'),
+}
+
+# Mundurkan watermark sedikit: transaksi yang commit telat bisa punya
+# updated_at/created_at lebih tua dari snapshot sebelumnya. Duplikat aman
+# karena restore increment pakai upsert berdasarkan id.
+DEFAULT_OVERLAP_MINUTES = 10
+
+def format_value(val):
+    """Format satu nilai Python menjadi literal SQL (tanpa kehilangan presisi)"""
+    if val is None:
+        return 'NULL'
+    elif isinstance(val, bool):
+        # Cek bool sebelum int: bool adalah subclass int
+        return 'TRUE' if val else 'FALSE'
+    elif isinstance(val, int):
+        return str(val)
+    elif isinstance(val, float):
+        if math.isnan(val) or math.isinf(val):
+            return f"'{val}'::float8".replace('inf', 'Infinity').replace('nan', 'NaN')
+        return repr(val)
+    elif isinstance(val, Decimal):
+        if not val.is_finite():
+            return "'NaN'::numeric" if val.is_nan() else f"'{'-' if val < 0 else ''}Infinity'::numeric"
+        return str(val)
+    elif isinstance(val, (datetime, date, dt_time)):
+        # isoformat: mikrodetik + offset timezone ikut tersimpan
+        return f"'{val.isoformat()}'"
+    elif isinstance(val, timedelta):
+        return f"'{val.total_seconds()} seconds'::interval"
+    elif isinstance(val, (bytes, memoryview)):
+        return f"'\\x{bytes(val).hex()}'::bytea"
+    elif isinstance(val, (dict, list)):
+        # For JSONB columns
+        json_str = json.dumps(val).replace("'", "''")
+        return f"'{json_str}'::jsonb"
+    else:
+        # String - escape single quotes
+        escaped = str(val).replace("'", "''")
+        return f"'{escaped}'"
+
+def estimate_rows(conn, table):
+    """Estimasi jumlah baris dari statistik planner (tanpa full scan)"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", (table,))
+    row = cursor.fetchone()
+    cursor.close()
+    return max(row[0], 0) if row else 0
+
+def export_table_sql(conn, f, table, itersize=DEFAULT_ITERSIZE, where=None, upsert=False):
+    """
+    Stream isi satu tabel ke file sebagai INSERT statement.
+    Pakai named (server-side) cursor: hanya `itersize` baris yang ada di
+    memori dalam satu waktu, berapapun ukuran tabelnya.
+    `upsert` (backup selektif): INSERT ... ON CONFLICT (id) DO UPDATE,
+    pengosongan tabel jadi urusan caller (hanya untuk full backup).
+    Return jumlah baris yang di-export.
+    """
+    estimate = 0 if where else estimate_rows(conn, table)
+    cursor = conn.cursor(name=f"export_{table}")
+    cursor.itersize = itersize
+    cursor.execute(f"SELECT * FROM {table}" + (f" WHERE {where}" if where else ""))
+
+    started = time.perf_counter()
+    count = 0
+    insert_prefix = None
+    insert_suffix = ");\n"
+
+    # Write table comment
+    f.write(f"-- ================================================\n")
+    f.write(f"-- TABLE: {table}\n")
+    f.write(f"-- ================================================\n\n")
+
+    while True:
+        rows = cursor.fetchmany(itersize)
+        if not rows:
+            break
+
+        if insert_prefix is None:
+            columns = [desc[0] for desc in cursor.description]
+            insert_prefix = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ("
+            if upsert:
+                updates = ', '.join(f"{col} = EXCLUDED.{col}" for col in columns if col != 'id')
+                insert_suffix = f") ON CONFLICT (id) DO UPDATE SET {updates};\n"
+
+        # Generate INSERT statements (satu write per batch)
+        f.write(''.join(
+            insert_prefix + ', '.join(format_value(val) for val in row) + insert_suffix
+            for row in rows
+        ))
+        count += len(rows)
+
+        elapsed = time.perf_counter() - started
+        total = max(estimate, count)
+        print(f"\r   ⏳ {count}/{total} rows ({count / elapsed if elapsed else 0:.0f} rows/s)", end='', flush=True)
+
+    cursor.close()
+
+    if count == 0:
+        print(f"   ⚠️  Table '{table}' kosong, skip.")
+        f.write(f"-- Table {table}: 0 rows (skipped)\n\n")
+    else:
+        print(f"\r   ✅ {count} rows ({time.perf_counter() - started:.1f}s)" + " " * 20)
+        f.write(f"-- TABLE {table}: {count} rows\n\n\n")
+
+    return count
+
+def export_database(itersize=DEFAULT_ITERSIZE, compression='none', snapshot=None, selection=None):
+    """Export database ke file SQL, return nama file"""
     db_url = get_database_url()
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    filename = f"backup_{timestamp}.sql"
+    filename = compressed_name(f"backup_{timestamp}.sql", compression)
     
     print(f"📦 Memulai export database...")
     print(f"📍 Database: {db_url.split('@')[1] if '@' in db_url else 'local'}")
@@ -39,12 +204,17 @@ def export_database():
     print()
     
     try:
-        # Connect ke database
-        conn = psycopg2.connect(db_url)
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        # Connect ke database; satu transaksi REPEATABLE READ untuk semua
+        # tabel supaya backup konsisten di satu titik waktu
+        conn = open_snapshot_connection(db_url, snapshot)
+        cursor = conn.cursor()
+        tables, filters = resolve_selection(conn, selection)
+        partial = selection is not None
         
-        # Buka file untuk write
-        with open(filename, 'w', encoding='utf-8') as f:
+        table_infos = []
+
+        # Buka file untuk write (buffered, opsional terkompresi)
+        with BackupWriter(filename, compression) as f:
             # Header
             f.write("-- ================================================\n")
             f.write("-- DRAMAMU DATABASE BACKUP\n")
@@ -52,79 +222,25 @@ def export_database():
             f.write("-- ================================================\n\n")
             f.write("-- Disable triggers during import\n")
             f.write("SET session_replication_role = 'replica';\n\n")
-            
-            # List of tables in correct order (respect foreign keys)
-            tables = [
-                'users',
-                'movies',
-                'intermediary_queue',
-                'pending_actions',
-                'payments',
-                'activity_logs',
-                'requests',
-                'withdrawal_requests'
-            ]
+            if partial:
+                f.write("-- BACKUP SELEKTIF: tidak ada TRUNCATE, baris di-upsert berdasarkan id.\n")
+                f.write("-- Data di database tujuan di luar pilihan/rentang export tidak disentuh.\n\n")
+            else:
+                # Satu TRUNCATE untuk semua tabel (tanpa CASCADE): kalau ada tabel
+                # lain yang mereferensikan tabel ini, import gagal alih-alih ikut
+                # mengosongkan tabel yang tidak ada di backup
+                f.write("-- WARNING: import MENGHAPUS seluruh isi tabel berikut sebelum insert\n")
+                f.write(f"TRUNCATE TABLE {', '.join(tables)};\n\n")
             
             total_rows = 0
             
             for table in tables:
-                print(f"📊 Exporting table: {table}")
-                
-                # Get row count
-                cursor.execute(f"SELECT COUNT(*) FROM {table}")
-                count = cursor.fetchone()['count']
-                total_rows += count
-                
-                if count == 0:
-                    print(f"   ⚠️  Table '{table}' kosong, skip.")
-                    f.write(f"-- Table {table}: 0 rows (skipped)\n\n")
-                    continue
-                
-                print(f"   ✅ {count} rows")
-                
-                # Get all data
-                cursor.execute(f"SELECT * FROM {table}")
-                rows = cursor.fetchall()
-                
-                # Write table comment
-                f.write(f"-- ================================================\n")
-                f.write(f"-- TABLE: {table} ({count} rows)\n")
-                f.write(f"-- ================================================\n\n")
-                
-                # Truncate table before insert (untuk clean import)
-                f.write(f"TRUNCATE TABLE {table} CASCADE;\n\n")
-                
-                # Generate INSERT statements
-                for row in rows:
-                    columns = list(row.keys())
-                    values = []
-                    
-                    for col in columns:
-                        val = row[col]
-                        if val is None:
-                            values.append('NULL')
-                        elif isinstance(val, (int, float)):
-                            values.append(str(val))
-                        elif isinstance(val, bool):
-                            values.append('TRUE' if val else 'FALSE')
-                        elif isinstance(val, datetime):
-                            values.append(f"'{val.strftime('%Y-%m-%d %H:%M:%S')}'")
-                        elif isinstance(val, dict):
-                            # For JSONB columns
-                            import json
-                            json_str = json.dumps(val).replace("'", "''")
-                            values.append(f"'{json_str}'::jsonb")
-                        else:
-                            # String - escape single quotes
-                            escaped = str(val).replace("'", "''")
-                            values.append(f"'{escaped}'")
-                    
-                    cols_str = ', '.join(columns)
-                    vals_str = ', '.join(values)
-                    
-                    f.write(f"INSERT INTO {table} ({cols_str}) VALUES ({vals_str});\n")
-                
-                f.write("\n\n")
+                print(f"📊 Exporting table: {table}" + (" (filter)" if table in filters else ""))
+                f.begin_section()
+                rows = export_table_sql(conn, f, table, itersize, filters.get(table), upsert=partial)
+                sha256, size = f.end_section()
+                table_infos.append({"name": table, "rows": rows, "sha256": sha256, "bytes": size})
+                total_rows += rows
             
             # Re-enable triggers
             f.write("-- Re-enable triggers\n")
@@ -143,6 +259,23 @@ def export_database():
                     f.write(f"SELECT setval('{table}_id_seq', (SELECT COALESCE(MAX(id), 1) FROM {table}));\n")
             
             f.write("\n-- BACKUP COMPLETE\n")
+
+        # Sidecar manifest: checksum seluruh file + per tabel
+        manifest = {
+            "version": 1,
+            "format": "sql",
+            "file": os.path.basename(filename),
+            "compression": compression,
+            "generated": datetime.now().isoformat(),
+            "sha256": f.sha256,
+            "bytes": f.bytes_written,
+            "compressed_bytes": f.compressed_bytes,
+            "tables": table_infos,
+            "partial": partial,
+            "filters": filters,
+        }
+        with open(sidecar_manifest_path(filename), 'w', encoding='utf-8') as mf:
+            json.dump(manifest, mf, indent=2)
         
         cursor.close()
         conn.close()
@@ -154,15 +287,394 @@ def export_database():
         print("=" * 60)
         print(f"📄 File: {filename}")
         print(f"📊 Total rows exported: {total_rows}")
+        print(f"💾 Size: {manifest['compressed_bytes'] / 1024 / 1024:.1f} MB "
+              f"(raw {manifest['bytes'] / 1024 / 1024:.1f} MB)")
         print()
         print("📋 Next Steps:")
-        print("   1. Upload file ini ke platform baru (Railway/Render)")
-        print("   2. Import dengan: psql $DATABASE_URL < " + filename)
+        print("   1. Upload file ini (dan .manifest.json) ke platform baru (Railway/Render)")
+        print("   2. Import dengan: python import_database.py " + filename)
         print()
+        return filename
         
     except Exception as e:
         print(f"\n❌ ERROR: {e}")
         sys.exit(1)
 
+# ==========================================================
+# EXPORT SELEKTIF
+# ==========================================================
+def parse_time_arg(value):
+    """'7d' / '12h' / '30m' (relatif dari sekarang) atau tanggal ISO"""
+    match = re.fullmatch(r"(\d+)([dhm])", value.strip())
+    if match:
+        unit = {'d': 'days', 'h': 'hours', 'm': 'minutes'}[match.group(2)]
+        return datetime.now().astimezone() - timedelta(**{unit: int(match.group(1))})
+    return datetime.fromisoformat(value)
+
+def parse_table_list(value):
+    tables = [t.strip() for t in value.split(',') if t.strip()]
+    unknown = [t for t in tables if t not in TABLES]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"tabel tidak dikenal: {', '.join(unknown)}")
+    return tables
+
+def parse_where(value):
+    """'TABLE:PREDIKAT' → (table, predikat)"""
+    table, sep, predicate = value.partition(':')
+    table = table.strip()
+    if not sep or not predicate.strip():
+        raise argparse.ArgumentTypeError("format --where harus TABLE:PREDIKAT")
+    if table not in TABLES:
+        raise argparse.ArgumentTypeError(f"tabel tidak dikenal: {table}")
+    return table, predicate.strip()
+
+def resolve_selection(conn, selection):
+    """
+    Terjemahkan pilihan export selektif menjadi (tabel yang di-export,
+    {tabel: predikat WHERE}). Tanpa selection → semua tabel, tanpa filter.
+
+    selection: {"tables", "exclude", "since", "until", "where": {tabel: predikat}, "closure"}
+    """
+    if not selection:
+        return list(TABLES), {}
+
+    chosen = selection.get("tables") or TABLES
+    exclude = set(selection.get("exclude") or [])
+    selected = [t for t in TABLES if t in chosen and t not in exclude]
+    wheres = selection.get("where") or {}
+    cursor = conn.cursor()
+
+    filters = {}
+    for table in selected:
+        if table in wheres:
+            filters[table] = wheres[table]
+        elif table not in REFERENCE_TABLES:
+            conditions = []
+            if selection.get("since"):
+                conditions.append(cursor.mogrify("created_at >= %s", (selection["since"],)).decode())
+            if selection.get("until"):
+                conditions.append(cursor.mogrify("created_at < %s", (selection["until"],)).decode())
+            if conditions:
+                filters[table] = ' AND '.join(conditions)
+
+    tables = list(selected)
+    if selection.get("closure", True):
+        for ref_table, (link_column, key_column) in REFERENCE_TABLES.items():
+            # Tabel referensi yang dipilih tanpa filter sudah lengkap
+            if ref_table in selected and ref_table not in filters:
+                continue
+            sources = [
+                f"SELECT {link_column} FROM {table}" + (f" WHERE {filters[table]}" if table in filters else "")
+                for table in selected
+                if table != ref_table and link_column in get_table_columns(conn, table)
+            ]
+            if not sources:
+                continue
+            referenced = ' UNION '.join(sources)
+            if ref_table == 'users':
+                # Ikutkan rantai referrer supaya FK referred_by tetap valid
+                referenced = f"""
+                    WITH RECURSIVE closure(telegram_id) AS (
+                        {referenced}
+                        UNION
+                        SELECT u.referred_by FROM users u
+                        JOIN closure c ON u.telegram_id = c.telegram_id
+                        WHERE u.referred_by IS NOT NULL
+                    )
+                    SELECT telegram_id FROM closure
+                """
+            closure = f"{key_column} IN ({referenced})"
+            filters[ref_table] = f"({filters[ref_table]}) OR {closure}" if ref_table in filters else closure
+            if ref_table not in tables:
+                tables.append(ref_table)
+
+    cursor.close()
+    # Urutan tetap mengikuti TABLES (users/movies dulu)
+    return [t for t in TABLES if t in tables], filters
+
+# ==========================================================
+# COPY EXPORT (PARALEL)
+# ==========================================================
+def get_table_columns(conn, table):
+    """List kolom tabel sesuai urutan ordinal"""
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT column_name
+        FROM information_schema.columns
+        WHERE table_schema = 'public' AND table_name = %s
+        ORDER BY ordinal_position
+    """, (table,))
+    columns = [row[0] for row in cursor.fetchall()]
+    cursor.close()
+    return columns
+
+def get_sequence_values(conn, tables):
+    """Nilai sequence kolom id per tabel: {table: {"sequence", "last_value", "is_called"}}"""
+    sequences = {}
+    cursor = conn.cursor()
+    for table in tables:
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", (table,))
+        row = cursor.fetchone()
+        if not row or not row[0]:
+            continue
+        sequence = row[0]
+        cursor.execute(f"SELECT last_value, is_called FROM {sequence}")
+        last_value, is_called = cursor.fetchone()
+        sequences[table] = {"sequence": sequence, "last_value": last_value, "is_called": is_called}
+    cursor.close()
+    return sequences
+
+def open_snapshot_connection(db_url, snapshot=None):
+    """
+    Koneksi read-only REPEATABLE READ. Kalau `snapshot` diisi, transaksi
+    ditempel ke snapshot yang di-export koordinator (pg_export_snapshot),
+    jadi semua worker melihat data di titik waktu yang sama.
+    """
+    conn = psycopg2.connect(db_url)
+    conn.set_session(isolation_level='REPEATABLE READ', readonly=True)
+    if snapshot:
+        cursor = conn.cursor()
+        cursor.execute("SET TRANSACTION SNAPSHOT %s", (snapshot,))
+        cursor.close()
+    return conn
+
+def export_snapshot(conn):
+    """Export snapshot transaksi koordinator supaya bisa dipakai worker lain"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT pg_export_snapshot()")
+    snapshot = cursor.fetchone()[0]
+    cursor.close()
+    return snapshot
+
+def change_column(columns):
+    """Kolom penanda perubahan: updated_at kalau ada, selain itu created_at"""
+    return 'updated_at' if 'updated_at' in columns else 'created_at'
+
+def get_watermarks(conn, tables):
+    """High-watermark per tabel di snapshot koordinator"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT NOW()")
+    snapshot_time = cursor.fetchone()[0]
+    watermarks = {}
+    for table in tables:
+        cursor.execute(f"SELECT MAX(id) FROM {table}")
+        watermarks[table] = {
+            "column": change_column(get_table_columns(conn, table)),
+            "value": snapshot_time.isoformat(),
+            "max_id": cursor.fetchone()[0] or 0,
+        }
+    cursor.close()
+    return watermarks
+
+def load_manifest(path):
+    """Baca manifest dari folder backup atau path manifest.json langsung"""
+    if os.path.isdir(path):
+        path = os.path.join(path, MANIFEST_FILE)
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def export_table_copy(db_url, table, out_dir, fmt, snapshot=None, compression='none', since=None,
+                      where=None):
+    """
+    Export satu tabel dengan COPY ... TO STDOUT di koneksi sendiri.
+    Data langsung di-stream dari server ke file tanpa diformat di Python.
+    `since` (watermark backup sebelumnya) → hanya baris baru/berubah.
+    `where` → predikat export selektif (lihat resolve_selection).
+    """
+    started = time.perf_counter()
+    filename = compressed_name(f"{table}.{COPY_FORMATS[fmt]}", compression)
+    path = os.path.join(out_dir, filename)
+
+    conn = open_snapshot_connection(db_url, snapshot)
+    try:
+        columns = get_table_columns(conn, table)
+        cursor = conn.cursor()
+        conditions = [f"({where})"] if where else []
+        if since:
+            column = change_column(columns)
+            conditions.append(cursor.mogrify(
+                f"({column} > %s::timestamptz - make_interval(mins => %s) OR id > %s)",
+                (since["value"], since["overlap_minutes"], since["max_id"])
+            ).decode())
+        if conditions:
+            source = f"(SELECT {', '.join(columns)} FROM {table} WHERE {' AND '.join(conditions)})"
+        else:
+            source = f"{table} ({', '.join(columns)})"
+        with BackupWriter(path, compression) as f:
+            cursor.copy_expert(f"COPY {source} TO STDOUT WITH (FORMAT {fmt})", f)
+        # psycopg2 mengisi rowcount dari command tag "COPY n"
+        rows = cursor.rowcount
+        cursor.close()
+        conn.commit()
+    finally:
+        conn.close()
+
+    return {
+        "name": table,
+        "file": filename,
+        "rows": rows,
+        "columns": columns,
+        "sha256": f.sha256,
+        "bytes": f.bytes_written,
+        "compressed_bytes": f.compressed_bytes,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+def export_database_copy(fmt='csv', jobs=4, compression='none', incremental_from=None,
+                         overlap_minutes=DEFAULT_OVERLAP_MINUTES, snapshot=None, selection=None):
+    """
+    Export semua tabel via COPY secara paralel + manifest untuk restore.
+    `snapshot` opsional: pakai snapshot yang di-export pemanggil (mis. verify_backup.py).
+    Return nama folder backup.
+    """
+    db_url = get_database_url()
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    out_dir = f"backup_{timestamp}"
+
+    parent = load_manifest(incremental_from) if incremental_from else None
+    if parent and "watermarks" not in parent:
+        print("❌ ERROR: Backup sebelumnya tidak punya watermark, buat full backup dulu.")
+        sys.exit(1)
+    if parent and (parent.get("filters") or parent.get("kind") == "partial"):
+        print("❌ ERROR: Backup selektif tidak bisa jadi dasar incremental.")
+        sys.exit(1)
+
+    since_by_table = {}
+    if parent:
+        for table in TABLES:
+            watermark = parent["watermarks"].get(table)
+            if watermark:
+                since_by_table[table] = {**watermark, "overlap_minutes": overlap_minutes}
+
+    kind = "incremental" if parent else "partial" if selection is not None else "full"
+    print(f"📦 Memulai export database {kind} (COPY {fmt}, {jobs} worker)...")
+    if parent:
+        print(f"↪️  Sejak backup {parent['backup_id']} (watermark {next(iter(parent['watermarks'].values()))['value']})")
+    print(f"📍 Database: {db_url.split('@')[1] if '@' in db_url else 'local'}")
+    print(f"📁 Output dir: {out_dir}")
+    print()
+
+    coordinator = None
+    try:
+        os.makedirs(out_dir)
+        started = time.perf_counter()
+
+        # Koordinator pegang transaksi REPEATABLE READ sampai semua worker
+        # selesai; worker menempel ke snapshot-nya (tanpa lock ke write produksi)
+        coordinator = open_snapshot_connection(db_url, snapshot)
+        snapshot = snapshot or export_snapshot(coordinator)
+        print(f"📸 Snapshot: {snapshot}")
+        tables, filters = resolve_selection(coordinator, selection)
+
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            futures = {
+                table: executor.submit(export_table_copy, db_url, table, out_dir, fmt, snapshot, compression,
+                                       since_by_table.get(table), filters.get(table))
+                for table in tables
+            }
+            results = {}
+            for table, future in futures.items():
+                results[table] = future.result()
+                info = results[table]
+                print(f"📊 {table}: {info['rows']} rows, {info['compressed_bytes'] / 1024 / 1024:.1f} MB ({info['seconds']}s)")
+
+        sequences = get_sequence_values(coordinator, tables)
+        watermarks = get_watermarks(coordinator, tables)
+        coordinator.rollback()
+        coordinator.close()
+        coordinator = None
+
+        manifest = {
+            "version": 1,
+            "backup_id": out_dir,
+            "kind": kind,
+            "parent": parent["backup_id"] if parent else None,
+            "base": (parent.get("base") or parent["backup_id"]) if parent else None,
+            "format": fmt,
+            "compression": compression,
+            "generated": datetime.now().isoformat(),
+            "snapshot": snapshot,
+            "tables": [results[table] for table in tables],
+            "sequences": sequences,
+            "watermarks": watermarks,
+            "filters": filters,
+        }
+        with open(os.path.join(out_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+
+        elapsed = time.perf_counter() - started
+        total_rows = sum(info["rows"] for info in results.values())
+        total_bytes = sum(info["bytes"] for info in results.values())
+        stored_bytes = sum(info["compressed_bytes"] for info in results.values())
+
+        # Summary
+        print()
+        print("=" * 60)
+        print("✅ EXPORT BERHASIL!")
+        print("=" * 60)
+        print(f"📁 Folder: {out_dir}")
+        print(f"📊 Total rows exported: {total_rows}")
+        print(f"💾 Size: {stored_bytes / 1024 / 1024:.1f} MB (raw {total_bytes / 1024 / 1024:.1f} MB)")
+        print(f"⏱️  {elapsed:.1f}s ({total_rows / elapsed:.0f} rows/s, {total_bytes / 1024 / 1024 / elapsed:.1f} MB/s)")
+        print()
+        print("📋 Next Steps:")
+        if parent:
+            print("   1. Simpan folder ini bersama base + increment sebelumnya")
+            print(f"   2. Restore berurutan: python import_database.py <base> ... {out_dir}")
+        else:
+            print("   1. Upload folder ini ke platform baru (Railway/Render)")
+            print(f"   2. Import dengan: python import_database.py {out_dir}")
+        print()
+        return out_dir
+
+    except Exception as e:
+        print(f"\n❌ ERROR: {e}")
+        sys.exit(1)
+    finally:
+        if coordinator is not None:
+            coordinator.close()
+
 if __name__ == "__main__":
-    export_database()
+    parser = argparse.ArgumentParser(description="Export database Dramamu ke file SQL")
+    parser.add_argument("--format", choices=["sql"] + list(COPY_FORMATS), default="sql",
+                        help="sql = INSERT statements, csv/binary = COPY per tabel + manifest")
+    parser.add_argument("--jobs", type=int, default=4, help="Jumlah worker paralel (format csv/binary)")
+    parser.add_argument("--compress", choices=list(COMPRESSIONS), default="none",
+                        help="Kompresi output (zstd butuh package zstandard)")
+    parser.add_argument("--incremental", metavar="BACKUP",
+                        help="Folder/manifest backup sebelumnya; export hanya perubahan sejak itu")
+    parser.add_argument("--overlap-minutes", type=int, default=DEFAULT_OVERLAP_MINUTES,
+                        help="Margin watermark untuk transaksi yang commit terlambat")
+    parser.add_argument("--itersize", type=int, default=DEFAULT_ITERSIZE,
+                        help="Jumlah baris per fetch dari server-side cursor (format sql)")
+    parser.add_argument("--tables", type=parse_table_list, help="Hanya tabel ini (pisahkan dengan koma)")
+    parser.add_argument("--exclude", type=parse_table_list, help="Lewati tabel ini (pisahkan dengan koma)")
+    parser.add_argument("--since", type=parse_time_arg, help="created_at >= waktu ini (ISO atau 7d/12h/30m)")
+    parser.add_argument("--until", type=parse_time_arg, help="created_at < waktu ini (ISO atau 7d/12h/30m)")
+    parser.add_argument("--where", type=parse_where, action="append", default=[], metavar="TABLE:PREDIKAT",
+                        help="Predikat WHERE per tabel, bisa diulang")
+    parser.add_argument("--no-closure", action="store_true",
+                        help="Jangan tarik baris users/movies yang direferensikan")
+    args = parser.parse_args()
+
+    selection = None
+    if args.tables or args.exclude or args.since or args.until or args.where:
+        if args.incremental:
+            parser.error("--incremental tidak bisa digabung dengan export selektif")
+        selection = {
+            "tables": args.tables,
+            "exclude": args.exclude,
+            "since": args.since,
+            "until": args.until,
+            "where": dict(args.where),
+            "closure": not args.no_closure,
+        }
+
+    if args.format == "sql":
+        if args.incremental:
+            parser.error("--incremental hanya untuk format csv/binary")
+        export_database(itersize=args.itersize, compression=args.compress, selection=selection)
+    else:
+        export_database_copy(fmt=args.format, jobs=args.jobs, compression=args.compress,
+                             incremental_from=args.incremental, overlap_minutes=args.overlap_minutes,
+                             selection=selection)
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Fake Midtrans Server (untuk testing lokal)
+==========================================
+Tiruan minimal Snap API + Core API status supaya create_payment,
+reconcile_payments.py dan benchmark bisa jalan tanpa sandbox Midtrans.
+
+Endpoint:
+    POST /snap/v1/transactions      → {"token", "redirect_url"}
+    GET  /v2/{order_id}/status      → status transaksi
+
+Usage:
+    python fake_midtrans.py --port 8900 --latency-ms 50 \\
+        --status-mix settlement=0.6,expire=0.2,pending=0.1,404=0.1
+
+Lalu arahkan aplikasi ke server ini:
+    MIDTRANS_SNAP_BASE_URL=http://127.0.0.1:8900/snap/v1
+    MIDTRANS_API_BASE_URL=http://127.0.0.1:8900
+"""
+
+import argparse
+import asyncio
+import hashlib
+import random
+import uuid
+from datetime import datetime
+
+from aiohttp import web
+
+DEFAULT_STATUS_MIX = "settlement=0.6,expire=0.2,pending=0.1,404=0.1"
+
+PAYMENT_TYPES = ["qris", "gopay", "bank_transfer", "shopeepay"]
+
+
+def parse_status_mix(spec: str) -> list:
+    """'settlement=0.6,404=0.4' → [('settlement', 0.6), ('404', 1.0)] (kumulatif)"""
+    entries = []
+    total = 0.0
+    for part in spec.split(","):
+        if not part.strip():
+            continue
+        name, _, weight = part.partition("=")
+        total += float(weight or 1)
+        entries.append((name.strip(), total))
+    return [(name, cumulative / total) for name, cumulative in entries]
+
+
+def pick_status(order_id: str, status_mix: list) -> str:
+    # Deterministik per order_id supaya run ulang (resume) dapat hasil sama
+    point = int(hashlib.sha256(order_id.encode()).hexdigest()[:8], 16) / 0xFFFFFFFF
+    for name, cumulative in status_mix:
+        if point <= cumulative:
+            return name
+    return status_mix[-1][0]
+
+
+def create_app(latency_ms: float = 0.0, error_rate: float = 0.0, status_mix: str = DEFAULT_STATUS_MIX) -> web.Application:
+    app = web.Application()
+    app["latency"] = latency_ms / 1000
+    app["error_rate"] = error_rate
+    app["status_mix"] = parse_status_mix(status_mix)
+    app["orders"] = {}
+    app["calls"] = {"create_transaction": 0, "transaction_status": 0}
+
+    async def simulate(request: web.Request):
+        if request.app["latency"]:
+            await asyncio.sleep(request.app["latency"])
+        if request.app["error_rate"] and random.random() < request.app["error_rate"]:
+            raise web.HTTPServiceUnavailable(text='{"status_code": "503", "status_message": "fake outage"}',
+                                             content_type="application/json")
+
+    async def create_transaction(request: web.Request):
+        request.app["calls"]["create_transaction"] += 1
+        await simulate(request)
+        body = await request.json()
+        order_id = body.get("transaction_details", {}).get("order_id")
+        if not order_id:
+            return web.json_response({"error_messages": ["transaction_details.order_id is required"]}, status=400)
+        if order_id in request.app["orders"]:
+            return web.json_response({"error_messages": ["transaction_details.order_id sudah digunakan"]}, status=400)
+
+        token = str(uuid.uuid4())
+        request.app["orders"][order_id] = {
+            "gross_amount": body.get("transaction_details", {}).get("gross_amount"),
+            "token": token,
+        }
+        return web.json_response({
+            "token": token,
+            "redirect_url": f"http://{request.host}/snap/v2/vtweb/{token}",
+        }, status=201)
+
+    async def transaction_status(request: web.Request):
+        request.app["calls"]["transaction_status"] += 1
+        await simulate(request)
+        order_id = request.match_info["order_id"]
+        status = pick_status(order_id, request.app["status_mix"])
+        if status == "404":
+            return web.json_response(
+                {"status_code": "404", "status_message": "Transaction doesn't exist."}, status=404
+            )
+
+        order = request.app["orders"].get(order_id, {})
+        return web.json_response({
+            "status_code": "201" if status == "pending" else "200",
+            "status_message": "Success, transaction is found",
+            "transaction_id": str(uuid.uuid5(uuid.NAMESPACE_URL, order_id)),
+            "order_id": order_id,
+            "gross_amount": f"{order.get('gross_amount') or 10000}.00",
+            "payment_type": PAYMENT_TYPES[len(order_id) % len(PAYMENT_TYPES)],
+            "transaction_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "transaction_status": status,
+            "fraud_status": "accept",
+        })
+
+    async def stats(request: web.Request):
+        return web.json_response(request.app["calls"])
+
+    app.router.add_post("/snap/v1/transactions", create_transaction)
+    app.router.add_get("/v2/{order_id}/status", transaction_status)
+    app.router.add_get("/_stats", stats)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Midtrans server untuk testing lokal")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Delay buatan per request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probabilitas respon 503 (0-1)")
+    parser.add_argument("--status-mix", default=DEFAULT_STATUS_MIX,
+                        help="Distribusi transaction_status untuk endpoint status")
+    args = parser.parse_args()
+
+    print(f"🧪 Fake Midtrans jalan di http://{args.host}:{args.port}")
+    web.run_app(
+        create_app(args.latency_ms, args.error_rate, args.status_mix),
+        host=args.host, port=args.port, print=None,
+    )
@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+"""
+Fake Telegram Bot API (untuk testing lokal)
+===========================================
+Tiruan Bot API supaya bot.py dan pengiriman film bisa diuji / di-benchmark
+tanpa api.telegram.org.
+
+Endpoint Bot API (token bebas):
+    getMe, getUpdates (long polling), setWebhook, deleteWebhook, getWebhookInfo,
+    sendMessage, sendPhoto, sendDocument (+ beberapa method no-op yang dipanggil PTB)
+
+Endpoint kontrol:
+    POST /_inject      update (object atau list) → antrian getUpdates / POST ke webhook
+    GET  /_stats       jumlah call per method + outcome, latency update → balasan
+                       pertama bot ke chat yang sama, dan kapan bot terakhir aktif
+
+Latency: tiap update dicatat sekali, pada send* pertama ke chat-nya setelah
+update itu diambil bot (getUpdates / webhook). Send berikutnya (film +
+konfirmasi + menu) tidak menggeser pencocokan update lain dari chat yang
+sama; satu send menjawab semua update chat itu yang sudah diambil.
+    POST /_reset       kosongkan statistik
+
+Simulasi gangguan:
+    --latency-ms / --jitter-ms   delay per call
+    --retry-after-rate           fraksi call send* yang dijawab 429 + retry_after
+    --forbidden-users            chat_id yang "memblokir bot" (403 Forbidden)
+
+Usage:
+    python fake_telegram.py --port 8901 --latency-ms 30 --retry-after-rate 0.05
+    BOT_TOKEN=123:fake TELEGRAM_API_BASE_URL=http://127.0.0.1:8901 python bot.py
+    python replay_updates.py --rate 50 --count 1000     # kirim update sintetis
+
+Lalu arahkan aplikasi ke server ini:
+    TELEGRAM_API_BASE_URL=http://127.0.0.1:8901
+"""
+
+import argparse
+import asyncio
+import math
+import random
+import time
+
+import aiohttp
+from aiohttp import web
+
+BOT_INFO = {
+    "id": 1000001,
+    "is_bot": True,
+    "first_name": "Dramamu Fake",
+    "username": "dramamu_fake_bot",
+    "can_join_groups": False,
+    "can_read_all_group_messages": False,
+    "supports_inline_queries": False,
+}
+
+SEND_METHODS = {"sendMessage", "sendPhoto", "sendDocument"}
+
+# Method yang cukup dijawab True
+NOOP_METHODS = {
+    "setMyCommands", "deleteMyCommands", "setChatMenuButton", "sendChatAction",
+    "answerCallbackQuery", "deleteMessage", "close", "logOut",
+}
+
+# Batas getUpdates sama dengan Telegram
+MAX_UPDATES_LIMIT = 100
+
+
+def parse_id_list(value: str) -> set:
+    return {int(part) for part in value.split(",") if part.strip()}
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    rank = math.ceil(p / 100 * len(sorted_values))
+    return sorted_values[max(0, min(len(sorted_values), rank) - 1)]
+
+
+def api_error(code: int, description: str, **parameters) -> web.Response:
+    body = {"ok": False, "error_code": code, "description": description}
+    if parameters:
+        body["parameters"] = parameters
+    return web.json_response(body, status=code)
+
+
+def create_app(latency_ms: float = 0.0, error_rate: float = 0.0, jitter_ms: float = 0.0,
+               retry_after_rate: float = 0.0, retry_after: int = 1,
+               forbidden_users: set = frozenset()) -> web.Application:
+    app = web.Application()
+    app["latency"] = latency_ms / 1000
+    app["jitter"] = jitter_ms / 1000
+    app["error_rate"] = error_rate
+    app["retry_after_rate"] = retry_after_rate
+    app["retry_after"] = retry_after
+    app["forbidden_users"] = set(forbidden_users)
+    app["calls"] = {}
+    app["counters"] = {"message_id": 0, "update_id": 0, "injected": 0, "delivered": 0, "confirmed_offset": 0}
+    app["updates"] = []
+    app["new_update"] = asyncio.Event()
+    app["webhook"] = {"url": "", "secret_token": None}
+    # chat_id → [{update_id, injected, delivered}] update yang belum dibalas
+    app["awaiting_reply"] = {}
+    app["tracked"] = {}
+    app["reply_latencies"] = []
+    app["webhook_in_flight"] = 0
+    # Call Bot API terakhir dari bot (selain getUpdates kosong) → deteksi idle
+    app["last_activity"] = time.monotonic()
+
+    def count(method: str, outcome: str):
+        key = f"{method}:{outcome}"
+        app["calls"][key] = app["calls"].get(key, 0) + 1
+
+    async def read_params(request: web.Request) -> dict:
+        # PTB kirim form (nilai non-string di-encode JSON); klien lain bisa kirim JSON
+        params = dict(request.query)
+        if request.can_read_body:
+            if request.content_type == "application/json":
+                params.update(await request.json())
+            else:
+                params.update(await request.post())
+        return params
+
+    def message(chat_id, **fields) -> dict:
+        app["counters"]["message_id"] += 1
+        return {
+            "message_id": app["counters"]["message_id"],
+            "date": int(time.time()),
+            "chat": {"id": int(chat_id), "type": "private"},
+            "from": {k: BOT_INFO[k] for k in ("id", "is_bot", "first_name", "username")},
+            **fields,
+        }
+
+    def mark_delivered(update: dict):
+        entry = app["tracked"].get(update["update_id"])
+        if entry is not None:
+            entry["delivered"] = True
+
+    def record_reply(chat_id: int):
+        pending = app["awaiting_reply"].get(chat_id)
+        if not pending:
+            return
+        now = time.monotonic()
+        # Hanya update yang sudah diambil bot yang bisa dijawab send ini
+        remaining = []
+        for entry in pending:
+            if entry["delivered"]:
+                app["reply_latencies"].append(now - entry["injected"])
+                del app["tracked"][entry["update_id"]]
+            else:
+                remaining.append(entry)
+        if remaining:
+            app["awaiting_reply"][chat_id] = remaining
+        else:
+            del app["awaiting_reply"][chat_id]
+
+    # ------------------------------------------------------
+    # Update masuk: antrian getUpdates atau webhook
+    # ------------------------------------------------------
+    async def push_webhook(update: dict):
+        app["webhook_in_flight"] += 1
+        mark_delivered(update)
+        headers = {}
+        if app["webhook"]["secret_token"]:
+            headers["X-Telegram-Bot-Api-Secret-Token"] = app["webhook"]["secret_token"]
+        try:
+            async with app["http"].post(app["webhook"]["url"], json=update, headers=headers) as response:
+                count("webhook", str(response.status))
+        except aiohttp.ClientError as e:
+            count("webhook", type(e).__name__)
+        finally:
+            app["webhook_in_flight"] -= 1
+            app["last_activity"] = time.monotonic()
+
+    async def inject(request: web.Request):
+        body = await request.json()
+        updates = body if isinstance(body, list) else [body]
+        now = time.monotonic()
+        for update in updates:
+            app["counters"]["update_id"] += 1
+            update["update_id"] = app["counters"]["update_id"]
+            message_body = update.get("message") or {}
+            chat_id = (message_body.get("chat") or {}).get("id")
+            if chat_id is not None:
+                entry = {"update_id": update["update_id"], "injected": now, "delivered": False}
+                app["tracked"][update["update_id"]] = entry
+                app["awaiting_reply"].setdefault(int(chat_id), []).append(entry)
+            if app["webhook"]["url"]:
+                asyncio.create_task(push_webhook(update))
+            else:
+                app["updates"].append(update)
+        app["counters"]["injected"] += len(updates)
+        app["new_update"].set()
+        return web.json_response({"ok": True, "injected": len(updates),
+                                  "last_update_id": app["counters"]["update_id"]})
+
+    async def get_updates(params: dict) -> web.Response:
+        if app["webhook"]["url"]:
+            return api_error(409, "Conflict: can't use getUpdates method while webhook is active")
+        offset = int(params.get("offset") or 0)
+        limit = min(int(params.get("limit") or MAX_UPDATES_LIMIT), MAX_UPDATES_LIMIT)
+        timeout = float(params.get("timeout") or 0)
+
+        # offset = konfirmasi update sebelumnya
+        if offset:
+            app["updates"][:] = [u for u in app["updates"] if u["update_id"] >= offset]
+        if not app["updates"] and timeout > 0:
+            app["new_update"].clear()
+            try:
+                await asyncio.wait_for(app["new_update"].wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        batch = app["updates"][:limit]
+        app["counters"]["delivered"] += len(batch)
+        for update in batch:
+            mark_delivered(update)
+        # Long poll kosong bukan aktivitas; ambil update / konfirmasi offset baru iya
+        if batch or offset > app["counters"]["confirmed_offset"]:
+            app["last_activity"] = time.monotonic()
+        app["counters"]["confirmed_offset"] = max(offset, app["counters"]["confirmed_offset"])
+        return web.json_response({"ok": True, "result": batch})
+
+    # ------------------------------------------------------
+    # Bot API
+    # ------------------------------------------------------
+    async def handle(request: web.Request):
+        method = request.match_info["method"]
+        params = await read_params(request)
+
+        if method == "getUpdates":
+            response = await get_updates(params)
+            count(method, str(response.status))
+            return response
+        app["last_activity"] = time.monotonic()
+
+        delay = app["latency"] + (random.uniform(0, app["jitter"]) if app["jitter"] else 0)
+        if delay:
+            await asyncio.sleep(delay)
+        if app["error_rate"] and random.random() < app["error_rate"]:
+            count(method, "502")
+            return api_error(502, "Bad Gateway")
+
+        if method == "getMe":
+            count(method, "200")
+            return web.json_response({"ok": True, "result": BOT_INFO})
+        if method == "setWebhook":
+            app["webhook"].update(url=params.get("url", ""), secret_token=params.get("secret_token"))
+            count(method, "200")
+            return web.json_response({"ok": True, "result": True, "description": "Webhook was set"})
+        if method == "deleteWebhook":
+            app["webhook"].update(url="", secret_token=None)
+            if str(params.get("drop_pending_updates", "")).lower() == "true":
+                app["updates"].clear()
+            count(method, "200")
+            return web.json_response({"ok": True, "result": True})
+        if method == "getWebhookInfo":
+            count(method, "200")
+            return web.json_response({"ok": True, "result": {
+                "url": app["webhook"]["url"], "has_custom_certificate": False,
+                "pending_update_count": len(app["updates"]),
+            }})
+        if method in NOOP_METHODS:
+            count(method, "200")
+            return web.json_response({"ok": True, "result": True})
+        if method not in SEND_METHODS:
+            count(method, "404")
+            return api_error(404, "Not Found")
+
+        chat_id = params.get("chat_id")
+        if chat_id is None:
+            count(method, "400")
+            return api_error(400, "Bad Request: chat_id is empty")
+        try:
+            chat_id = int(chat_id)
+        except (TypeError, ValueError):
+            count(method, "400")
+            return api_error(400, "Bad Request: chat not found")
+        if chat_id in app["forbidden_users"]:
+            count(method, "403")
+            record_reply(chat_id)
+            return api_error(403, "Forbidden: bot was blocked by the user")
+        if app["retry_after_rate"] and random.random() < app["retry_after_rate"]:
+            count(method, "429")
+            return api_error(429, f"Too Many Requests: retry after {app['retry_after']}",
+                             retry_after=app["retry_after"])
+
+        if method == "sendMessage":
+            result = message(chat_id, text=params.get("text", ""))
+        elif method == "sendDocument":
+            document = params.get("document")
+            result = message(chat_id, caption=params.get("caption", ""), document={
+                "file_id": "fake-document", "file_unique_id": "fake-document",
+                "file_name": getattr(document, "filename", None) or "document",
+            })
+        else:
+            result = message(chat_id, caption=params.get("caption", ""),
+                             photo=[{"file_id": "fake-photo", "file_unique_id": "fake", "width": 300, "height": 450}])
+        count(method, "200")
+        record_reply(chat_id)
+        return web.json_response({"ok": True, "result": result})
+
+    # ------------------------------------------------------
+    # Kontrol
+    # ------------------------------------------------------
+    async def stats(request: web.Request):
+        latencies = sorted(app["reply_latencies"])
+        ms = lambda v: round(v * 1000, 2) if v is not None else None
+        return web.json_response({
+            "calls": app["calls"],
+            "updates": {
+                "injected": app["counters"]["injected"],
+                "delivered": app["counters"]["delivered"],
+                # Belum dikonfirmasi bot lewat offset getUpdates
+                "queued": len(app["updates"]),
+                "webhook_in_flight": app["webhook_in_flight"],
+                "awaiting_reply": sum(len(v) for v in app["awaiting_reply"].values()),
+                "replied": len(latencies),
+            },
+            "idle_seconds": round(time.monotonic() - app["last_activity"], 3),
+            "reply_latency_ms": {
+                "p50": ms(percentile(latencies, 50)),
+                "p95": ms(percentile(latencies, 95)),
+                "p99": ms(percentile(latencies, 99)),
+                "max": ms(latencies[-1] if latencies else None),
+            },
+        })
+
+    async def reset(request: web.Request):
+        app["calls"].clear()
+        app["reply_latencies"].clear()
+        app["awaiting_reply"].clear()
+        app["tracked"].clear()
+        app["last_activity"] = time.monotonic()
+        app["counters"].update(injected=0, delivered=0)
+        return web.json_response({"ok": True})
+
+    async def client_session(app):
+        app["http"] = aiohttp.ClientSession()
+        yield
+        await app["http"].close()
+
+    app.cleanup_ctx.append(client_session)
+    app.router.add_get("/_stats", stats)
+    app.router.add_post("/_inject", inject)
+    app.router.add_post("/_reset", reset)
+    app.router.add_route("*", "/bot{token}/{method}", handle)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Telegram Bot API untuk testing lokal")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8901)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Delay buatan per request")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Tambahan delay acak 0..N ms")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probabilitas respon 502 (0-1)")
+    parser.add_argument("--retry-after-rate", type=float, default=0.0,
+                        help="Probabilitas send* dijawab 429 Too Many Requests (0-1)")
+    parser.add_argument("--retry-after", type=int, default=1, help="Nilai retry_after (detik) untuk respon 429")
+    parser.add_argument("--forbidden-users", type=parse_id_list, default=set(),
+                        help="chat_id yang memblokir bot, pisah koma (respon 403)")
+    args = parser.parse_args()
+
+    print(f"🧪 Fake Telegram jalan di http://{args.host}:{args.port}")
+    web.run_app(
+        create_app(args.latency_ms, args.error_rate, args.jitter_ms, args.retry_after_rate,
+                   args.retry_after, args.forbidden_users),
+        host=args.host, port=args.port, print=None,
+    )
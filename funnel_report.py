@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Laporan Funnel Pengiriman Film Dramamu
+======================================
+Setiap hold punya trace_id dan timestamp per tahap di intermediary_queue:
+
+    created_at             hold_movie_data (mini app)
+    sent_to_bot_at         bot menerima sendData / /start (jam bot, dikirim saat release)
+    bot_received_start_at  release_movie_data
+    delivered_at           bot selesai send_movie_to_user (status delivered / delivery_failed)
+
+Script ini menghitung p50/p95/p99 durasi per tahap dan funnel konversi
+(berapa yang sampai ke bot, di-release, terkirim, gagal, expired).
+
+Usage:
+    python funnel_report.py                      # 24 jam terakhir
+    python funnel_report.py --since 7d --json hasil.json
+    python funnel_report.py --trace 3f9c...      # timeline satu trace
+"""
+
+import argparse
+import json
+import sys
+from datetime import datetime
+
+import psycopg2
+
+from export_database import get_database_url, parse_time_arg
+
+# (nama, kolom awal, kolom akhir, keterangan)
+STAGES = [
+    ("hold_to_bot", "created_at", "sent_to_bot_at", "hold → bot terima sendData"),
+    ("bot_to_release", "sent_to_bot_at", "bot_received_start_at", "bot terima → release"),
+    ("release_to_delivered", "bot_received_start_at", "delivered_at", "release → film terkirim"),
+    ("total", "created_at", "delivered_at", "hold → film terkirim"),
+]
+
+PERCENTILES = (0.5, 0.95, 0.99)
+
+# (nama, kondisi); dihitung dari semua hold dalam window
+FUNNEL = [
+    ("held", "TRUE"),
+    ("reached_bot", "sent_to_bot_at IS NOT NULL OR bot_received_start_at IS NOT NULL"),
+    ("released", "bot_received_start_at IS NOT NULL"),
+    ("delivered", "status = 'delivered'"),
+    ("delivery_failed", "status = 'delivery_failed'"),
+    ("expired", "bot_received_start_at IS NULL AND expires_at <= NOW()"),
+    ("waiting", "bot_received_start_at IS NULL AND expires_at > NOW()"),
+]
+
+
+def stage_stats(cursor, since, until):
+    """count + p50/p95/p99 (detik) per tahap"""
+    percentiles = "ARRAY[" + ", ".join(str(p) for p in PERCENTILES) + "]"
+    columns = []
+    for _, start, end, _ in STAGES:
+        duration = f"EXTRACT(EPOCH FROM ({end} - {start}))"
+        condition = f"{start} IS NOT NULL AND {end} IS NOT NULL"
+        columns.append(f"COUNT(*) FILTER (WHERE {condition})")
+        columns.append(f"percentile_cont({percentiles}) WITHIN GROUP (ORDER BY {duration}) "
+                       f"FILTER (WHERE {condition})")
+    cursor.execute(
+        f"SELECT {', '.join(columns)} FROM intermediary_queue WHERE created_at >= %s AND created_at < %s",
+        (since, until)
+    )
+    row = cursor.fetchone()
+
+    stats = []
+    for i, (name, _, _, label) in enumerate(STAGES):
+        count, values = row[2 * i], row[2 * i + 1] or [None] * len(PERCENTILES)
+        stats.append({
+            "stage": name,
+            "label": label,
+            "count": count,
+            **{f"p{int(p * 100)}": (round(v, 3) if v is not None else None)
+               for p, v in zip(PERCENTILES, values)},
+        })
+    return stats
+
+
+def funnel_counts(cursor, since, until):
+    columns = ", ".join(f"COUNT(*) FILTER (WHERE {condition})" for _, condition in FUNNEL)
+    cursor.execute(
+        f"SELECT {columns} FROM intermediary_queue WHERE created_at >= %s AND created_at < %s",
+        (since, until)
+    )
+    row = cursor.fetchone()
+    held = row[0] or 0
+    return [
+        {"step": name, "count": count, "percent": round(100.0 * count / held, 1) if held else 0.0}
+        for (name, _), count in zip(FUNNEL, row)
+    ]
+
+
+def trace_timeline(cursor, trace_id):
+    cursor.execute(
+        """SELECT telegram_id, movie_id, status, created_at, sent_to_bot_at,
+                  bot_received_start_at, delivered_at, expires_at
+           FROM intermediary_queue WHERE trace_id = %s""",
+        (trace_id,)
+    )
+    row = cursor.fetchone()
+    if not row:
+        return None
+    keys = ("telegram_id", "movie_id", "status", "created_at", "sent_to_bot_at",
+            "bot_received_start_at", "delivered_at", "expires_at")
+    return dict(zip(keys, row))
+
+
+def print_trace(trace_id, timeline):
+    print(f"🧭 Trace {trace_id}")
+    print(f"   user {timeline['telegram_id']}, movie {timeline['movie_id']}, status {timeline['status']}")
+    previous = None
+    for column in ("created_at", "sent_to_bot_at", "bot_received_start_at", "delivered_at"):
+        value = timeline[column]
+        if value is None:
+            print(f"   {column:<22} -")
+            continue
+        delta = f"  (+{(value - previous).total_seconds():.3f}s)" if previous else ""
+        print(f"   {column:<22} {value.isoformat()}{delta}")
+        previous = value
+
+
+def format_seconds(value):
+    return f"{value:.3f}s" if value is not None else "-"
+
+
+def funnel_report(since, until, json_out=None):
+    conn = psycopg2.connect(get_database_url())
+    conn.set_session(readonly=True)
+    try:
+        cursor = conn.cursor()
+        stages = stage_stats(cursor, since, until)
+        funnel = funnel_counts(cursor, since, until)
+        cursor.close()
+    finally:
+        conn.close()
+
+    result = {"since": since, "until": until, "stages": stages, "funnel": funnel}
+    if json_out:
+        with open(json_out, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2, default=str)
+
+    print("=" * 60)
+    print(f"📊 FUNNEL PENGIRIMAN FILM ({since:%Y-%m-%d %H:%M} → {until:%Y-%m-%d %H:%M})")
+    print("=" * 60)
+    print(f"{'Tahap':<28}{'n':>7}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for s in stages:
+        print(f"{s['label']:<28}{s['count']:>7}{format_seconds(s['p50']):>10}"
+              f"{format_seconds(s['p95']):>10}{format_seconds(s['p99']):>10}")
+    print()
+    for step in funnel:
+        print(f"{step['step']:<18}{step['count']:>7}  {step['percent']:>5.1f}%")
+    print()
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Durasi per tahap + funnel konversi pengiriman film")
+    parser.add_argument("--since", type=parse_time_arg, default=parse_time_arg("24h"),
+                        help="Awal window: 7d / 12h / 30m atau tanggal ISO (default 24h)")
+    parser.add_argument("--until", type=parse_time_arg, help="Akhir window (default sekarang)")
+    parser.add_argument("--json", dest="json_out", help="Tulis hasil ke file JSON")
+    parser.add_argument("--trace", help="Tampilkan timeline satu trace_id")
+    args = parser.parse_args()
+
+    if args.trace:
+        conn = psycopg2.connect(get_database_url())
+        cursor = conn.cursor()
+        timeline = trace_timeline(cursor, args.trace)
+        conn.close()
+        if not timeline:
+            print(f"❌ Trace {args.trace} tidak ditemukan")
+            sys.exit(1)
+        print_trace(args.trace, timeline)
+        sys.exit(0)
+
+    until = args.until or datetime.now().astimezone()
+    funnel_report(args.since, until, args.json_out)
@@ -0,0 +1,95 @@
+"""
+Konfigurasi Gunicorn API Dramamu (mode multi-worker)
+====================================================
+    gunicorn main:app -c gunicorn.conf.py
+    (start.sh memakai ini otomatis kalau WEB_CONCURRENCY > 1)
+
+- Worker uvicorn (ASGI); tiap worker menjalankan lifespan sendiri: pool DB
+  per proses, health probe, writer snapshot metric.
+- preload_app: main.py di-import sekali di master lalu di-fork (startup
+  lebih cepat, memori copy-on-write). Konsekuensinya HUP hanya me-restart
+  worker tanpa membaca kode baru; untuk deploy kode baru tanpa downtime
+  pakai USR2 (master baru) lalu WINCH/TERM ke master lama, atau
+  GUNICORN_PRELOAD=false supaya HUP ikut memuat ulang kode.
+- max_requests + jitter: worker didaur ulang bergiliran (bukan serentak)
+  untuk membatasi kebocoran memori.
+- Job background (rekonsiliasi payment, sweep VIP) dijaga advisory lock
+  Postgres, jadi hanya satu worker yang menjalankan.
+- /metrics: tiap worker menulis snapshot ke METRICS_MULTIPROC_DIR, worker
+  mana pun yang di-scrape mengembalikan gabungan semua worker. Folder yang
+  sama dipakai /debug/queries (queries-<pid>.json, digabung) dan profile
+  per request (profile-<id>.json, bisa diambil dari worker mana pun).
+  Hanya capture proses /debug/profile yang per worker (header X-Profile-Pid).
+- Rate limit: lebih dari satu worker WAJIB pakai storage bersama
+  (RATE_LIMIT_STORAGE_URI=redis://host:6379/0). Dengan memory:// tiap
+  worker punya counter sendiri (limit efektif N x), jadi gunicorn menolak
+  start. RATE_LIMIT_ENABLED=false melewati cek ini (benchmark lokal).
+
+Environment:
+    PORT                        port listen (default 8000)
+    WEB_CONCURRENCY             jumlah worker (default jumlah CPU)
+    GUNICORN_PRELOAD            true/false (default true)
+    GUNICORN_MAX_REQUESTS       request per worker sebelum didaur ulang (default 5000, 0 = nonaktif)
+    GUNICORN_MAX_REQUESTS_JITTER  (default 10% dari max_requests)
+    GUNICORN_TIMEOUT            detik worker diam sebelum di-kill (default 60)
+    GUNICORN_GRACEFUL_TIMEOUT   detik menyelesaikan request saat restart (default 30)
+    GUNICORN_KEEPALIVE          detik keep-alive di belakang load balancer (default 5)
+    METRICS_MULTIPROC_DIR       folder snapshot metric (default folder temp baru)
+    RATE_LIMIT_STORAGE_URI      storage rate limit bersama, wajib kalau worker > 1
+"""
+
+import glob
+import multiprocessing
+import os
+import sys
+import tempfile
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = os.environ.get("GUNICORN_PRELOAD", "true").lower() == "true"
+
+# Counter rate limit harus dibagi semua worker
+rate_limit_enabled = os.environ.get("RATE_LIMIT_ENABLED", "true").lower() == "true"
+rate_limit_storage = os.environ.get("RATE_LIMIT_STORAGE_URI", "memory://")
+if workers > 1 and rate_limit_enabled and rate_limit_storage.startswith("memory://"):
+    sys.exit(
+        f"❌ {workers} worker dengan rate limit memory:// (limit efektif {workers}x). "
+        "Set RATE_LIMIT_STORAGE_URI=redis://host:6379/0, atau WEB_CONCURRENCY=1."
+    )
+
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", "5000"))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", str(max_requests // 10)))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", "5"))
+
+# Log request sudah ditangani middleware (JSON), access log gunicorn dimatikan
+accesslog = None
+errorlog = "-"
+
+# Di-set sebelum app di-import (preload) supaya main.py / metrics.py melihatnya
+os.environ["WEB_CONCURRENCY"] = str(workers)
+os.environ.setdefault("METRICS_MULTIPROC_DIR", tempfile.mkdtemp(prefix="dramamu-metrics-"))
+
+
+def on_starting(server):
+    # Snapshot dari run sebelumnya (pid lama) jangan ikut dijumlah
+    directory = os.environ["METRICS_MULTIPROC_DIR"]
+    os.makedirs(directory, exist_ok=True)
+    for pattern in ("metrics-*.json", "queries-*.json", "profile-*.json"):
+        for path in glob.glob(os.path.join(directory, pattern)):
+            os.remove(path)
+    server.log.info(f"📈 Snapshot metric multi-worker di {directory}")
+
+
+def child_exit(server, worker):
+    # Counter worker yang keluar (max_requests / reload) disimpan, gauge-nya dibuang
+    from metrics import mark_process_dead
+
+    mark_process_dead(worker.pid, os.environ["METRICS_MULTIPROC_DIR"])
+    # Statistik query worker yang keluar tidak ikut digabung lagi
+    try:
+        os.remove(os.path.join(os.environ["METRICS_MULTIPROC_DIR"], f"queries-{worker.pid}.json"))
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,238 @@
+"""
+Health Check Dramamu
+====================
+/livez  → proses hidup, tanpa I/O sama sekali
+/readyz → hasil deep probe terakhir (di-cache), di-refresh di background:
+    database   round-trip SELECT 1 lewat pool             (kritis)
+    pool       saturasi connection pool                   (kritis)
+    telegram   getMe ke Bot API                           (peringatan)
+    midtrans   endpoint Snap bisa dijangkau + circuit     (peringatan)
+    queue      backlog intermediary_queue                 (peringatan)
+    sweeper    VIP expired yang belum di-downgrade        (peringatan)
+
+Check kritis yang gagal, probe yang belum pernah jalan, atau hasil probe
+yang basi membuat /readyz menjawab 503 supaya load balancer berhenti
+mengirim traffic ke worker ini.
+
+Environment:
+    HEALTH_PROBE_INTERVAL        detik antar probe (default 10)
+    HEALTH_PROBE_TIMEOUT         timeout per check (default 3)
+    HEALTH_QUEUE_BACKLOG_WARN    batas antrian waiting_start (default 1000)
+    HEALTH_SWEEPER_LAG_WARN      detik VIP expired belum di-downgrade (default 900)
+"""
+
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, Optional, Sequence, Tuple
+
+import httpx
+
+from metrics import Gauge
+
+HEALTH_PROBE_INTERVAL = float(os.environ.get("HEALTH_PROBE_INTERVAL", "10"))
+HEALTH_PROBE_TIMEOUT = float(os.environ.get("HEALTH_PROBE_TIMEOUT", "3"))
+HEALTH_QUEUE_BACKLOG_WARN = int(os.environ.get("HEALTH_QUEUE_BACKLOG_WARN", "1000"))
+HEALTH_SWEEPER_LAG_WARN = float(os.environ.get("HEALTH_SWEEPER_LAG_WARN", "900"))
+
+# Hasil probe dianggap basi setelah sekian interval tanpa refresh
+STALE_AFTER_INTERVALS = 3
+
+OK, WARN, FAIL, SKIP = "ok", "warn", "fail", "skip"
+
+HEALTH_CHECK_STATUS = Gauge(
+    "dramamu_health_check_status",
+    "Hasil deep probe terakhir per check (1 ok, 0.5 warn, 0 fail); multi-worker: worker terburuk",
+    ["check"],
+    multiprocess_mode="min",
+)
+
+logger = logging.getLogger("dramamu-health")
+
+Check = Callable[[], Awaitable[dict]]
+
+
+class HealthProbe:
+    """Jalankan semua check berkala, simpan snapshot terakhir untuk /readyz"""
+
+    def __init__(self, checks: Dict[str, Check], critical: set, interval: float = HEALTH_PROBE_INTERVAL,
+                 timeout: float = HEALTH_PROBE_TIMEOUT, run_first: Sequence[str] = ()):
+        self.checks = checks
+        self.critical = set(critical)
+        # Check yang dijalankan sebelum yang lain (mis. pool, supaya koneksi
+        # yang dipakai check database tidak ikut terhitung)
+        self.run_first = [name for name in run_first if name in checks]
+        self.interval = interval
+        self.timeout = timeout
+        self._snapshot: Optional[dict] = None
+        self._checked_at = 0.0
+        HEALTH_CHECK_STATUS.set_function(self._gauge)
+
+    async def _run_check(self, name: str, check: Check) -> dict:
+        started = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(check(), self.timeout)
+        except asyncio.TimeoutError:
+            result = {"status": FAIL, "error": f"timeout {self.timeout}s"}
+        except Exception as e:
+            result = {"status": FAIL, "error": f"{type(e).__name__}: {e}"}
+        result.setdefault("latency_ms", round((time.perf_counter() - started) * 1000, 2))
+        return result
+
+    async def run_once(self) -> dict:
+        names = list(self.checks)
+        checks = {name: await self._run_check(name, self.checks[name]) for name in self.run_first}
+        rest = [name for name in names if name not in checks]
+        results = await asyncio.gather(*(self._run_check(name, self.checks[name]) for name in rest))
+        checks.update(zip(rest, results))
+        checks = {name: checks[name] for name in names}
+        failed = [name for name in names if checks[name]["status"] == FAIL and name in self.critical]
+        degraded = [name for name in names if checks[name]["status"] in (WARN, FAIL)]
+        self._snapshot = {
+            "status": FAIL if failed else (WARN if degraded else OK),
+            "checked_at": datetime.now(timezone.utc).isoformat(),
+            "checks": checks,
+        }
+        self._checked_at = time.monotonic()
+        if failed:
+            logger.warning(f"Readiness gagal: {', '.join(failed)}")
+        return self._snapshot
+
+    async def loop(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"Error health probe: {e}")
+            await asyncio.sleep(self.interval)
+
+    def readiness(self) -> Tuple[bool, dict]:
+        """(siap menerima traffic?, body response)"""
+        if self._snapshot is None:
+            return False, {"status": "starting", "checks": {}}
+        age = time.monotonic() - self._checked_at
+        body = dict(self._snapshot, age_seconds=round(age, 1))
+        if age > self.interval * STALE_AFTER_INTERVALS:
+            body["status"] = "stale"
+            return False, body
+        return body["status"] != FAIL, body
+
+    def _gauge(self):
+        if self._snapshot is None:
+            return {}
+        values = {OK: 1, WARN: 0.5, FAIL: 0}
+        return {(name, ): values[c["status"]] for name, c in self._snapshot["checks"].items()
+                if c["status"] in values}
+
+
+# ==========================================================
+# 🔍 CHECK
+# ==========================================================
+def skip_check(reason: str) -> Check:
+    async def check():
+        return {"status": SKIP, "reason": reason}
+    return check
+
+
+def database_check(get_connection) -> Check:
+    """Round-trip SELECT 1 lewat pool"""
+    def probe():
+        conn = get_connection()
+        try:
+            cur = conn.cursor()
+            started = time.perf_counter()
+            cur.execute("SELECT 1")
+            cur.fetchone()
+            rtt = time.perf_counter() - started
+            cur.close()
+        finally:
+            conn.close()
+        return {"status": OK, "rtt_ms": round(rtt * 1000, 2)}
+
+    async def check():
+        return await asyncio.to_thread(probe)
+    return check
+
+
+def pool_check(get_pool) -> Check:
+    """Gagal kalau semua koneksi pool sedang dipakai"""
+    async def check():
+        pool = get_pool()
+        if pool is None:
+            return {"status": FAIL, "error": "pool belum dibuat (DATABASE_URL kosong?)"}
+        stats = pool.stats()
+        saturation = stats["in_use"] / stats["max"] if stats["max"] else 1.0
+        status = FAIL if stats["in_use"] >= stats["max"] else (WARN if saturation >= 0.8 else OK)
+        return {"status": status, "saturation": round(saturation, 2), **stats}
+    return check
+
+
+def query_check(get_connection, sql: str, evaluate: Callable[[tuple], dict]) -> Check:
+    """Jalankan satu query (lewat pool) lalu nilai hasil barisnya"""
+    def probe():
+        conn = get_connection()
+        try:
+            cur = conn.cursor()
+            cur.execute(sql)
+            row = cur.fetchone()
+            cur.close()
+            conn.rollback()
+        finally:
+            conn.close()
+        return evaluate(row)
+
+    async def check():
+        return await asyncio.to_thread(probe)
+    return check
+
+
+def queue_backlog_check(get_connection) -> Check:
+    def evaluate(row):
+        waiting, stuck = row
+        status = WARN if waiting > HEALTH_QUEUE_BACKLOG_WARN or stuck else OK
+        return {"status": status, "waiting_start": waiting, "released_not_delivered": stuck}
+
+    return query_check(get_connection, """
+        SELECT COUNT(*) FILTER (WHERE status = 'waiting_start' AND expires_at > NOW()),
+               COUNT(*) FILTER (WHERE status = 'released_to_bot'
+                                AND bot_received_start_at < NOW() - INTERVAL '5 minutes'
+                                AND trace_id IS NOT NULL)
+        FROM intermediary_queue
+        WHERE status IN ('waiting_start', 'released_to_bot')
+    """, evaluate)
+
+
+def sweeper_lag_check(get_connection) -> Check:
+    """VIP yang sudah expired tapi masih is_vip (pakai partial index idx_users_vip_expires)"""
+    def evaluate(row):
+        overdue, lag = row
+        lag = float(lag or 0)
+        return {"status": WARN if lag > HEALTH_SWEEPER_LAG_WARN else OK,
+                "overdue_vips": overdue, "lag_seconds": round(lag, 1)}
+
+    return query_check(get_connection, """
+        SELECT COUNT(*), EXTRACT(EPOCH FROM NOW() - MIN(vip_expires_at))
+        FROM users WHERE is_vip AND vip_expires_at < NOW()
+    """, evaluate)
+
+
+def http_check(client_factory: Callable[[], httpx.AsyncClient], url: str,
+               healthy: Callable[[httpx.Response], bool] = lambda r: True,
+               extra: Callable[[], dict] = dict) -> Check:
+    """
+    Reachability layanan luar. Gagal dilaporkan sebagai WARN: API tetap bisa
+    melayani endpoint lain walaupun Telegram/Midtrans bermasalah.
+    """
+    async def check():
+        details = extra()
+        # extra() boleh ikut menurunkan status (mis. circuit breaker open)
+        extra_ok = details.pop("status", OK) == OK
+        try:
+            response = await client_factory().get(url)
+        except httpx.HTTPError as e:
+            return {"status": WARN, "error": type(e).__name__, **details}
+        status = OK if healthy(response) and extra_ok else WARN
+        return {"status": status, "http_status": response.status_code, **details}
+    return check
@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""
+Script Import Katalog Film Dramamu
+==================================
+Bulk import film dari file CSV atau JSONL ke tabel movies.
+Baris di-stream ke staging table via COPY, lalu di-upsert ke movies
+berdasarkan natural key (title + year, unique index idx_movies_natural_key)
+dalam satu transaksi.
+
+Kolom yang dikenali:
+    title, video_link (wajib), description, poster_url, genre, year, rating, active
+
+Usage:
+    python import_movies.py katalog.csv
+    python import_movies.py katalog.jsonl --check-urls --url-concurrency 50
+    python import_movies.py katalog.csv --dry-run --rejects rejected.jsonl
+"""
+
+import argparse
+import asyncio
+import csv
+import io
+import json
+import os
+import sys
+import time
+from decimal import Decimal, InvalidOperation
+from typing import Iterator, Optional
+
+import psycopg2
+
+COLUMNS = ["title", "description", "poster_url", "video_link", "genre", "year", "rating", "active"]
+
+# Baris di-buffer per chunk sebelum di-COPY ke staging
+CHUNK_SIZE = 20000
+
+
+def get_database_url():
+    """Get DATABASE_URL dari environment variable"""
+    db_url = os.getenv('DATABASE_URL')
+    if not db_url:
+        print("❌ ERROR: DATABASE_URL tidak ditemukan!")
+        print("   Set environment variable DATABASE_URL terlebih dahulu.")
+        sys.exit(1)
+    return db_url
+
+
+# ==========================================================
+# 📖 BACA FILE KATALOG (STREAMING)
+# ==========================================================
+def read_catalog(path: str) -> Iterator[dict]:
+    """Yield satu dict per baris, dari CSV atau JSONL (dilihat dari ekstensi)"""
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        if path.endswith(('.jsonl', '.ndjson')):
+            for line in f:
+                line = line.strip()
+                if line:
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError as e:
+                        yield {"_error": f"JSON tidak valid: {e}"}
+        else:
+            yield from csv.DictReader(f)
+
+
+def normalize_row(raw: dict) -> tuple:
+    """
+    Validasi dan normalisasi satu baris.
+    Return (row, None) kalau valid, (None, alasan) kalau ditolak.
+    """
+    if "_error" in raw:
+        return None, raw["_error"]
+
+    def text(key, limit=None):
+        value = raw.get(key)
+        if value is None:
+            return None
+        value = str(value).strip()
+        if not value:
+            return None
+        return value[:limit] if limit else value
+
+    title = text("title", 500)
+    video_link = text("video_link")
+    if not title:
+        return None, "title kosong"
+    if not video_link or not video_link.startswith(('http://', 'https://')):
+        return None, "video_link tidak valid"
+
+    poster_url = text("poster_url")
+    if poster_url and not poster_url.startswith(('http://', 'https://')):
+        poster_url = None
+
+    year = text("year")
+    if year is not None:
+        try:
+            year = int(float(year))
+        except (ValueError, OverflowError):
+            return None, f"year tidak valid: {year}"
+        if not 1900 <= year <= 2100:
+            return None, f"year di luar range: {year}"
+
+    rating = text("rating")
+    if rating is not None:
+        try:
+            rating = Decimal(rating).quantize(Decimal("0.1"))
+        except InvalidOperation:
+            return None, f"rating tidak valid: {rating}"
+        # NaN lolos quantize tapi tidak bisa dibandingkan
+        if not rating.is_finite():
+            return None, f"rating tidak valid: {rating}"
+        if not Decimal(0) <= rating <= Decimal(10):
+            return None, f"rating di luar range: {rating}"
+
+    # Sel kosong / null = tidak diisi → default aktif; hanya nilai eksplisit yang menonaktifkan
+    active = raw.get("active")
+    if isinstance(active, str):
+        active = active.strip().lower()
+        active = active not in ("0", "false", "no", "tidak") if active else True
+    elif active is None:
+        active = True
+
+    return {
+        "title": title,
+        "description": text("description"),
+        "poster_url": poster_url,
+        "video_link": video_link,
+        "genre": text("genre", 100),
+        "year": year,
+        "rating": rating,
+        "active": bool(active),
+    }, None
+
+
+# ==========================================================
+# 🌐 VALIDASI URL (ASYNC HEAD, CONCURRENCY TERBATAS)
+# ==========================================================
+async def check_urls(urls: set, concurrency: int, timeout: float) -> dict:
+    """Return {url: bool} — True kalau URL bisa diakses (status < 400)"""
+    import httpx
+
+    semaphore = asyncio.Semaphore(concurrency)
+    results = {}
+
+    async with httpx.AsyncClient(
+        timeout=timeout,
+        follow_redirects=True,
+        limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+    ) as client:
+        async def check(url):
+            async with semaphore:
+                try:
+                    response = await client.head(url)
+                    if response.status_code == 405:
+                        # Beberapa host tidak support HEAD
+                        response = await client.get(url, headers={"Range": "bytes=0-0"})
+                    results[url] = response.status_code < 400
+                except Exception:
+                    results[url] = False
+
+        await asyncio.gather(*(check(url) for url in urls))
+
+    return results
+
+
+def apply_url_checks(rows: list, url_status: dict, rejects: list) -> list:
+    valid = []
+    for line_no, row in rows:
+        if not url_status.get(row["video_link"], True):
+            rejects.append((line_no, "video_link tidak bisa diakses", row))
+            continue
+        if row["poster_url"] and not url_status.get(row["poster_url"], True):
+            # Poster opsional, cukup dikosongkan
+            row["poster_url"] = None
+        valid.append((line_no, row))
+    return valid
+
+
+# ==========================================================
+# 📥 COPY KE STAGING + UPSERT
+# ==========================================================
+def copy_chunk(cur, rows: list):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for line_no, row in rows:
+        writer.writerow([line_no] + [
+            "" if row[col] is None else row[col]
+            for col in COLUMNS
+        ])
+    buffer.seek(0)
+    cur.copy_expert(
+        f"COPY movies_staging (seq, {', '.join(COLUMNS)}) FROM STDIN WITH (FORMAT csv, NULL '')",
+        buffer,
+    )
+
+
+def upsert_from_staging(cur) -> dict:
+    # Satu baris per natural key, baris terakhir di file yang menang
+    cur.execute("""
+        CREATE TEMP TABLE movies_incoming ON COMMIT DROP AS
+        SELECT DISTINCT ON (title, COALESCE(year, 0)) *
+        FROM movies_staging
+        ORDER BY title, COALESCE(year, 0), seq DESC;
+    """)
+    cur.execute("ANALYZE movies_incoming;")
+
+    # Unique index idx_movies_natural_key: upsert atomik tanpa lock tabel;
+    # baris yang isinya sama tidak ditulis ulang. xmax = 0 → baris baru.
+    cur.execute("""
+        WITH upserted AS (
+            INSERT INTO movies (title, description, poster_url, video_link, genre, year, rating, active)
+            SELECT s.title, s.description, s.poster_url, s.video_link, s.genre, s.year, s.rating, s.active
+            FROM movies_incoming s
+            ON CONFLICT (title, (COALESCE(year, 0))) DO UPDATE
+            SET description = EXCLUDED.description,
+                poster_url = EXCLUDED.poster_url,
+                video_link = EXCLUDED.video_link,
+                genre = EXCLUDED.genre,
+                rating = EXCLUDED.rating,
+                active = EXCLUDED.active
+            WHERE (movies.description, movies.poster_url, movies.video_link, movies.genre, movies.rating, movies.active)
+                IS DISTINCT FROM (EXCLUDED.description, EXCLUDED.poster_url, EXCLUDED.video_link,
+                                  EXCLUDED.genre, EXCLUDED.rating, EXCLUDED.active)
+            RETURNING xmax = 0 AS inserted
+        )
+        SELECT COUNT(*) FILTER (WHERE inserted), COUNT(*) FILTER (WHERE NOT inserted) FROM upserted;
+    """)
+    inserted, updated = cur.fetchone()
+
+    cur.execute("SELECT COUNT(*) FROM movies_incoming;")
+    distinct = cur.fetchone()[0]
+
+    return {"inserted": inserted, "updated": updated, "unchanged": distinct - inserted - updated}
+
+
+def import_movies(path: str, check: bool, url_concurrency: int, url_timeout: float,
+                  dry_run: bool, rejects_file: Optional[str]):
+    if not os.path.exists(path):
+        print(f"❌ ERROR: File {path} tidak ditemukan!")
+        sys.exit(1)
+
+    db_url = get_database_url()
+
+    print("🎬 Memulai import katalog film...")
+    print(f"📍 Database: {db_url.split('@')[1] if '@' in db_url else 'local'}")
+    print(f"📄 File: {path}")
+    print()
+
+    started = time.perf_counter()
+    rejects = []
+    total = 0
+    staged = 0
+
+    try:
+        conn = psycopg2.connect(db_url)
+        cur = conn.cursor()
+        cur.execute("""
+            CREATE TEMP TABLE movies_staging (
+                seq BIGINT,
+                title VARCHAR(500),
+                description TEXT,
+                poster_url TEXT,
+                video_link TEXT,
+                genre VARCHAR(100),
+                year INT,
+                rating DECIMAL(3, 1),
+                active BOOLEAN
+            ) ON COMMIT DROP;
+        """)
+
+        def flush(chunk):
+            nonlocal staged
+            if check:
+                urls = {row["video_link"] for _, row in chunk}
+                urls |= {row["poster_url"] for _, row in chunk if row["poster_url"]}
+                url_status = asyncio.run(check_urls(urls, url_concurrency, url_timeout))
+                chunk = apply_url_checks(chunk, url_status, rejects)
+            copy_chunk(cur, chunk)
+            staged += len(chunk)
+            elapsed = time.perf_counter() - started
+            print(f"   📥 {staged} baris di staging ({staged / elapsed:.0f} baris/s)")
+
+        chunk = []
+        for line_no, raw in enumerate(read_catalog(path), start=1):
+            total += 1
+            row, reason = normalize_row(raw)
+            if row is None:
+                rejects.append((line_no, reason, raw))
+                continue
+            chunk.append((line_no, row))
+            if len(chunk) >= CHUNK_SIZE:
+                flush(chunk)
+                chunk = []
+        if chunk:
+            flush(chunk)
+
+        result = upsert_from_staging(cur)
+
+        if dry_run:
+            conn.rollback()
+        else:
+            conn.commit()
+        cur.close()
+        conn.close()
+
+    except Exception as e:
+        print(f"\n❌ ERROR: {e}")
+        sys.exit(1)
+
+    if rejects_file and rejects:
+        with open(rejects_file, 'w', encoding='utf-8') as f:
+            for line_no, reason, raw in rejects:
+                f.write(json.dumps({"line": line_no, "reason": reason, "row": raw}, default=str) + "\n")
+
+    elapsed = time.perf_counter() - started
+
+    # Summary
+    print()
+    print("=" * 60)
+    print("✅ IMPORT KATALOG BERHASIL!" + (" (DRY RUN, tidak disimpan)" if dry_run else ""))
+    print("=" * 60)
+    print(f"📄 Total baris: {total}")
+    print(f"➕ Inserted: {result['inserted']}")
+    print(f"✏️  Updated: {result['updated']}")
+    print(f"➖ Unchanged: {result['unchanged']}")
+    print(f"🚫 Rejected: {len(rejects)}")
+    for line_no, reason, _ in rejects[:10]:
+        print(f"   baris {line_no}: {reason}")
+    if len(rejects) > 10:
+        print(f"   ... dan {len(rejects) - 10} lainnya" + (f" (lihat {rejects_file})" if rejects_file else ""))
+    print(f"⏱️  Durasi: {elapsed:.2f}s ({total / elapsed:.0f} baris/s)")
+    print()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk import katalog film (CSV/JSONL) ke tabel movies")
+    parser.add_argument("file", help="File katalog .csv atau .jsonl")
+    parser.add_argument("--check-urls", action="store_true", help="Cek poster/video URL dengan HEAD request")
+    parser.add_argument("--url-concurrency", type=int, default=32)
+    parser.add_argument("--url-timeout", type=float, default=5.0)
+    parser.add_argument("--dry-run", action="store_true", help="Jalankan tanpa commit")
+    parser.add_argument("--rejects", help="Tulis baris yang ditolak ke file JSONL ini")
+    args = parser.parse_args()
+
+    import_movies(args.file, args.check_urls, args.url_concurrency, args.url_timeout, args.dry_run, args.rejects)
@@ -0,0 +1,284 @@
+"""
+Logging Dramamu (API + Bot)
+===========================
+Setup logging bersama untuk main.py dan bot.py:
+- QueueHandler di thread pemanggil, penulisan ke stdout/file dilakukan
+  QueueListener di thread terpisah (disk/stdout lambat tidak menahan event loop)
+- record JSON satu baris, membawa field korelasi request_id / trace_id /
+  user_id / token dari contextvars (lihat log_context())
+- sampling untuk log sukses di jalur panas (extra={"sample": True})
+- rotasi file berdasarkan ukuran (RotatingFileHandler)
+
+Contoh:
+    from logging_setup import setup_logging, log_context
+
+    logger = setup_logging("api")
+    with log_context(user_id=123, token=start_token):
+        logger.info("Film ditahan", extra={"sample": True, "movie_id": 5})
+
+Environment:
+    LOG_LEVEL             level minimum (default INFO)
+    LOG_FORMAT            json (default) atau text
+    LOG_SAMPLE_RATE       fraksi log sampled yang tetap ditulis (default 0.1)
+    LOG_MAX_BYTES         ukuran maksimum file log sebelum dirotasi (default 10 MB)
+    LOG_BACKUP_COUNT      jumlah file rotasi yang disimpan (default 5)
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Optional
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "json").lower()
+LOG_SAMPLE_RATE = float(os.environ.get("LOG_SAMPLE_RATE", "0.1"))
+LOG_MAX_BYTES = int(os.environ.get("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.environ.get("LOG_BACKUP_COUNT", "5"))
+
+REQUEST_ID_HEADER = "X-Request-ID"
+
+# Field korelasi; diisi per request / per update Telegram
+request_id_var = contextvars.ContextVar("request_id", default=None)
+# Trace pengiriman film, dibuat saat hold dan disimpan di intermediary_queue
+trace_id_var = contextvars.ContextVar("trace_id", default=None)
+user_id_var = contextvars.ContextVar("user_id", default=None)
+token_var = contextvars.ContextVar("token", default=None)
+
+_CONTEXT_VARS = {
+    "request_id": request_id_var,
+    "trace_id": trace_id_var,
+    "user_id": user_id_var,
+    "token": token_var,
+}
+
+# Atribut bawaan LogRecord; sisanya dianggap field `extra`
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def token_ref(token: Optional[str]) -> Optional[str]:
+    """Potongan awal token: cukup untuk korelasi, tidak membocorkan token utuh"""
+    if not token:
+        return None
+    return token[:8]
+
+
+@contextmanager
+def log_context(**fields):
+    """Set field korelasi selama blok berjalan, lalu kembalikan nilai lama"""
+    resets = []
+    for name, value in fields.items():
+        var = _CONTEXT_VARS[name]
+        if name == "token":
+            value = token_ref(value)
+        resets.append((var, var.set(value)))
+    try:
+        yield
+    finally:
+        for var, reset_token in reversed(resets):
+            var.reset(reset_token)
+
+
+# ==========================================================
+# 🧩 FILTER & FORMATTER
+# ==========================================================
+class ContextFilter(logging.Filter):
+    """Salin contextvars ke record (harus jalan di thread pemanggil)"""
+
+    def filter(self, record):
+        for name, var in _CONTEXT_VARS.items():
+            if not hasattr(record, name):
+                setattr(record, name, var.get())
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Record dengan extra={"sample": True} hanya ditulis sebanyak `rate`.
+    WARNING ke atas selalu lolos.
+    """
+
+    def __init__(self, rate: float = LOG_SAMPLE_RATE):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if not getattr(record, "sample", False) or record.levelno >= logging.WARNING:
+            return True
+        return random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    """Satu record = satu baris JSON"""
+
+    def __init__(self, service: str):
+        super().__init__()
+        self.service = service
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "service": self.service,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key in _RESERVED or key == "sample" or value is None:
+                continue
+            entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Format lama (untuk development), plus field korelasi kalau ada"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    def format(self, record):
+        text = super().format(record)
+        ids = " ".join(f"{name}={getattr(record, name)}" for name in _CONTEXT_VARS
+                       if getattr(record, name, None) is not None)
+        return f"{text} [{ids}]" if ids else text
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler bawaan memformat record dengan formatter default (traceback
+    ikut masuk ke msg). Di sini msg hanya di-render, traceback disimpan di
+    exc_text supaya formatter di listener bisa menaruhnya di field sendiri.
+    """
+
+    def prepare(self, record):
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+# ==========================================================
+# 🔧 SETUP
+# ==========================================================
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def setup_logging(service: str, log_file: Optional[str] = None) -> logging.Logger:
+    """
+    Pasang QueueHandler di root logger (sekali per proses) dan return
+    logger "dramamu-<service>".
+    """
+    global _listener
+    logger = logging.getLogger(f"dramamu-{service}")
+    if _listener is not None:
+        return logger
+
+    formatter = JsonFormatter(service) if LOG_FORMAT == "json" else TextFormatter()
+    handlers = [logging.StreamHandler(sys.stdout)]
+    if log_file:
+        handlers.append(logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8"
+        ))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = _QueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
+    queue_handler.addFilter(SamplingFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(LOG_LEVEL)
+
+    # httpx log setiap request di INFO, termasuk URL Bot API yang memuat token
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+    return logger
+
+
+def _restart_after_fork():
+    """
+    Thread QueueListener tidak ikut ter-fork (gunicorn --preload import app
+    di master): child membuat antrian + listener baru dengan handler yang sama.
+    """
+    global _listener
+    if _listener is None:
+        return
+    log_queue = queue.SimpleQueue()
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, _QueueHandler):
+            handler.queue = log_queue
+    _listener = logging.handlers.QueueListener(log_queue, *_listener.handlers, respect_handler_level=True)
+    _listener.start()
+
+
+os.register_at_fork(after_in_child=_restart_after_fork)
+
+
+def stop_logging():
+    """Flush antrian log (dipanggil otomatis saat proses keluar)"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+# ==========================================================
+# 🌐 MIDDLEWARE REQUEST ID (ASGI)
+# ==========================================================
+class RequestContextMiddleware:
+    """
+    Ambil X-Request-ID dari request (mis. dikirim bot) atau buat baru,
+    simpan di contextvar untuk semua log request ini, dan kembalikan
+    di header response.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        header = REQUEST_ID_HEADER.lower().encode()
+        request_id = None
+        for name, value in scope.get("headers", []):
+            if name == header:
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or new_request_id()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(header, request_id.encode())]
+            await send(message)
+
+        with log_context(request_id=request_id):
+            await self.app(scope, receive, send_wrapper)
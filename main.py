@@ -1,13 +1,19 @@
-import psycopg2
+import asyncio
 import time
 import os
 import secrets
+import uuid
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
 from typing import Optional
 from fastapi import FastAPI, HTTPException, Request, Depends
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
 from pydantic import BaseModel, validator
 from fastapi.middleware.cors import CORSMiddleware
-import midtransclient
+from snap_client import (
+    SNAP_PRODUCTION_BASE_URL, SNAP_SANDBOX_BASE_URL, SnapClient, CircuitBreaker, MidtransError,
+    CircuitOpenError, SnapSaturatedError,
+)
 import hashlib
 import hmac
 from urllib.parse import parse_qs
@@ -15,6 +21,21 @@ from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 import httpx
+import db
+from health import (
+    OK, WARN, HEALTH_PROBE_TIMEOUT, HealthProbe, database_check, http_check, pool_check,
+    queue_backlog_check, skip_check, sweeper_lag_check,
+)
+from logging_setup import RequestContextMiddleware, log_context, setup_logging
+from profiling import (
+    PROFILE_INTERVAL_MS, ProfileBusyError, ProfilingMiddleware, capture, find_profile, list_profiles,
+    profile_summary, render_folded,
+)
+from metrics import (
+    CONTENT_TYPE, Counter, Histogram, MetricsMiddleware, render, start_multiprocess_writer, write_snapshot,
+)
+
+logger = setup_logging("api")
 
 # --- DATA KONEKSI DATABASE ---
 DATABASE_URL = os.environ.get("DATABASE_URL")
@@ -22,23 +43,231 @@ DATABASE_URL = os.environ.get("DATABASE_URL")
 # --- INFO MIDTRANS ---
 MIDTRANS_SERVER_KEY = os.environ.get("MIDTRANS_SERVER_KEY")
 MIDTRANS_CLIENT_KEY = os.environ.get("MIDTRANS_CLIENT_KEY")
+MIDTRANS_IS_PRODUCTION = os.environ.get("MIDTRANS_IS_PRODUCTION", "false").lower() == "true"
+# Override base URL (mis. untuk fake server lokal)
+MIDTRANS_SNAP_BASE_URL = os.environ.get("MIDTRANS_SNAP_BASE_URL")
+MIDTRANS_API_BASE_URL = os.environ.get("MIDTRANS_API_BASE_URL")
+MIDTRANS_TIMEOUT = float(os.environ.get("MIDTRANS_TIMEOUT", "10"))
+MIDTRANS_MAX_CONCURRENCY = int(os.environ.get("MIDTRANS_MAX_CONCURRENCY", "20"))
+
+# Window pemakaian ulang snap token untuk user + paket yang sama
+PAYMENT_REUSE_WINDOW_SECONDS = int(os.environ.get("PAYMENT_REUSE_WINDOW_SECONDS", "600"))
+# Snap token Midtrans berlaku 24 jam
+SNAP_TOKEN_TTL_SECONDS = int(os.environ.get("SNAP_TOKEN_TTL_SECONDS", str(24 * 3600)))
+# Klaim payment tanpa token lebih tua dari ini dianggap yatim (worker mati
+# di tengah call Midtrans) dan boleh diambil alih request berikutnya
+PAYMENT_CLAIM_STALE_SECONDS = float(os.environ.get("PAYMENT_CLAIM_STALE_SECONDS", str(2 * MIDTRANS_TIMEOUT)))
 
 # --- BOT CONFIG ---
 BOT_TOKEN = os.environ.get("BOT_TOKEN")
 BOT_USERNAME = os.environ.get("BOT_USERNAME", "dramamu_bot")
+# Override base URL Bot API (mis. fake_telegram.py untuk benchmark)
+TELEGRAM_API_BASE_URL = os.environ.get("TELEGRAM_API_BASE_URL", "https://api.telegram.org").rstrip("/")
+
+# Token untuk endpoint /debug/* (kosong = endpoint debug nonaktif)
+ADMIN_API_TOKEN = os.environ.get("ADMIN_API_TOKEN")
+
+# Rate limit bisa dimatikan untuk benchmark / load test lokal
+RATE_LIMIT_ENABLED = os.environ.get("RATE_LIMIT_ENABLED", "true").lower() == "true"
+# Storage limiter bersama antar worker/instance, mis. redis://host:6379/0
+# (memory:// = per proses, hanya boleh untuk satu worker)
+RATE_LIMIT_STORAGE_URI = os.environ.get("RATE_LIMIT_STORAGE_URI", "memory://")
+# Jumlah worker gunicorn (lihat gunicorn.conf.py)
+WEB_CONCURRENCY = int(os.environ.get("WEB_CONCURRENCY", "1"))
+
+# --- METRICS (lihat /metrics) ---
+OUTBOUND_SECONDS = Histogram(
+    "dramamu_outbound_request_duration_seconds",
+    "Latency call ke layanan luar (Telegram, Midtrans) per operasi dan outcome",
+    ["service", "operation", "outcome"],
+)
+FUNNEL_EVENTS = Counter(
+    "dramamu_funnel_events_total",
+    "Event funnel hold/release/delivery film (mini app → API → bot)",
+    ["event"],
+)
+
+def observe_midtrans(operation: str, outcome: str, elapsed: float):
+    OUTBOUND_SECONDS.observe(elapsed, service="midtrans", operation=operation, outcome=outcome)
+
+MIDTRANS_SNAP_URL = (MIDTRANS_SNAP_BASE_URL or (
+    SNAP_PRODUCTION_BASE_URL if MIDTRANS_IS_PRODUCTION else SNAP_SANDBOX_BASE_URL
+)).rstrip("/")
+
+# Client Midtrans dibuat lazy di payment pertama (jarang dipakai, tidak perlu di cold start)
+_midtrans_client: Optional[SnapClient] = None
+
+def get_midtrans_client() -> SnapClient:
+    global _midtrans_client
+    if _midtrans_client is None:
+        _midtrans_client = SnapClient(
+            server_key=MIDTRANS_SERVER_KEY or "",
+            is_production=MIDTRANS_IS_PRODUCTION,
+            snap_base_url=MIDTRANS_SNAP_BASE_URL,
+            core_base_url=MIDTRANS_API_BASE_URL,
+            timeout=MIDTRANS_TIMEOUT,
+            max_concurrency=MIDTRANS_MAX_CONCURRENCY,
+            breaker=CircuitBreaker(
+                failure_threshold=int(os.environ.get("MIDTRANS_BREAKER_THRESHOLD", "5")),
+                reset_timeout=float(os.environ.get("MIDTRANS_BREAKER_RESET", "30")),
+            ),
+            observer=observe_midtrans,
+        )
+    return _midtrans_client
+
+# Client Telegram (sendMessage dari API) juga lazy, satu per proses
+_telegram_http: Optional[httpx.AsyncClient] = None
+
+def get_telegram_http() -> httpx.AsyncClient:
+    global _telegram_http
+    if _telegram_http is None:
+        _telegram_http = httpx.AsyncClient(timeout=10.0)
+    return _telegram_http
+
+# Job background cukup jalan di satu worker (dan satu instance): pemegang
+# advisory lock Postgres yang menjalankan, worker lain mencoba lagi tiap interval
+async def holds_singleton(lock: db.AdvisoryLock) -> bool:
+    was_held = lock.held
+    try:
+        held = await asyncio.to_thread(lock.try_acquire)
+    except Exception as e:
+        logger.warning(f"Gagal ambil advisory lock {lock.name}: {e}")
+        return False
+    if held and not was_held:
+        logger.info(f"👑 Worker {os.getpid()} menjalankan job {lock.name}")
+    return held
+
+# Rekonsiliasi payment pending di background (0 = nonaktif, pakai CLI)
+RECONCILE_INTERVAL_SECONDS = int(os.environ.get("RECONCILE_INTERVAL_SECONDS", "0"))
+
+async def payment_reconcile_loop():
+    """Jalankan reconcile_payments secara periodik di proses API"""
+    from reconcile_payments import build_snap_client, reconcile_pending_payments
+
+    client = build_snap_client(concurrency=5)
+    lock = db.AdvisoryLock("dramamu:payment_reconcile")
+    try:
+        while True:
+            await asyncio.sleep(RECONCILE_INTERVAL_SECONDS)
+            if not await holds_singleton(lock):
+                continue
+            try:
+                summary = await reconcile_pending_payments(DATABASE_URL, client, rate=5.0, verbose=False)
+                if summary["scanned"]:
+                    logger.info(f"🔄 Rekonsiliasi payment: {summary['scanned']} diperiksa, update {summary['updated']}")
+            except Exception as e:
+                logger.error(f"Error rekonsiliasi payment: {e}")
+    finally:
+        lock.release()
+        await client.aclose()
 
-# Inisialisasi Midtrans
-midtrans_client = midtransclient.Snap(
-    is_production=False,
-    server_key=MIDTRANS_SERVER_KEY or "",
-    client_key=MIDTRANS_CLIENT_KEY or ""
+# Sweep VIP expired di background (0 = nonaktif)
+VIP_SWEEP_INTERVAL_SECONDS = int(os.environ.get("VIP_SWEEP_INTERVAL_SECONDS", "300"))
+VIP_EXPIRY_NOTIFY = os.environ.get("VIP_EXPIRY_NOTIFY", "false").lower() == "true"
+
+async def vip_sweep_loop():
+    """Downgrade VIP expired secara periodik (lihat vip_sweeper.py)"""
+    from vip_sweeper import run_sweep
+
+    lock = db.AdvisoryLock("dramamu:vip_sweep")
+    try:
+        while True:
+            if await holds_singleton(lock):
+                try:
+                    expired = await asyncio.to_thread(run_sweep, DATABASE_URL, notify=VIP_EXPIRY_NOTIFY)
+                    if expired:
+                        logger.info(f"⌛ {len(expired)} VIP expired di-downgrade")
+                except Exception as e:
+                    logger.error(f"Error sweep VIP: {e}")
+            await asyncio.sleep(VIP_SWEEP_INTERVAL_SECONDS)
+    finally:
+        lock.release()
+
+# --- HEALTH PROBE (/readyz) ---
+_probe_http: Optional[httpx.AsyncClient] = None
+
+def probe_http_client() -> httpx.AsyncClient:
+    global _probe_http
+    if _probe_http is None:
+        _probe_http = httpx.AsyncClient(timeout=HEALTH_PROBE_TIMEOUT)
+    return _probe_http
+
+def midtrans_circuit() -> dict:
+    if _midtrans_client is None:
+        return {"status": OK, "circuit": "unused"}
+    state = _midtrans_client.breaker.state
+    return {"status": WARN if state == "open" else OK, "circuit": state}
+
+health_probe = HealthProbe(
+    {
+        "database": database_check(db.get_connection),
+        "pool": pool_check(db.get_pool),
+        "telegram": http_check(
+            probe_http_client, f"{TELEGRAM_API_BASE_URL}/bot{BOT_TOKEN}/getMe",
+            healthy=lambda response: response.status_code == 200,
+        ) if BOT_TOKEN else skip_check("BOT_TOKEN kosong"),
+        # Endpoint Snap cukup bisa dijangkau (status HTTP apa pun)
+        "midtrans": http_check(probe_http_client, MIDTRANS_SNAP_URL, extra=midtrans_circuit),
+        "queue": queue_backlog_check(db.get_connection),
+        "sweeper": sweeper_lag_check(db.get_connection),
+    },
+    critical={"database", "pool"},
+    run_first=("pool",),
 )
 
+# Batas warm-up di lifespan; lewat dari ini server tetap jalan (readiness yang melapor)
+STARTUP_WARMUP_TIMEOUT = float(os.environ.get("STARTUP_WARMUP_TIMEOUT", "15"))
+
+async def warm_up():
+    """
+    Buka pool DB sebelum server menerima traffic. Probe pertama (termasuk
+    Telegram/Midtrans) jalan di background; /readyz tetap 503 "starting"
+    sampai probe itu selesai.
+    """
+    started = time.perf_counter()
+    try:
+        pool = await asyncio.wait_for(asyncio.to_thread(db.warm_up), STARTUP_WARMUP_TIMEOUT)
+        if pool:
+            logger.info(f"🔥 Pool DB siap dalam {time.perf_counter() - started:.2f}s: "
+                        f"{pool['connections']} koneksi, round-trip {pool['rtt_ms']}ms")
+    except Exception as e:
+        logger.warning(f"Warm-up pool DB gagal: {type(e).__name__}: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Multi-worker: snapshot metric worker ini untuk agregasi /metrics
+    start_multiprocess_writer()
+    await warm_up()
+    background_tasks = [asyncio.create_task(health_probe.loop())]
+    if RECONCILE_INTERVAL_SECONDS > 0 and DATABASE_URL:
+        background_tasks.append(asyncio.create_task(payment_reconcile_loop()))
+    if VIP_SWEEP_INTERVAL_SECONDS > 0 and DATABASE_URL:
+        background_tasks.append(asyncio.create_task(vip_sweep_loop()))
+
+    yield
+
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    if _probe_http is not None:
+        await _probe_http.aclose()
+    if _telegram_http is not None:
+        await _telegram_http.aclose()
+    # Tutup connection pool Midtrans
+    if _midtrans_client is not None:
+        await _midtrans_client.aclose()
+    db.close_pool()
+    write_snapshot()
+
 # Buat aplikasi FastAPI dengan rate limiting
-app = FastAPI(title="Dramamu API", version="1.0.0")
+app = FastAPI(title="Dramamu API", version="1.0.0", lifespan=lifespan)
 
 # Rate Limiter
-limiter = Limiter(key_func=get_remote_address)
+limiter = Limiter(key_func=get_remote_address, enabled=RATE_LIMIT_ENABLED, storage_uri=RATE_LIMIT_STORAGE_URI)
+if RATE_LIMIT_ENABLED and WEB_CONCURRENCY > 1 and RATE_LIMIT_STORAGE_URI.startswith("memory://"):
+    # Counter per worker → limit efektif WEB_CONCURRENCY x; jangan jalan diam-diam
+    raise RuntimeError(f"Rate limit memory:// dengan {WEB_CONCURRENCY} worker: limit efektif {WEB_CONCURRENCY}x. "
+                       "Set RATE_LIMIT_STORAGE_URI (mis. redis://host:6379/0) untuk limit bersama.")
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
@@ -51,18 +280,51 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Fungsi untuk konek ke DB
+# Profiling per request (X-Profile: 1 + token admin); tanpa token tidak dipasang
+if ADMIN_API_TOKEN:
+    app.add_middleware(ProfilingMiddleware, admin_token=ADMIN_API_TOKEN)
+
+# Request ID untuk korelasi log (X-Request-ID dari bot dipakai ulang)
+app.add_middleware(RequestContextMiddleware)
+
+# Latency per route + status (paling luar, supaya mencakup semua middleware)
+app.add_middleware(MetricsMiddleware)
+
+# Request create_payment yang sedang jalan (single-flight per proses)
+_inflight_payments: dict = {}
+
+# Fungsi untuk konek ke DB (dari connection pool, close() = kembali ke pool)
 def get_db_connection():
     try:
         if not DATABASE_URL:
-            print("DATABASE_URL tidak tersedia!")
+            logger.error("DATABASE_URL tidak tersedia!")
             return None
-        conn = psycopg2.connect(DATABASE_URL)
+        conn = db.get_connection()
         return conn
     except Exception as e:
-        print(f"GAGAL KONEK KE DB: {e}")
+        logger.error(f"GAGAL KONEK KE DB: {e}")
         return None
 
+async def acquire_db_connection():
+    """
+    get_db_connection() untuk handler async: acquire pool bisa blocking
+    sampai DB_POOL_TIMEOUT saat pool habis, jadi dijalankan di thread lain
+    supaya event loop tetap melayani request lain.
+    """
+    return await asyncio.to_thread(get_db_connection)
+
+# --- AKSES ADMIN (endpoint /debug/*) ---
+def require_admin(request: Request):
+    """Header X-Admin-Token atau Authorization: Bearer harus sama dengan ADMIN_API_TOKEN"""
+    if not ADMIN_API_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    supplied = request.headers.get("X-Admin-Token", "")
+    auth = request.headers.get("Authorization", "")
+    if not supplied and auth.lower().startswith("bearer "):
+        supplied = auth[7:].strip()
+    if not hmac.compare_digest(supplied.encode(), ADMIN_API_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
 # --- VALIDASI INIT_DATA TELEGRAM ---
 def verify_telegram_init_data(init_data: str, bot_token: str) -> bool:
     """
@@ -104,7 +366,7 @@ def verify_telegram_init_data(init_data: str, bot_token: str) -> bool:
         return received_hash == calculated_hash
 
     except Exception as e:
-        print(f"Error validating init_data: {e}")
+        logger.warning(f"Error validating init_data: {e}")
         return False
 
 # --- CEK STATUS VIP USER ---
@@ -123,7 +385,7 @@ def check_vip_status(telegram_id: int) -> bool:
             VALUES (%s, %s, NOW())
             ON CONFLICT (telegram_id) 
             DO UPDATE SET telegram_id = EXCLUDED.telegram_id
-            RETURNING is_vip;
+            RETURNING is_vip AND (vip_expires_at IS NULL OR vip_expires_at > NOW());
         """, (telegram_id, False))
 
         result = cur.fetchone()
@@ -131,7 +393,7 @@ def check_vip_status(telegram_id: int) -> bool:
         conn.commit()
 
     except Exception as e:
-        print(f"Error cek VIP: {e}")
+        logger.error(f"Error cek VIP: {e}")
         try:
             conn.rollback()
         except:
@@ -164,7 +426,7 @@ def get_movie_details(movie_id: int) -> Optional[dict]:
             }
         cur.close()
     except Exception as e:
-        print(f"Error ambil movie: {e}")
+        logger.error(f"Error ambil movie: {e}")
     finally:
         try:
             if conn:
@@ -174,11 +436,15 @@ def get_movie_details(movie_id: int) -> Optional[dict]:
     return movie
 
 # --- MODEL VALIDATION ---
+class DeliveryStatus(BaseModel):
+    delivered: bool
+
 class PaymentRequest(BaseModel):
     telegram_id: int
     paket_id: int
     gross_amount: int
     nama_paket: str
+    idempotency_key: Optional[str] = None
 
     @validator('gross_amount')
     def validate_amount(cls, v):
@@ -201,35 +467,84 @@ async def root():
         "timestamp": datetime.now().isoformat()
     }
 
+@app.get("/livez")
+async def livez():
+    """Liveness: proses dan event loop jalan (tanpa I/O)"""
+    return {"status": "alive"}
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: hasil deep probe terakhir; 503 kalau check kritis gagal / probe basi"""
+    ready, body = health_probe.readiness()
+    return JSONResponse(content=body, status_code=200 if ready else 503)
+
 @app.get("/health")
 async def health_check():
-    """Health check endpoint"""
-    db_status = "healthy"
-    conn = None
-    try:
-        conn = get_db_connection()
-        if not conn:
-            db_status = "unhealthy"
-    except:
-        db_status = "unhealthy"
-    finally:
-        try:
-            if conn:
-                conn.close()
-        except:
-            pass
+    """Alias /readyz (dipakai platform deploy lama)"""
+    return await readyz()
+
+@app.get("/metrics")
+async def metrics():
+    """Metrics format Prometheus (latency route, DB, pool, outbound, funnel)"""
+    return Response(content=render(), headers={"Content-Type": CONTENT_TYPE})
 
+# --- DEBUG: STATISTIK QUERY (admin) ---
+@app.get("/debug/queries", dependencies=[Depends(require_admin)])
+async def debug_queries(limit: int = 20, order: str = "total"):
+    """
+    Top statement SQL per fingerprint (order: total / mean / max / calls / rows),
+    gabungan semua worker (pid di "workers")
+    """
+    if order not in ("total", "mean", "max", "calls", "rows"):
+        raise HTTPException(status_code=400, detail="order harus total / mean / max / calls / rows")
+    report = await asyncio.to_thread(db.statement_report, max(1, min(limit, 200)), order)
     return {
-        "status": "healthy",
-        "database": db_status,
-        "timestamp": datetime.now().isoformat()
+        "slow_query_ms": db.DB_SLOW_QUERY_MS,
+        "explain_slow": db.DB_EXPLAIN_SLOW,
+        **report,
     }
 
+@app.delete("/debug/queries", dependencies=[Depends(require_admin)])
+async def reset_debug_queries():
+    """Reset statistik query semua worker (worker lain menyusul di flush berikutnya)"""
+    await asyncio.to_thread(db.reset_statements)
+    return {"reset": True}
+
+# --- DEBUG: PROFILING (admin, lihat profiling.py) ---
+@app.get("/debug/profile", dependencies=[Depends(require_admin)])
+async def debug_profile(seconds: float = 10.0, interval_ms: float = PROFILE_INTERVAL_MS):
+    """Sample semua thread selama `seconds`, hasil folded stacks (flamegraph.pl / speedscope)"""
+    try:
+        sampler = await asyncio.to_thread(capture, seconds, max(1.0, interval_ms) / 1000)
+    except ProfileBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    # Capture proses hanya mencakup worker ini
+    return PlainTextResponse(render_folded(sampler.stacks), headers={
+        "X-Profile-Pid": str(os.getpid()),
+        "X-Profile-Samples": str(sampler.samples),
+        "X-Profile-Seconds": f"{sampler.elapsed:.2f}",
+    })
+
+@app.get("/debug/profile/requests", dependencies=[Depends(require_admin)])
+async def debug_profile_requests():
+    """Profile per request terakhir dari semua worker (tanpa stack)"""
+    profiles = await asyncio.to_thread(list_profiles)
+    return {"profiles": [profile_summary(p) for p in profiles]}
+
+@app.get("/debug/profile/requests/{profile_id}", dependencies=[Depends(require_admin)])
+async def debug_profile_request(profile_id: str, format: str = "folded"):
+    profile = await asyncio.to_thread(find_profile, profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile tidak ditemukan")
+    if format == "json":
+        return profile_summary(profile)
+    return PlainTextResponse(render_folded(profile["stacks"]))
+
 # --- API BARU UNTUK NGASIH DATA STATS REFERRAL ---
 @app.get("/api/v1/referral_stats/{telegram_id}")
 @limiter.limit("30/minute")
 async def get_referral_stats(request: Request, telegram_id: int):
-    conn = get_db_connection()
+    conn = await acquire_db_connection()
     if conn is None:
         raise HTTPException(status_code=500, detail="Database connection error")
 
@@ -268,7 +583,7 @@ async def get_referral_stats(request: Request, telegram_id: int):
 @app.get("/api/v1/movies")
 @limiter.limit("60/minute")
 async def get_all_movies(request: Request):
-    conn = get_db_connection()
+    conn = await acquire_db_connection()
     if conn is None:
         raise HTTPException(status_code=500, detail="Database connection error")
 
@@ -303,20 +618,23 @@ async def get_all_movies(request: Request):
 @app.get("/api/v1/user_status/{telegram_id}")
 @limiter.limit("30/minute")
 async def get_user_status(request: Request, telegram_id: int):
-    conn = get_db_connection()
+    conn = await acquire_db_connection()
     if conn is None:
         raise HTTPException(status_code=500, detail="Database connection error")
 
     try:
         cur = conn.cursor()
-        cur.execute("SELECT is_vip FROM users WHERE telegram_id = %s;", (telegram_id,))
+        cur.execute(
+            "SELECT is_vip AND (vip_expires_at IS NULL OR vip_expires_at > NOW()) FROM users WHERE telegram_id = %s;",
+            (telegram_id,)
+        )
         user = cur.fetchone()
         cur.close()
 
         if user:
             return {
                 "telegram_id": telegram_id, 
-                "is_vip": user[0],
+                "is_vip": bool(user[0]),
                 "status": "user_found"
             }
         else:
@@ -336,6 +654,76 @@ async def get_user_status(request: Request, telegram_id: int):
             pass
 
 # --- CREATE PAYMENT LINK ---
+def generate_order_id(telegram_id: int) -> str:
+    """Order ID unik walaupun ada beberapa request di detik yang sama"""
+    return f"DRAMAMU-{telegram_id}-{int(time.time())}-{secrets.token_hex(4)}"
+
+def find_reusable_payment(telegram_id: int, nama_paket: str, gross_amount: int, idempotency_key: Optional[str]) -> Optional[dict]:
+    """
+    Cari snap token yang masih valid untuk user + paket & nominal yang sama:
+    - idempotency_key sama → pakai ulang selama token Snap belum expired
+    - selain itu → pakai ulang dalam PAYMENT_REUSE_WINDOW
+    Key yang sama dengan paket / nominal lain tidak cocok di sini dan
+    ditolak oleh claim_payment.
+    """
+    conn = get_db_connection()
+    if not conn:
+        return None
+
+    payment = None
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            """SELECT order_id, snap_token FROM payments
+               WHERE telegram_id = %s
+               AND status = 'pending'
+               AND snap_token IS NOT NULL
+               AND package_name = %s AND amount = %s
+               AND (
+                   (idempotency_key = %s AND created_at > NOW() - make_interval(secs => %s))
+                   OR created_at > NOW() - make_interval(secs => %s)
+               )
+               ORDER BY created_at DESC
+               LIMIT 1;""",
+            (telegram_id, nama_paket, gross_amount, idempotency_key, SNAP_TOKEN_TTL_SECONDS,
+             PAYMENT_REUSE_WINDOW_SECONDS)
+        )
+        row = cur.fetchone()
+        if row:
+            payment = {"order_id": row[0], "snap_token": row[1]}
+        cur.close()
+    except Exception as e:
+        logger.error(f"Error cari payment existing: {e}")
+    finally:
+        try:
+            conn.close()
+        except:
+            pass
+    return payment
+
+async def single_flight(key: str, coro_factory):
+    """
+    Gabungkan request identik yang datang bersamaan: hanya request pertama
+    yang jalan, sisanya menunggu dan menerima hasil yang sama.
+    """
+    inflight = _inflight_payments.get(key)
+    if inflight is not None:
+        return await asyncio.shield(inflight)
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight_payments[key] = future
+    try:
+        result = await coro_factory()
+        future.set_result(result)
+        return result
+    except BaseException as e:
+        future.set_exception(e)
+        # Tandai sudah diambil supaya tidak muncul warning kalau tidak ada yang menunggu
+        future.exception()
+        raise
+    finally:
+        _inflight_payments.pop(key, None)
+
 @app.post("/api/v1/create_payment")
 @limiter.limit("20/minute")
 async def create_payment_link(request: Request, payment_data: PaymentRequest):
@@ -343,8 +731,126 @@ async def create_payment_link(request: Request, payment_data: PaymentRequest):
     if payment_data.gross_amount < 1000:
         raise HTTPException(status_code=400, detail="Amount too small")
 
-    # Buat ID order unik
-    order_id = f"DRAMAMU-{payment_data.telegram_id}-{int(time.time())}"
+    # Idempotency key dari header atau body (opsional)
+    idempotency_key = request.headers.get("Idempotency-Key") or payment_data.idempotency_key
+    if idempotency_key and len(idempotency_key) > 255:
+        raise HTTPException(status_code=400, detail="Idempotency key too long")
+
+    # Field sama dengan find_reusable_payment (paket dicocokkan lewat nama_paket)
+    flight_key = (
+        f"{payment_data.telegram_id}:key:{idempotency_key}" if idempotency_key
+        else f"{payment_data.telegram_id}:{payment_data.nama_paket}:{payment_data.gross_amount}"
+    )
+    return await single_flight(flight_key, lambda: create_snap_payment(payment_data, idempotency_key))
+
+class PaymentConflict(Exception):
+    """Idempotency-Key sudah terikat ke payment lain / payment yang tidak bisa dipakai ulang"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+def claim_payment(payment_data: PaymentRequest, order_id: str, idempotency_key: Optional[str]) -> Optional[dict]:
+    """
+    Catat payment 'pending' (snap_token masih NULL) SEBELUM memanggil Midtrans,
+    supaya setiap token yang diberikan ke user pasti punya baris di payments.
+    Return None kalau baris berhasil diklaim, atau dict payment existing
+    kalau idempotency_key sudah dipakai dan tokennya masih bisa dipakai ulang.
+    Unique index (telegram_id, idempotency_key) menjaga ini antar worker.
+    Klaim lama tanpa token (> PAYMENT_CLAIM_STALE_SECONDS) diambil alih.
+    """
+    conn = get_db_connection()
+    if not conn:
+        raise PaymentConflict(503, "Database tidak tersedia, coba lagi nanti")
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            """INSERT INTO payments (telegram_id, order_id, amount, package_name, status, idempotency_key, created_at)
+               VALUES (%s, %s, %s, %s, 'pending', %s, NOW())
+               ON CONFLICT (telegram_id, idempotency_key) DO UPDATE
+                   SET order_id = EXCLUDED.order_id, created_at = NOW()
+                   WHERE payments.snap_token IS NULL AND payments.status = 'pending'
+                   AND payments.package_name = EXCLUDED.package_name AND payments.amount = EXCLUDED.amount
+                   AND payments.created_at < NOW() - make_interval(secs => %s)
+               RETURNING id;""",
+            (payment_data.telegram_id, order_id, payment_data.gross_amount, payment_data.nama_paket, idempotency_key,
+             PAYMENT_CLAIM_STALE_SECONDS)
+        )
+        claimed = cur.fetchone() is not None
+        existing = None
+        if not claimed:
+            cur.execute(
+                """SELECT order_id, snap_token, package_name, amount, status,
+                          created_at > NOW() - make_interval(secs => %s)
+                   FROM payments WHERE telegram_id = %s AND idempotency_key = %s;""",
+                (SNAP_TOKEN_TTL_SECONDS, payment_data.telegram_id, idempotency_key)
+            )
+            existing = cur.fetchone()
+        conn.commit()
+        cur.close()
+    finally:
+        conn.close()
+
+    if claimed:
+        return None
+    if existing is None:
+        # Baris bentrok sudah dihapus lagi (klaim lain gagal ke Midtrans) → minta ulang
+        raise PaymentConflict(409, "Payment dengan Idempotency-Key ini sedang diproses, coba lagi")
+    existing_order, snap_token, package_name, amount, status, fresh = existing
+    if package_name != payment_data.nama_paket or amount != payment_data.gross_amount:
+        raise PaymentConflict(422, "Idempotency-Key sudah dipakai untuk paket / nominal lain")
+    if status != 'pending' or not fresh:
+        raise PaymentConflict(409, "Idempotency-Key sudah dipakai untuk payment yang selesai / expired")
+    if not snap_token:
+        # Worker / request lain sedang memanggil Midtrans untuk key ini
+        raise PaymentConflict(409, "Payment dengan Idempotency-Key ini sedang diproses, coba lagi")
+    return {"order_id": existing_order, "snap_token": snap_token}
+
+def update_payment_row(order_id: str, snap_token: Optional[str]) -> bool:
+    """
+    snap_token ada → simpan token; None → hapus klaim (Midtrans gagal, key
+    bisa dipakai lagi). Return True kalau berhasil ditulis.
+    """
+    conn = get_db_connection()
+    if not conn:
+        return False
+    try:
+        cur = conn.cursor()
+        if snap_token:
+            cur.execute("UPDATE payments SET snap_token = %s WHERE order_id = %s;", (snap_token, order_id))
+        else:
+            cur.execute("DELETE FROM payments WHERE order_id = %s AND snap_token IS NULL;", (order_id,))
+        conn.commit()
+        cur.close()
+        return True
+    except Exception as e:
+        # Klaim yang tertinggal diambil alih setelah PAYMENT_CLAIM_STALE_SECONDS
+        logger.error(f"Error update payment {order_id}: {e}")
+        return False
+    finally:
+        conn.close()
+
+async def create_snap_payment(payment_data: PaymentRequest, idempotency_key: Optional[str]) -> dict:
+    # Pakai ulang token yang masih valid (double-tap / retry dari mini app)
+    existing = await asyncio.to_thread(
+        find_reusable_payment,
+        payment_data.telegram_id, payment_data.nama_paket, payment_data.gross_amount, idempotency_key
+    )
+    if existing:
+        return {"snap_token": existing["snap_token"], "order_id": existing["order_id"], "reused": True}
+
+    # Buat ID order unik lalu klaim barisnya dulu
+    order_id = generate_order_id(payment_data.telegram_id)
+    try:
+        existing = await asyncio.to_thread(claim_payment, payment_data, order_id, idempotency_key)
+    except PaymentConflict as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    except Exception as e:
+        logger.error(f"Error klaim payment: {e}")
+        raise HTTPException(status_code=503, detail="Database tidak tersedia, coba lagi nanti")
+    if existing:
+        return {"snap_token": existing["snap_token"], "order_id": existing["order_id"], "reused": True}
 
     # Siapin detail transaksi
     transaction_details = {
@@ -377,34 +883,34 @@ async def create_payment_link(request: Request, payment_data: PaymentRequest):
         "item_details": item_details,
     }
 
+    # Klaim dilepas di semua jalur keluar tanpa token tersimpan (error Midtrans,
+    # request di-cancel / shutdown, gagal simpan token); worker yang mati
+    # ditangani pengambilalihan klaim basi di claim_payment
+    stored = False
     try:
-        snap_response = midtrans_client.create_transaction(transaction_data)
-        snap_token = snap_response['token']
-
-        # Log payment attempt
-        conn = get_db_connection()
-        if conn:
-            try:
-                cur = conn.cursor()
-                cur.execute(
-                    "INSERT INTO payments (telegram_id, order_id, amount, package_name, status, created_at) VALUES (%s, %s, %s, %s, 'pending', NOW());",
-                    (payment_data.telegram_id, order_id, payment_data.gross_amount, payment_data.nama_paket)
-                )
-                conn.commit()
-                cur.close()
-            except Exception as e:
-                print(f"Error logging payment: {e}")
-            finally:
-                try:
-                    conn.close()
-                except:
-                    pass
+        try:
+            snap_response = await get_midtrans_client().create_transaction(transaction_data)
+            snap_token = snap_response['token']
+        except (CircuitOpenError, SnapSaturatedError) as e:
+            logger.warning(f"Midtrans sedang tidak tersedia: {e}")
+            raise HTTPException(status_code=503, detail="Payment gateway sedang sibuk, coba lagi nanti")
+        except MidtransError as e:
+            logger.error(f"Error pas bikin token Snap: {e}")
+            raise HTTPException(status_code=502, detail=str(e))
+        except Exception as e:
+            logger.exception(f"Error pas bikin token Snap: {e}")
+            raise HTTPException(status_code=500, detail=str(e))
 
-        return {"snap_token": snap_token}
+        stored = await asyncio.to_thread(update_payment_row, order_id, snap_token)
+        if not stored:
+            # Token tanpa baris payment tidak boleh sampai ke user
+            raise HTTPException(status_code=503, detail="Database tidak tersedia, coba lagi nanti")
+    finally:
+        if not stored:
+            # shield: DELETE tetap jalan walaupun task di-cancel lagi
+            await asyncio.shield(asyncio.to_thread(update_payment_row, order_id, None))
 
-    except Exception as e:
-        print(f"Error pas bikin token Snap: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+    return {"snap_token": snap_token, "order_id": order_id, "reused": False}
 
 # --- SISTEM PELANTARA: TAHAN DATA FILM SAMPAI BOT TERIMA /START ---
 @app.post("/api/v1/hold_movie_data")
@@ -419,6 +925,7 @@ async def hold_movie_data(request: Request, data: dict):
     5. Mini app kirim via sendData() → auto-trigger bot
     6. Bot terima via web_app_data → fetch data → kirim film
     """
+    FUNNEL_EVENTS.inc(event="hold_requested")
     try:
         telegram_id = data.get("chat_id")
         movie_id = data.get("movie_id")
@@ -440,26 +947,29 @@ async def hold_movie_data(request: Request, data: dict):
             raise HTTPException(status_code=401, detail="Invalid init_data")
 
         # Cek status VIP user
-        if not check_vip_status(telegram_id):
+        if not await asyncio.to_thread(check_vip_status, telegram_id):
+            FUNNEL_EVENTS.inc(event="hold_vip_required")
             return {
                 "status": "vip_required",
                 "message": "User is not VIP"
             }
 
         # Ambil detail film
-        movie = get_movie_details(movie_id)
+        movie = await asyncio.to_thread(get_movie_details, movie_id)
         if not movie:
+            FUNNEL_EVENTS.inc(event="hold_movie_not_found")
             return {
                 "status": "movie_not_found",
                 "message": "Movie not found"
             }
 
-        # Generate token unik
+        # Generate token unik + trace funnel pengiriman
         start_token = secrets.token_urlsafe(32)
+        trace_id = uuid.uuid4().hex
         expires_at = datetime.now() + timedelta(minutes=15)
 
         # Simpan data film di pelantara (intermediary_queue)
-        conn = get_db_connection()
+        conn = await acquire_db_connection()
         if not conn:
             return {
                 "status": "error",
@@ -477,9 +987,9 @@ async def hold_movie_data(request: Request, data: dict):
             
             cur.execute(
                 """INSERT INTO intermediary_queue 
-                   (telegram_id, movie_id, start_token, movie_data, status, start_link, expires_at) 
-                   VALUES (%s, %s, %s, %s, 'waiting_start', %s, %s);""",
-                (telegram_id, movie_id, start_token, movie_data_json, start_link, expires_at)
+                   (telegram_id, movie_id, start_token, movie_data, status, start_link, expires_at, trace_id) 
+                   VALUES (%s, %s, %s, %s, 'waiting_start', %s, %s, %s);""",
+                (telegram_id, movie_id, start_token, movie_data_json, start_link, expires_at, trace_id)
             )
             conn.commit()
             cur.close()
@@ -494,19 +1004,23 @@ async def hold_movie_data(request: Request, data: dict):
                 conn.commit()
                 cur.close()
             except Exception as e:
-                print(f"Error logging activity: {e}")
+                logger.error(f"Error logging activity: {e}")
 
-            print(f"✅ Data film ditahan untuk user {telegram_id}, token: {start_token}")
-            print(f"⏳ Menunggu Mini App kirim via sendData()...")
+            FUNNEL_EVENTS.inc(event="hold_created")
+            with log_context(user_id=telegram_id, token=start_token, trace_id=trace_id):
+                logger.info("✅ Data film ditahan, menunggu Mini App kirim via sendData()",
+                            extra={"sample": True, "movie_id": movie_id})
 
             return {
                 "status": "success",
                 "message": "Data film ditahan, akan otomatis terkirim via sendData",
-                "token": start_token
+                "token": start_token,
+                "trace_id": trace_id
             }
 
         except Exception as e:
-            print(f"Error holding movie data: {e}")
+            FUNNEL_EVENTS.inc(event="hold_error")
+            logger.error(f"Error holding movie data: {e}", extra={"user_id": telegram_id})
             try:
                 conn.rollback()
             except:
@@ -524,18 +1038,22 @@ async def hold_movie_data(request: Request, data: dict):
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error in hold_movie_data: {e}")
+        logger.exception(f"Error in hold_movie_data: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @app.post("/api/v1/release_movie_data/{token}")
 @limiter.limit("60/minute")
-async def release_movie_data(request: Request, token: str):
+async def release_movie_data(request: Request, token: str, received_at: Optional[float] = None):
     """
     ENDPOINT UNTUK BOT:
     Dipanggil setelah bot terima /start
     Mengembalikan data film yang ditahan dan update status
+
+    `received_at` (epoch detik, opsional) = waktu bot menerima sendData / /start,
+    disimpan sebagai sent_to_bot_at untuk funnel_report.py
     """
-    conn = get_db_connection()
+    FUNNEL_EVENTS.inc(event="release_requested")
+    conn = await acquire_db_connection()
     if not conn:
         raise HTTPException(status_code=500, detail="Database error")
 
@@ -544,7 +1062,7 @@ async def release_movie_data(request: Request, token: str):
         
         # Ambil data dari intermediary_queue
         cur.execute(
-            """SELECT telegram_id, movie_id, movie_data, status 
+            """SELECT telegram_id, movie_id, movie_data, status, trace_id 
                FROM intermediary_queue 
                WHERE start_token = %s 
                AND expires_at > NOW() 
@@ -554,15 +1072,17 @@ async def release_movie_data(request: Request, token: str):
         result = cur.fetchone()
 
         if result:
-            telegram_id, movie_id, movie_data_json, status = result
+            telegram_id, movie_id, movie_data_json, status, trace_id = result
             
-            # Update status: bot sudah terima /start
+            # Update status: bot sudah terima /start (jam bot tidak boleh di depan DB)
             cur.execute(
                 """UPDATE intermediary_queue 
                    SET status = 'released_to_bot', 
+                       sent_to_bot_at = CASE WHEN %s::float8 IS NULL THEN sent_to_bot_at
+                                             ELSE LEAST(to_timestamp(%s::float8), NOW()) END,
                        bot_received_start_at = NOW() 
                    WHERE start_token = %s;""",
-                (token,)
+                (received_at, received_at, token)
             )
             conn.commit()
             
@@ -574,29 +1094,36 @@ async def release_movie_data(request: Request, token: str):
                 )
                 conn.commit()
             except Exception as e:
-                print(f"Error logging activity: {e}")
+                logger.error(f"Error logging activity: {e}")
 
             cur.close()
             
             import json
             movie_data = json.loads(movie_data_json)
+            FUNNEL_EVENTS.inc(event="release_success")
+            with log_context(user_id=telegram_id, token=token, trace_id=trace_id):
+                logger.info("📤 Data film dilepas ke bot", extra={"sample": True, "movie_id": movie_id})
             
             return {
                 "valid": True,
                 "telegram_id": telegram_id,
                 "movie_id": movie_id,
                 "movie_data": movie_data,
+                "trace_id": trace_id,
                 "message": "Data film berhasil dilepas dari pelantara"
             }
         else:
             cur.close()
+            FUNNEL_EVENTS.inc(event="release_invalid")
             return {
                 "valid": False,
                 "message": "Token tidak valid, expired, atau sudah diproses"
             }
 
     except Exception as e:
-        print(f"Error releasing movie data: {e}")
+        FUNNEL_EVENTS.inc(event="release_error")
+        with log_context(token=token):
+            logger.error(f"Error releasing movie data: {e}")
         raise HTTPException(status_code=500, detail=str(e))
     finally:
         try:
@@ -605,6 +1132,44 @@ async def release_movie_data(request: Request, token: str):
         except:
             pass
 
+@app.post("/api/v1/delivery_status/{token}")
+@limiter.limit("60/minute")
+async def delivery_status(request: Request, token: str, result: DeliveryStatus):
+    """
+    ENDPOINT UNTUK BOT:
+    Dipanggil setelah send_movie_to_user, tahap terakhir funnel pengiriman
+    """
+    conn = await acquire_db_connection()
+    if not conn:
+        raise HTTPException(status_code=500, detail="Database error")
+
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            """UPDATE intermediary_queue
+               SET status = %s, delivered_at = NOW()
+               WHERE start_token = %s AND status = 'released_to_bot'
+               RETURNING trace_id;""",
+            ('delivered' if result.delivered else 'delivery_failed', token)
+        )
+        row = cur.fetchone()
+        conn.commit()
+        cur.close()
+    except Exception as e:
+        with log_context(token=token):
+            logger.error(f"Error update delivery status: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        try:
+            conn.close()
+        except:
+            pass
+
+    if not row:
+        return {"updated": False}
+    FUNNEL_EVENTS.inc(event="delivered" if result.delivered else "delivery_failed")
+    return {"updated": True, "trace_id": row[0]}
+
 # --- LEGACY ENDPOINT (untuk backward compatibility) ---
 @app.post("/api/v1/handle_movie_request")
 @limiter.limit("30/minute")
@@ -620,7 +1185,7 @@ async def get_pending_action(request: Request, token: str):
     """
     Ambil pending action berdasarkan token (untuk bot)
     """
-    conn = get_db_connection()
+    conn = await acquire_db_connection()
     if not conn:
         raise HTTPException(status_code=500, detail="Database error")
 
@@ -658,7 +1223,7 @@ async def simulate_bot_send(telegram_id: int, movie_data: dict) -> bool:
     Kirim film ke user via Telegram Bot API
     """
     try:
-        url = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
+        url = f"{TELEGRAM_API_BASE_URL}/bot{BOT_TOKEN}/sendMessage"
         
         message_text = f"""
 🎬 <b>{movie_data.get('title', 'Film')}</b>
@@ -674,18 +1239,24 @@ Selamat menonton! 🍿
             "parse_mode": "HTML"
         }
         
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(url, json=payload)
-            
-            if response.status_code == 200:
-                print(f"✅ Film berhasil dikirim ke user {telegram_id}")
-                return True
-            else:
-                print(f"❌ Gagal kirim film ke user {telegram_id}: {response.status_code}")
-                return False
+        started = time.perf_counter()
+        outcome = "network_error"
+        try:
+            response = await get_telegram_http().post(url, json=payload)
+            outcome = "success" if response.status_code == 200 else f"http_{response.status_code}"
+        finally:
+            OUTBOUND_SECONDS.observe(time.perf_counter() - started,
+                                     service="telegram", operation="sendMessage", outcome=outcome)
+
+        if response.status_code == 200:
+            logger.info("✅ Film berhasil dikirim", extra={"sample": True, "user_id": telegram_id})
+            return True
+        else:
+            logger.warning(f"❌ Gagal kirim film: HTTP {response.status_code}", extra={"user_id": telegram_id})
+            return False
                 
     except Exception as e:
-        print(f"❌ Error saat kirim film: {e}")
+        logger.error(f"❌ Error saat kirim film: {e}", extra={"user_id": telegram_id})
         return False
 
 # --- ENDPOINT UNTUK MENGURUS PENARIKAN REFERRAL ---
@@ -717,7 +1288,7 @@ async def withdraw_referral(request: Request, data: dict):
             raise HTTPException(status_code=400, detail="Invalid amount")
 
         # Simpan ke database
-        conn = get_db_connection()
+        conn = await acquire_db_connection()
         if conn:
             try:
                 cur = conn.cursor()
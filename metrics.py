@@ -0,0 +1,425 @@
+"""
+Metrics Dramamu (format Prometheus)
+===================================
+Counter / Gauge / Histogram ringan tanpa dependency tambahan, plus
+middleware ASGI untuk latency per route + status.
+
+Contoh:
+    from metrics import Counter, Histogram, render
+
+    EVENTS = Counter("dramamu_events_total", "Jumlah event", ["event"])
+    EVENTS.inc(event="hold_created")
+
+    LATENCY = Histogram("dramamu_job_seconds", "Durasi job", ["job"])
+    with LATENCY.time(job="sweep"):
+        ...
+
+    text = render()   # isi endpoint /metrics
+
+Proses tanpa web framework (bot) bisa expose lewat start_metrics_server().
+
+Multi-worker (gunicorn): kalau METRICS_MULTIPROC_DIR di-set (otomatis oleh
+gunicorn.conf.py), tiap worker menulis snapshot metric-nya ke
+<dir>/metrics-<pid>.json dan render() menggabungkan semua worker: counter
+dan histogram dijumlah, gauge sesuai multiprocess_mode (sum / min / max).
+Counter worker yang sudah mati (max_requests / reload) dipindah ke
+metrics-dead.json oleh master supaya total tidak mundur. State per proses
+lain (statistik query db.py) ikut ditulis lewat add_flush_hook().
+"""
+
+import glob
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Optional, Sequence
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Bucket default (detik): cukup rapat di 5ms-1s untuk alert p99 API
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 10.0)
+
+_registry: list = []
+_registry_lock = threading.Lock()
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def _sample_lines(name: str, labelnames: Sequence[str], items) -> list:
+    return [f"{name}{_format_labels(labelnames, key)} {_format_number(value)}" for key, value in items]
+
+
+def _histogram_lines(name: str, labelnames: Sequence[str], buckets: Sequence[float], items) -> list:
+    """items: (key, (count per bucket non-kumulatif + overflow, sum, count))"""
+    lines = []
+    for key, (counts, total, count) in items:
+        cumulative = 0
+        for bound, bucket_count in zip(tuple(buckets) + (float("inf"),), counts):
+            cumulative += bucket_count
+            le = 'le="' + _format_number(float(bound)) + '"'
+            lines.append(f"{name}_bucket{_format_labels(labelnames, key, le)} {cumulative}")
+        labels = _format_labels(labelnames, key)
+        lines.append(f"{name}_sum{labels} {_format_number(total)}")
+        lines.append(f"{name}_count{labels} {count}")
+    return lines
+
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: dict = {}
+        with _registry_lock:
+            _registry.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} butuh label {self.labelnames}, dapat {tuple(labels)}")
+        return tuple(labels[name] for name in self.labelnames)
+
+    def items(self) -> list:
+        """(tuple nilai label, nilai) saat ini"""
+        with self._lock:
+            return list(self._values.items())
+
+    def collect(self) -> list:
+        """List baris sample (tanpa HELP/TYPE)"""
+        return _sample_lines(self.name, self.labelnames, self.items())
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self.collect())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 multiprocess_mode: str = "sum"):
+        super().__init__(name, documentation, labelnames)
+        self._function: Optional[Callable] = None
+        # Cara menggabungkan nilai antar worker gunicorn: sum / min / max
+        self.multiprocess_mode = multiprocess_mode
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, function: Callable):
+        """
+        Nilai dihitung saat scrape. `function()` return angka (gauge tanpa
+        label) atau dict {tuple nilai label: angka}.
+        """
+        self._function = function
+
+    def items(self) -> list:
+        if self._function is None:
+            return super().items()
+        try:
+            result = self._function()
+        except Exception:
+            return []
+        if not isinstance(result, dict):
+            result = {(): result}
+        return list(result.items())
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                # [count per bucket (non-kumulatif) + overflow, sum, count]
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def items(self) -> list:
+        with self._lock:
+            return [(key, (list(entry[0]), entry[1], entry[2])) for key, entry in self._values.items()]
+
+    def collect(self) -> list:
+        return _histogram_lines(self.name, self.labelnames, self.buckets, self.items())
+
+
+def render() -> str:
+    """Semua metric terdaftar dalam format teks Prometheus"""
+    if METRICS_MULTIPROC_DIR:
+        write_snapshot()
+        return render_multiprocess()
+    with _registry_lock:
+        metrics = list(_registry)
+    return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+# ==========================================================
+# 🧮 MULTIPROCESS (gunicorn)
+# ==========================================================
+METRICS_MULTIPROC_DIR = os.environ.get("METRICS_MULTIPROC_DIR")
+METRICS_FLUSH_INTERVAL = float(os.environ.get("METRICS_FLUSH_INTERVAL", "5"))
+DEAD_WORKERS_FILE = "metrics-dead.json"
+
+_writer_pid: Optional[int] = None
+_flush_hooks: list = []
+
+
+def snapshot() -> dict:
+    """Semua metric proses ini dalam bentuk JSON-able (nilai label jadi string)"""
+    with _registry_lock:
+        metrics = list(_registry)
+    result = {}
+    for metric in metrics:
+        result[metric.name] = {
+            "type": metric.type,
+            "help": metric.documentation,
+            "labelnames": list(metric.labelnames),
+            "mode": getattr(metric, "multiprocess_mode", "sum"),
+            "buckets": list(getattr(metric, "buckets", ())),
+            "values": [[[str(v) for v in key], value] for key, value in metric.items()],
+        }
+    return result
+
+
+def add_flush_hook(hook: Callable[[], None]):
+    """`hook` dipanggil setiap snapshot worker ditulis (hanya kalau METRICS_MULTIPROC_DIR di-set)"""
+    _flush_hooks.append(hook)
+
+
+def write_json(path: str, data: dict):
+    # tmp per pid: beberapa worker bisa menulis file yang sama
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def read_json(path: str) -> dict:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        # File worker yang baru saja dihapus / belum selesai ditulis
+        return {}
+
+
+def write_snapshot():
+    if METRICS_MULTIPROC_DIR:
+        write_json(os.path.join(METRICS_MULTIPROC_DIR, f"metrics-{os.getpid()}.json"), snapshot())
+        for hook in _flush_hooks:
+            hook()
+
+
+def _merge(target: dict, data: dict, drop_gauges: bool = False):
+    for name, metric in data.items():
+        if drop_gauges and metric["type"] == "gauge":
+            continue
+        entry = target.setdefault(name, {**metric, "values": {}})
+        values = entry["values"]
+        for key, value in metric["values"]:
+            key = tuple(key)
+            current = values.get(key)
+            if current is None:
+                values[key] = value
+            elif metric["type"] == "histogram":
+                values[key] = [[a + b for a, b in zip(current[0], value[0])],
+                               current[1] + value[1], current[2] + value[2]]
+            elif metric["type"] == "gauge" and metric["mode"] in ("min", "max"):
+                values[key] = (min if metric["mode"] == "min" else max)(current, value)
+            else:
+                values[key] = current + value
+
+
+def render_multiprocess(directory: Optional[str] = None) -> str:
+    """Gabungan snapshot semua worker (hidup + metrics-dead.json)"""
+    merged: dict = {}
+    for path in sorted(glob.glob(os.path.join(directory or METRICS_MULTIPROC_DIR, "metrics-*.json"))):
+        _merge(merged, read_json(path))
+    blocks = []
+    for name, metric in merged.items():
+        lines = [f"# HELP {name} {metric['help']}", f"# TYPE {name} {metric['type']}"]
+        items = sorted(metric["values"].items())
+        if metric["type"] == "histogram":
+            lines.extend(_histogram_lines(name, metric["labelnames"], metric["buckets"], items))
+        else:
+            lines.extend(_sample_lines(name, metric["labelnames"], items))
+        blocks.append("\n".join(lines))
+    return "\n".join(blocks) + "\n"
+
+
+def mark_process_dead(pid: int, directory: Optional[str] = None):
+    """
+    Dipanggil master gunicorn (child_exit): counter + histogram worker mati
+    digabung ke metrics-dead.json, gauge-nya dibuang.
+    """
+    directory = directory or METRICS_MULTIPROC_DIR
+    if not directory:
+        return
+    path = os.path.join(directory, f"metrics-{pid}.json")
+    data = read_json(path)
+    if data:
+        dead_path = os.path.join(directory, DEAD_WORKERS_FILE)
+        merged: dict = {}
+        _merge(merged, read_json(dead_path))
+        _merge(merged, data, drop_gauges=True)
+        write_json(dead_path, {
+            name: {**metric, "values": [[list(key), value] for key, value in metric["values"].items()]}
+            for name, metric in merged.items()
+        })
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def start_multiprocess_writer():
+    """Thread daemon per worker yang menulis snapshot tiap METRICS_FLUSH_INTERVAL detik"""
+    global _writer_pid
+    if not METRICS_MULTIPROC_DIR or _writer_pid == os.getpid():
+        return
+    _writer_pid = os.getpid()
+
+    def run():
+        while True:
+            try:
+                write_snapshot()
+            except OSError:
+                pass
+            time.sleep(METRICS_FLUSH_INTERVAL)
+
+    threading.Thread(target=run, name="metrics-writer", daemon=True).start()
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrape tiap beberapa detik, jangan sampai memenuhi log
+        pass
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """HTTP server stdlib di thread daemon yang hanya melayani GET /metrics"""
+    server = ThreadingHTTPServer((host, port), _MetricsRequestHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True)
+    thread.start()
+    return server
+
+
+# ==========================================================
+# 🌐 MIDDLEWARE HTTP (ASGI)
+# ==========================================================
+HTTP_REQUEST_SECONDS = Histogram(
+    "dramamu_http_request_duration_seconds",
+    "Latency request HTTP per route template, method, dan status",
+    ["route", "method", "status"],
+)
+HTTP_IN_FLIGHT = Gauge("dramamu_http_requests_in_flight", "Request HTTP yang sedang diproses")
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI murni (tanpa BaseHTTPMiddleware) supaya overhead kecil.
+    Label route diambil dari template path FastAPI (mis. /api/v1/pending/{token}),
+    path yang tidak cocok route manapun digabung jadi "unmatched".
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - started,
+                route=getattr(route, "path", "unmatched"),
+                method=scope.get("method", ""),
+                status=str(status),
+            )
@@ -0,0 +1,313 @@
+"""
+Profiling On-Demand Dramamu
+===========================
+Sampling profiler murni Python (sys._current_frames), dipakai dari API dan bot
+tanpa dependency tambahan. Hasil dalam format "folded stacks" yang bisa
+langsung dipakai flamegraph.pl / speedscope / inferno:
+
+    main.py:hold_movie_data;db.py:TimedCursor.execute;... 42
+
+Tiga cara pakai:
+    1. Per request API  : header X-Profile: 1 + X-Admin-Token (ADMIN_API_TOKEN).
+                          Response dapat header X-Profile-Id, hasilnya di
+                          GET /debug/profile/requests/{id}
+    2. Capture proses   : GET /debug/profile?seconds=10 (semua thread, folded)
+    3. Bot              : /profile [detik] dari ADMIN_ID → file .folded
+
+Per request yang di-sample hanya thread event loop: request lain yang jalan
+bersamaan di loop yang sama ikut terlihat, dan waktu menunggu network muncul
+sebagai frame selector (select/epoll).
+
+Tanpa ADMIN_API_TOKEN middleware tidak dipasang sama sekali, dan sampler
+hanya jalan selama ada capture → overhead nol saat tidak dipakai.
+
+Multi-worker (METRICS_MULTIPROC_DIR di-set, lihat gunicorn.conf.py): profile
+per request juga ditulis ke <dir>/profile-<id>.json, jadi X-Profile-Id bisa
+diambil dari worker mana pun. Capture proses (/debug/profile) tetap hanya
+worker yang menerima request; pid-nya ada di header X-Profile-Pid.
+
+Environment:
+    PROFILE_INTERVAL_MS      interval sampling (default 5)
+    PROFILE_MAX_SECONDS      batas durasi capture (default 60)
+    PROFILE_KEEP_REQUESTS    jumlah profile per request yang disimpan (default 20)
+"""
+
+import glob
+import hmac
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from metrics import METRICS_MULTIPROC_DIR, read_json, write_json
+
+PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", "5"))
+PROFILE_MAX_SECONDS = float(os.environ.get("PROFILE_MAX_SECONDS", "60"))
+PROFILE_KEEP_REQUESTS = int(os.environ.get("PROFILE_KEEP_REQUESTS", "20"))
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+
+# Batas kedalaman stack per sample (rekursi dalam tidak bikin sampler lambat)
+MAX_STACK_DEPTH = 128
+
+
+class ProfileBusyError(RuntimeError):
+    """Capture lain masih berjalan"""
+
+
+# ==========================================================
+# 🔬 SAMPLER
+# ==========================================================
+_frame_labels: Dict[object, str] = {}
+
+
+def frame_label(code) -> str:
+    """file.py:Class.func — di-cache per code object"""
+    label = _frame_labels.get(code)
+    if label is None:
+        name = getattr(code, "co_qualname", code.co_name)
+        # ';' adalah pemisah frame di format folded
+        label = f"{os.path.basename(code.co_filename)}:{name}".replace(";", ":")
+        _frame_labels[code] = label
+    return label
+
+
+def fold(frame, root: Optional[str] = None) -> str:
+    labels = []
+    while frame is not None and len(labels) < MAX_STACK_DEPTH:
+        labels.append(frame_label(frame.f_code))
+        frame = frame.f_back
+    if root:
+        labels.append(root)
+    labels.reverse()
+    return ";".join(labels)
+
+
+class StackSampler:
+    """
+    Thread daemon yang mengambil stack thread target setiap `interval` detik.
+    thread_ids=None → semua thread (kecuali sampler sendiri), tiap stack
+    diawali nama thread.
+    """
+
+    def __init__(self, interval: float = PROFILE_INTERVAL_MS / 1000, thread_ids: Optional[Iterable[int]] = None):
+        self.interval = interval
+        self.thread_ids = set(thread_ids) if thread_ids is not None else None
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started_at: Optional[float] = None
+        self.elapsed = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "StackSampler":
+        self.started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="dramamu-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.elapsed = time.perf_counter() - self.started_at if self.started_at else 0.0
+        return self.stacks
+
+    def _run(self):
+        me = threading.get_ident()
+        next_sample = time.perf_counter()
+        while True:
+            self._sample(me)
+            # Jadwal tetap; kalau sample telat, lanjut dari sekarang (tanpa burst)
+            next_sample = max(next_sample + self.interval, time.perf_counter())
+            if self._stop.wait(next_sample - time.perf_counter()):
+                return
+
+    def _sample(self, me: int):
+        frames = sys._current_frames()
+        names = None if self.thread_ids is not None else {t.ident: t.name for t in threading.enumerate()}
+        for thread_id, frame in frames.items():
+            if thread_id == me:
+                continue
+            if self.thread_ids is not None:
+                if thread_id in self.thread_ids:
+                    self.stacks[fold(frame)] += 1
+            else:
+                self.stacks[fold(frame, root=names.get(thread_id, f"thread-{thread_id}"))] += 1
+        del frames
+        self.samples += 1
+
+
+def render_folded(stacks: Counter) -> str:
+    """Format folded stacks (satu stack per baris + jumlah sample)"""
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+def top_frames(stacks: Counter, limit: int = 10) -> List[Tuple[str, int]]:
+    """Frame paling atas (self time) dengan sample terbanyak"""
+    leaves: Counter = Counter()
+    for stack, count in stacks.items():
+        leaves[stack.rsplit(";", 1)[-1]] += count
+    return leaves.most_common(limit)
+
+
+# ==========================================================
+# ⏱️ CAPTURE SELURUH PROSES
+# ==========================================================
+_capture_lock = threading.Lock()
+
+
+def capture(seconds: float, interval: float = PROFILE_INTERVAL_MS / 1000) -> StackSampler:
+    """
+    Sample semua thread selama `seconds` (blocking; panggil lewat
+    asyncio.to_thread dari kode async). Hanya satu capture sekaligus.
+    """
+    seconds = max(0.1, min(seconds, PROFILE_MAX_SECONDS))
+    if not _capture_lock.acquire(blocking=False):
+        raise ProfileBusyError("capture lain masih berjalan")
+    try:
+        sampler = StackSampler(interval).start()
+        time.sleep(seconds)
+        sampler.stop()
+        return sampler
+    finally:
+        _capture_lock.release()
+
+
+# ==========================================================
+# 🌐 PROFILE PER REQUEST (ASGI)
+# ==========================================================
+recent_profiles: deque = deque(maxlen=PROFILE_KEEP_REQUESTS)
+
+
+def _profile_path(profile_id: str) -> str:
+    return os.path.join(METRICS_MULTIPROC_DIR, f"profile-{profile_id}.json")
+
+
+def store_profile(profile: dict):
+    """Simpan di memori; multi-worker juga ke file bersama (hanya PROFILE_KEEP_REQUESTS terbaru)"""
+    recent_profiles.append(profile)
+    if not METRICS_MULTIPROC_DIR:
+        return
+    try:
+        write_json(_profile_path(profile["id"]), {**profile, "stacks": dict(profile["stacks"])})
+        paths = sorted(glob.glob(os.path.join(METRICS_MULTIPROC_DIR, "profile-*.json")), key=os.path.getmtime)
+        for path in paths[:-PROFILE_KEEP_REQUESTS]:
+            os.remove(path)
+    except OSError:
+        # Dihapus worker lain bersamaan; profile tetap ada di memori
+        pass
+
+
+def _load_profile(path: str) -> Optional[dict]:
+    data = read_json(path)
+    if not data:
+        return None
+    data["stacks"] = Counter(data["stacks"])
+    data["top"] = [tuple(item) for item in data["top"]]
+    return data
+
+
+def find_profile(profile_id: str) -> Optional[dict]:
+    for profile in recent_profiles:
+        if profile["id"] == profile_id:
+            return profile
+    if METRICS_MULTIPROC_DIR and profile_id.isalnum():
+        return _load_profile(_profile_path(profile_id))
+    return None
+
+
+def list_profiles() -> List[dict]:
+    """Profile terbaru dulu, dari semua worker kalau multi-worker"""
+    if not METRICS_MULTIPROC_DIR:
+        return list(reversed(recent_profiles))
+    profiles = [_load_profile(path) for path in glob.glob(os.path.join(METRICS_MULTIPROC_DIR, "profile-*.json"))]
+    return sorted((p for p in profiles if p), key=lambda p: p["started_at"], reverse=True)
+
+
+def profile_summary(profile: dict) -> dict:
+    return {k: v for k, v in profile.items() if k != "stacks"}
+
+
+class ProfilingMiddleware:
+    """
+    Request dengan header X-Profile: 1 dan token admin yang benar di-sample
+    (thread event loop) sampai header response dikirim. Request lain hanya
+    kena pengecekan header.
+    """
+
+    def __init__(self, app, admin_token: str, interval: float = PROFILE_INTERVAL_MS / 1000):
+        self.app = app
+        self.admin_token = admin_token.encode()
+        self.interval = interval
+        # Satu request di-profile sekaligus supaya hasil tidak saling campur
+        self._busy = threading.Lock()
+
+    def _authorized(self, headers: dict) -> bool:
+        supplied = headers.get(b"x-admin-token", b"")
+        auth = headers.get(b"authorization", b"")
+        if not supplied and auth.lower().startswith(b"bearer "):
+            supplied = auth[7:].strip()
+        return hmac.compare_digest(supplied, self.admin_token)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope.get("headers", []))
+        if headers.get(PROFILE_HEADER.lower().encode()) not in (b"1", b"true") or not self._authorized(headers):
+            await self.app(scope, receive, send)
+            return
+        if not self._busy.acquire(blocking=False):
+            await self.app(scope, receive, self._tag(send, b"busy"))
+            return
+
+        profile_id = uuid.uuid4().hex[:12]
+        started_at = datetime.now(timezone.utc).isoformat()
+        sampler = StackSampler(self.interval, thread_ids=[threading.get_ident()]).start()
+        stopped = False
+
+        def finish(status: int):
+            nonlocal stopped
+            if stopped:
+                return
+            stopped = True
+            sampler.stop()
+            self._busy.release()
+            store_profile({
+                "id": profile_id,
+                "pid": os.getpid(),
+                "method": scope.get("method", ""),
+                "path": scope.get("path", ""),
+                "status": status,
+                "started_at": started_at,
+                "duration_ms": round(sampler.elapsed * 1000, 2),
+                "samples": sampler.samples,
+                "top": top_frames(sampler.stacks),
+                "stacks": sampler.stacks,
+            })
+
+        tagged = self._tag(send, profile_id.encode())
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                finish(message["status"])
+            await tagged(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            finish(500)
+
+    @staticmethod
+    def _tag(send, value: bytes):
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(PROFILE_ID_HEADER.lower().encode(), value)]
+            await send(message)
+        return send_wrapper
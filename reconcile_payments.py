@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""
+Script Rekonsiliasi Payment Dramamu
+===================================
+Cocokkan payment yang masih `pending` (notifikasi Midtrans terlewat) dengan
+status transaksi asli di Midtrans, lalu update tabel payments secara batch.
+
+- Paging keyset berdasarkan (created_at, id), hanya payment yang lebih tua
+  dari --older-than menit
+- Query status ke Midtrans dengan concurrency terbatas + rate limit
+- Update per halaman dalam satu transaksi
+- Resumable: posisi terakhir disimpan di --state-file setelah tiap halaman
+
+Usage:
+    python reconcile_payments.py
+    python reconcile_payments.py --older-than 120 --concurrency 5 --rate 10
+    python reconcile_payments.py --dry-run
+
+Testing lokal dengan fake server:
+    python fake_midtrans.py --port 8900 &
+    MIDTRANS_API_BASE_URL=http://127.0.0.1:8900 python reconcile_payments.py
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import Optional
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+from snap_client import SnapClient, MidtransError, CircuitOpenError
+
+# Snap token Midtrans berlaku 24 jam; order yang tidak pernah dibayar
+# (status 404 di Midtrans) dianggap expired setelah lewat batas ini
+SNAP_TOKEN_TTL_SECONDS = int(os.environ.get("SNAP_TOKEN_TTL_SECONDS", str(24 * 3600)))
+
+DEFAULT_STATE_FILE = ".reconcile_state.json"
+
+
+def get_database_url():
+    """Get DATABASE_URL dari environment variable"""
+    db_url = os.getenv('DATABASE_URL')
+    if not db_url:
+        print("❌ ERROR: DATABASE_URL tidak ditemukan!")
+        print("   Set environment variable DATABASE_URL terlebih dahulu.")
+        sys.exit(1)
+    return db_url
+
+
+def build_snap_client(concurrency: int) -> SnapClient:
+    return SnapClient(
+        server_key=os.environ.get("MIDTRANS_SERVER_KEY", ""),
+        is_production=os.environ.get("MIDTRANS_IS_PRODUCTION", "false").lower() == "true",
+        core_base_url=os.environ.get("MIDTRANS_API_BASE_URL"),
+        timeout=float(os.environ.get("MIDTRANS_TIMEOUT", "10")),
+        max_concurrency=concurrency,
+        acquire_timeout=60.0,
+    )
+
+
+# ==========================================================
+# ⏱️ RATE LIMITER
+# ==========================================================
+class AsyncRateLimiter:
+    """Token bucket sederhana: maksimal `rate` request per detik"""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            delay = self.next_slot - now
+            self.next_slot = max(now, self.next_slot) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+# ==========================================================
+# 🔁 MAPPING STATUS MIDTRANS → STATUS PAYMENTS
+# ==========================================================
+def map_midtrans_status(response: Optional[dict], age_seconds: float) -> Optional[str]:
+    """
+    Return status baru untuk payments, atau None kalau tetap pending.
+    response None berarti transaksi tidak ditemukan di Midtrans (404).
+    """
+    if response is None:
+        return "expired" if age_seconds > SNAP_TOKEN_TTL_SECONDS else None
+
+    status = response.get("transaction_status")
+    if status == "settlement":
+        return "success"
+    if status == "capture":
+        return "success" if response.get("fraud_status", "accept") == "accept" else None
+    if status == "expire":
+        return "expired"
+    if status == "cancel":
+        return "cancelled"
+    if status in ("deny", "failure"):
+        return "failed"
+    if status in ("refund", "partial_refund"):
+        return "refunded"
+    return None
+
+
+# ==========================================================
+# 💾 STATE (RESUME)
+# ==========================================================
+def load_state(state_file: str) -> Optional[dict]:
+    if not os.path.exists(state_file):
+        return None
+    with open(state_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_state(state_file: str, state: dict):
+    tmp_file = f"{state_file}.tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(tmp_file, state_file)
+
+
+# ==========================================================
+# 🧾 REKONSILIASI
+# ==========================================================
+def fetch_page(conn, older_than_minutes: int, after: Optional[dict], batch_size: int) -> list:
+    cur = conn.cursor()
+    if after:
+        cur.execute(
+            """SELECT id, order_id, created_at, EXTRACT(EPOCH FROM NOW() - created_at)
+               FROM payments
+               WHERE status = 'pending'
+               AND created_at < NOW() - make_interval(mins => %s)
+               AND (created_at, id) > (%s::timestamptz, %s)
+               ORDER BY created_at, id
+               LIMIT %s;""",
+            (older_than_minutes, after["created_at"], after["id"], batch_size)
+        )
+    else:
+        cur.execute(
+            """SELECT id, order_id, created_at, EXTRACT(EPOCH FROM NOW() - created_at)
+               FROM payments
+               WHERE status = 'pending'
+               AND created_at < NOW() - make_interval(mins => %s)
+               ORDER BY created_at, id
+               LIMIT %s;""",
+            (older_than_minutes, batch_size)
+        )
+    rows = cur.fetchall()
+    conn.commit()
+    cur.close()
+    return rows
+
+
+def apply_updates(conn, updates: list):
+    """updates: list of (order_id, status, payment_type, transaction_id)"""
+    if not updates:
+        return
+    cur = conn.cursor()
+    try:
+        execute_values(
+            cur,
+            """UPDATE payments AS p
+               SET status = v.status,
+                   payment_method = COALESCE(v.payment_method, p.payment_method),
+                   midtrans_transaction_id = COALESCE(v.transaction_id, p.midtrans_transaction_id)
+               FROM (VALUES %s) AS v(order_id, status, payment_method, transaction_id)
+               WHERE p.order_id = v.order_id
+               AND p.status = 'pending';""",
+            updates,
+            template="(%s, %s, %s, %s)",
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+async def check_payment(client: SnapClient, limiter: AsyncRateLimiter, row, summary: dict):
+    payment_id, order_id, created_at, age_seconds = row
+    await limiter.wait()
+    try:
+        response = await client.get_transaction_status(order_id)
+    except CircuitOpenError:
+        raise
+    except MidtransError as e:
+        if e.status_code == 404:
+            response = None
+        else:
+            summary["errors"] += 1
+            print(f"   ⚠️  {order_id}: {e}")
+            return None
+
+    new_status = map_midtrans_status(response, float(age_seconds))
+    if new_status is None:
+        summary["still_pending"] += 1
+        return None
+
+    summary["updated"][new_status] = summary["updated"].get(new_status, 0) + 1
+    return (
+        order_id,
+        new_status,
+        response.get("payment_type") if response else None,
+        response.get("transaction_id") if response else None,
+    )
+
+
+async def reconcile_pending_payments(
+    db_url: str,
+    client: SnapClient,
+    older_than_minutes: int = 60,
+    batch_size: int = 200,
+    rate: float = 20.0,
+    state_file: Optional[str] = None,
+    dry_run: bool = False,
+    verbose: bool = True,
+) -> dict:
+    """
+    Jalankan rekonsiliasi sampai semua payment pending yang stale diperiksa.
+    Bisa dipanggil dari CLI maupun background task.
+    """
+    summary = {"scanned": 0, "still_pending": 0, "errors": 0, "updated": {}, "pages": 0}
+    limiter = AsyncRateLimiter(rate)
+    after = load_state(state_file) if state_file else None
+    if after and verbose:
+        print(f"↩️  Resume dari created_at={after['created_at']} id={after['id']}")
+
+    # Query DB dijalankan di thread supaya aman dipanggil dari event loop API
+    conn = await asyncio.to_thread(psycopg2.connect, db_url)
+    started = time.perf_counter()
+    try:
+        while True:
+            rows = await asyncio.to_thread(fetch_page, conn, older_than_minutes, after, batch_size)
+            if not rows:
+                break
+
+            results = await asyncio.gather(*(check_payment(client, limiter, row, summary) for row in rows))
+            updates = [r for r in results if r is not None]
+            if not dry_run:
+                await asyncio.to_thread(apply_updates, conn, updates)
+
+            summary["scanned"] += len(rows)
+            summary["pages"] += 1
+            last = rows[-1]
+            after = {"created_at": last[2].isoformat(), "id": last[0]}
+            if state_file:
+                save_state(state_file, after)
+
+            if verbose:
+                elapsed = time.perf_counter() - started
+                print(f"   📄 Halaman {summary['pages']}: {len(rows)} payment, {len(updates)} diupdate "
+                      f"({summary['scanned'] / elapsed:.0f} payment/s)")
+
+            if len(rows) < batch_size:
+                break
+    finally:
+        conn.close()
+
+    # Selesai penuh → run berikutnya mulai dari awal lagi
+    if state_file and os.path.exists(state_file):
+        os.remove(state_file)
+
+    summary["elapsed_seconds"] = round(time.perf_counter() - started, 2)
+    return summary
+
+
+def print_summary(summary: dict, dry_run: bool):
+    print()
+    print("=" * 60)
+    print("✅ REKONSILIASI SELESAI!" + (" (DRY RUN)" if dry_run else ""))
+    print("=" * 60)
+    print(f"🔍 Payment diperiksa: {summary['scanned']}")
+    print(f"⏳ Masih pending: {summary['still_pending']}")
+    for status, count in sorted(summary["updated"].items()):
+        print(f"✏️  → {status}: {count}")
+    print(f"⚠️  Error: {summary['errors']}")
+    print(f"⏱️  Durasi: {summary['elapsed_seconds']}s")
+    print()
+
+
+async def main(args):
+    db_url = get_database_url()
+    client = build_snap_client(args.concurrency)
+
+    if args.reset and os.path.exists(args.state_file):
+        os.remove(args.state_file)
+
+    print(f"🔄 Rekonsiliasi payment pending > {args.older_than} menit")
+    print(f"📍 Database: {db_url.split('@')[1] if '@' in db_url else 'local'}")
+    print(f"⚙️  Concurrency: {args.concurrency}, rate: {args.rate}/s, batch: {args.batch_size}")
+    print()
+
+    try:
+        summary = await reconcile_pending_payments(
+            db_url,
+            client,
+            older_than_minutes=args.older_than,
+            batch_size=args.batch_size,
+            rate=args.rate,
+            state_file=args.state_file,
+            dry_run=args.dry_run,
+        )
+    except CircuitOpenError:
+        print("\n❌ ERROR: Midtrans tidak merespon (circuit breaker open).")
+        print(f"   Jalankan ulang nanti, proses akan lanjut dari {args.state_file}")
+        sys.exit(1)
+    finally:
+        await client.aclose()
+
+    print_summary(summary, args.dry_run)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rekonsiliasi payment pending dengan Midtrans")
+    parser.add_argument("--older-than", type=int, default=60, help="Umur minimal payment (menit)")
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=10, help="Maksimal request Midtrans bersamaan")
+    parser.add_argument("--rate", type=float, default=20.0, help="Maksimal request Midtrans per detik")
+    parser.add_argument("--state-file", default=DEFAULT_STATE_FILE)
+    parser.add_argument("--reset", action="store_true", help="Abaikan state lama, mulai dari awal")
+    parser.add_argument("--dry-run", action="store_true", help="Cek saja, jangan update database")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(main(args))
+    except KeyboardInterrupt:
+        print(f"\n⏸️  Dihentikan. Jalankan ulang untuk lanjut dari {args.state_file}")
+        sys.exit(130)
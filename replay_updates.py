@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Replay Update Sintetis ke Fake Telegram
+=======================================
+Kirim stream update (/start, /start <token>, web_app_data, teks biasa) ke
+fake_telegram.py dengan rate tetap (open loop), tunggu bot selesai
+membalas, lalu laporkan throughput dan latency update → balasan bot.
+
+Selesai = semua update sudah dikonfirmasi bot (offset getUpdates / webhook
+selesai) dan bot tidak memanggil Bot API selama --drain-idle detik; jumlah
+update yang belum dibalas saja tidak cukup karena satu update bisa
+dijawab beberapa pesan.
+
+Token untuk /start <token> dan web_app_data bisa diambil dari
+intermediary_queue (--tokens-from-db) supaya alur release → kirim film
+benar-benar jalan; tanpa itu token acak (jalur token tidak valid).
+
+Usage:
+    python replay_updates.py --rate 50 --count 1000
+    python replay_updates.py --mix webapp=3,start_token=1 --tokens-from-db --json replay.json
+
+Environment:
+    DATABASE_URL   dipakai untuk --tokens-from-db
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+import httpx
+import psycopg2
+
+DEFAULT_MIX = "start=1,start_token=2,webapp=4,text=1"
+DEFAULT_FAKE_URL = "http://127.0.0.1:8901"
+
+
+def parse_mix(spec):
+    mix = {}
+    for part in spec.split(","):
+        if not part.strip():
+            continue
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in UPDATE_KINDS:
+            raise argparse.ArgumentTypeError(f"jenis update tidak dikenal: {name} (pilihan: {', '.join(UPDATE_KINDS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def base_message(user_id, message_id):
+    return {
+        "message_id": message_id,
+        "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private", "first_name": "Replay"},
+        "from": {"id": user_id, "is_bot": False, "first_name": "Replay", "language_code": "id"},
+    }
+
+
+def command(user_id, message_id, text):
+    message = base_message(user_id, message_id)
+    message["text"] = text
+    message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return {"message": message}
+
+
+def make_start(user_id, message_id, token):
+    return command(user_id, message_id, "/start")
+
+
+def make_start_token(user_id, message_id, token):
+    return command(user_id, message_id, f"/start {token}")
+
+
+def make_webapp(user_id, message_id, token):
+    message = base_message(user_id, message_id)
+    message["web_app_data"] = {"data": token, "button_text": "🎬 Pilih Film"}
+    return {"message": message}
+
+
+def make_text(user_id, message_id, token):
+    message = base_message(user_id, message_id)
+    message["text"] = random.choice(["halo", "ada film baru?", "cara jadi VIP gimana?"])
+    return {"message": message}
+
+
+UPDATE_KINDS = {
+    "start": make_start,
+    "start_token": make_start_token,
+    "webapp": make_webapp,
+    "text": make_text,
+}
+
+
+def load_tokens(limit):
+    """(telegram_id, token) yang masih waiting_start di intermediary_queue"""
+    db_url = os.getenv('DATABASE_URL')
+    if not db_url:
+        print("❌ ERROR: DATABASE_URL tidak ditemukan (dibutuhkan --tokens-from-db)!")
+        sys.exit(1)
+    conn = psycopg2.connect(db_url)
+    cursor = conn.cursor()
+    cursor.execute(
+        """SELECT telegram_id, start_token FROM intermediary_queue
+           WHERE status = 'waiting_start' AND expires_at > NOW()
+           ORDER BY created_at LIMIT %s""",
+        (limit,)
+    )
+    rows = cursor.fetchall()
+    cursor.close()
+    conn.close()
+    return rows
+
+
+async def replay(fake_url, mix, rate, count, users, tokens, batch, drain_timeout, drain_idle):
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    rng = random.Random(42)
+    sent = {name: 0 for name in names}
+
+    async with httpx.AsyncClient(base_url=fake_url, timeout=10.0) as client:
+        await client.post("/_reset")
+        started = time.monotonic()
+        injected = 0
+        while injected < count:
+            updates = []
+            for _ in range(min(batch, count - injected)):
+                name = rng.choices(names, weights)[0]
+                if name in ("start_token", "webapp") and tokens:
+                    user_id, token = tokens.pop()
+                else:
+                    user_id, token = rng.choice(users), f"replay{rng.getrandbits(64):016x}"
+                updates.append(UPDATE_KINDS[name](user_id, injected + len(updates) + 1, token))
+                sent[name] += 1
+            await client.post("/_inject", json=updates)
+            injected += len(updates)
+            # Open loop: jadwal kirim tetap walaupun bot lambat
+            delay = started + injected / rate - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        inject_seconds = time.monotonic() - started
+
+        # Tunggu bot konfirmasi semua update lalu diam (tidak ada call Bot API)
+        deadline = time.monotonic() + drain_timeout
+        while True:
+            stats = (await client.get("/_stats")).json()
+            unconfirmed = stats["updates"]["queued"] + stats["updates"]["webhook_in_flight"]
+            if unconfirmed == 0 and stats["idle_seconds"] >= drain_idle:
+                break
+            if time.monotonic() >= deadline:
+                break
+            await asyncio.sleep(min(0.5, drain_idle / 2))
+        # Waktu selesai = call terakhir bot, bukan akhir masa idle
+        total_seconds = max(time.monotonic() - stats["idle_seconds"] - started, inject_seconds)
+
+    return {
+        "sent": sent,
+        "injected": injected,
+        "inject_seconds": round(inject_seconds, 3),
+        "total_seconds": round(total_seconds, 3),
+        "processed_per_s": round(stats["updates"]["replied"] / total_seconds, 1) if total_seconds else 0.0,
+        "unanswered": stats["updates"]["awaiting_reply"],
+        "still_queued": stats["updates"]["queued"],
+        "fake_telegram": stats,
+    }
+
+
+def print_result(result, rate):
+    stats = result["fake_telegram"]
+    latency = stats["reply_latency_ms"]
+    fmt = lambda v: f"{v:.1f}ms" if v is not None else "-"
+    print()
+    print("=" * 60)
+    print(f"📊 REPLAY {result['injected']} update @ {rate}/s")
+    print("=" * 60)
+    print(f"📨 Dikirim: {', '.join(f'{k}={v}' for k, v in result['sent'].items())}")
+    print(f"⏱️  Selesai dalam {result['total_seconds']}s, {result['processed_per_s']} update dibalas/s")
+    print(f"💬 Dibalas: {stats['updates']['replied']}, belum dibalas: {result['unanswered']}, "
+          f"masih antri: {result['still_queued']}")
+    print(f"📈 Latency update → balasan: p50 {fmt(latency['p50'])}, p95 {fmt(latency['p95'])}, "
+          f"p99 {fmt(latency['p99'])}, max {fmt(latency['max'])}")
+    for key, value in sorted(stats["calls"].items()):
+        print(f"   {key:<24}{value:>7}")
+    print()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay update sintetis ke fake_telegram.py")
+    parser.add_argument("--fake-url", default=os.getenv("TELEGRAM_API_BASE_URL", DEFAULT_FAKE_URL))
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f"Bobot jenis update (default {DEFAULT_MIX})")
+    parser.add_argument("--rate", type=float, default=20.0, help="Update per detik")
+    parser.add_argument("--count", type=int, default=200, help="Jumlah update")
+    parser.add_argument("--users", type=int, default=100, help="Jumlah user sintetis (tanpa --tokens-from-db)")
+    parser.add_argument("--tokens-from-db", action="store_true",
+                        help="Pakai token waiting_start dari intermediary_queue")
+    parser.add_argument("--batch", type=int, default=10, help="Update per request /_inject")
+    parser.add_argument("--drain-timeout", type=float, default=30.0, help="Detik menunggu bot selesai membalas")
+    parser.add_argument("--drain-idle", type=float, default=2.0,
+                        help="Bot dianggap selesai kalau tidak memanggil Bot API selama N detik")
+    parser.add_argument("--json", dest="json_out", help="Tulis hasil ke file JSON")
+    args = parser.parse_args()
+
+    users = [200000 + i for i in range(args.users)]
+    tokens = load_tokens(args.count) if args.tokens_from_db else []
+    if tokens:
+        print(f"🎟️  {len(tokens)} token waiting_start dari database")
+
+    print(f"🚀 Replay {args.count} update ke {args.fake_url} @ {args.rate}/s...")
+    result = asyncio.run(replay(args.fake_url, args.mix, args.rate, args.count, users, tokens,
+                                args.batch, args.drain_timeout, args.drain_idle))
+    print_result(result, args.rate)
+    if args.json_out:
+        with open(args.json_out, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+        print(f"💾 Hasil disimpan: {args.json_out}")
@@ -0,0 +1,271 @@
+"""
+Async Midtrans Snap Client Dramamu
+==================================
+Pengganti `midtransclient.Snap` yang synchronous. Semua call ke Midtrans
+jalan lewat satu `httpx.AsyncClient` (connection pooling + keep-alive),
+dengan timeout ketat, batas concurrency, dan circuit breaker supaya
+event loop tidak ikut macet waktu Midtrans lambat/down.
+
+Contoh:
+    client = SnapClient(server_key="SB-Mid-server-xxx")
+    response = await client.create_transaction(transaction_data)
+    token = response["token"]
+"""
+
+import asyncio
+import logging
+import time
+from typing import Callable, Optional
+
+import httpx
+
+logger = logging.getLogger("dramamu-snap")
+
+SNAP_SANDBOX_BASE_URL = "https://app.sandbox.midtrans.com/snap/v1"
+SNAP_PRODUCTION_BASE_URL = "https://app.midtrans.com/snap/v1"
+CORE_SANDBOX_BASE_URL = "https://api.sandbox.midtrans.com"
+CORE_PRODUCTION_BASE_URL = "https://api.midtrans.com"
+
+
+class MidtransError(Exception):
+    """Error dari Midtrans API (HTTP >= 400 atau status_code di body >= 400)"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None, response: Optional[dict] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.response = response or {}
+
+
+class CircuitOpenError(MidtransError):
+    """Circuit breaker lagi open, request langsung ditolak tanpa call upstream"""
+
+
+class SnapSaturatedError(MidtransError):
+    """Slot concurrency penuh terlalu lama, request ditolak"""
+
+
+# ==========================================================
+# ⚡ CIRCUIT BREAKER
+# ==========================================================
+class CircuitBreaker:
+    """
+    Circuit breaker sederhana:
+    - closed: semua request lewat, gagal beruntun dihitung
+    - open: setelah `failure_threshold` gagal beruntun, tolak semua request
+      selama `reset_timeout` detik
+    - half_open: setelah reset_timeout, izinkan satu request percobaan;
+      sukses → closed, gagal → open lagi
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.consecutive_failures < self.failure_threshold:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow_request(self) -> bool:
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def cancel_trial(self):
+        """Request percobaan batal sebelum sampai ke upstream"""
+        self._trial_in_flight = False
+
+    def record_success(self):
+        self.consecutive_failures = 0
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self._trial_in_flight = False
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= self.failure_threshold:
+            if self.opened_at == 0.0 or time.monotonic() - self.opened_at >= self.reset_timeout:
+                logger.warning(f"Circuit breaker Midtrans OPEN setelah {self.consecutive_failures} kegagalan beruntun")
+            self.opened_at = time.monotonic()
+
+
+# ==========================================================
+# 💳 SNAP CLIENT
+# ==========================================================
+class SnapClient:
+    def __init__(
+        self,
+        server_key: str,
+        is_production: bool = False,
+        snap_base_url: Optional[str] = None,
+        core_base_url: Optional[str] = None,
+        timeout: float = 10.0,
+        connect_timeout: float = 3.0,
+        max_concurrency: int = 20,
+        acquire_timeout: float = 2.0,
+        breaker: Optional[CircuitBreaker] = None,
+        observer: Optional[Callable[[str, str, float], None]] = None,
+    ):
+        self.server_key = server_key or ""
+        self.snap_base_url = (snap_base_url or (SNAP_PRODUCTION_BASE_URL if is_production else SNAP_SANDBOX_BASE_URL)).rstrip("/")
+        self.core_base_url = (core_base_url or (CORE_PRODUCTION_BASE_URL if is_production else CORE_SANDBOX_BASE_URL)).rstrip("/")
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.max_concurrency = max_concurrency
+        self.acquire_timeout = acquire_timeout
+        self.breaker = breaker or CircuitBreaker()
+        # Callback (operation, outcome, detik) per call, mis. untuk metric Prometheus
+        self.observer = observer
+
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        # (operation, outcome) -> {"count", "total_seconds", "max_seconds"}
+        self._stats: dict = {}
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # Dibuat lazy supaya terikat ke event loop yang sedang jalan
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                auth=(self.server_key, ""),
+                headers={"Accept": "application/json", "Content-Type": "application/json"},
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency,
+                    max_keepalive_connections=self.max_concurrency,
+                ),
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+    # --- API ---
+    async def create_transaction(self, parameters: dict) -> dict:
+        """Buat transaksi Snap, return dict berisi `token` dan `redirect_url`"""
+        return await self._request("create_transaction", "POST", f"{self.snap_base_url}/transactions", parameters)
+
+    async def get_transaction_status(self, order_id: str) -> dict:
+        """Cek status transaksi via Core API (/v2/{order_id}/status)"""
+        return await self._request("transaction_status", "GET", f"{self.core_base_url}/v2/{order_id}/status")
+
+    # --- INTERNAL ---
+    async def _request(self, operation: str, method: str, url: str, payload: Optional[dict] = None) -> dict:
+        if not self.breaker.allow_request():
+            self._record(operation, "circuit_open", 0.0)
+            raise CircuitOpenError("Midtrans circuit breaker open, request ditolak")
+
+        client = self._get_client()
+        semaphore = self._semaphore
+        assert semaphore is not None
+
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout=self.acquire_timeout)
+        except asyncio.TimeoutError:
+            # Slot belum dipakai, jangan hitung sebagai kegagalan upstream
+            self.breaker.cancel_trial()
+            self._record(operation, "saturated", time.perf_counter() - started)
+            raise SnapSaturatedError("Terlalu banyak request Midtrans bersamaan")
+
+        outcome = "cancelled"
+        try:
+            try:
+                response = await client.request(method, url, json=payload)
+            except httpx.TimeoutException as e:
+                outcome = "timeout"
+                self.breaker.record_failure()
+                raise MidtransError(f"Timeout ke Midtrans: {e!r}") from e
+            except httpx.HTTPError as e:
+                outcome = "network_error"
+                self.breaker.record_failure()
+                raise MidtransError(f"Network error ke Midtrans: {e!r}") from e
+
+            if response.status_code >= 500:
+                outcome = "server_error"
+                self.breaker.record_failure()
+                raise MidtransError(
+                    f"Midtrans HTTP {response.status_code}: {response.text[:200]}",
+                    status_code=response.status_code,
+                )
+
+            # Upstream sehat walaupun responsenya 4xx
+            self.breaker.record_success()
+
+            try:
+                body = response.json()
+            except ValueError:
+                outcome = "invalid_response"
+                raise MidtransError(
+                    f"Response Midtrans bukan JSON: {response.text[:200]}",
+                    status_code=response.status_code,
+                )
+
+            body_status = _int_or_none(body.get("status_code")) if isinstance(body, dict) else None
+            if response.status_code >= 400 or (body_status is not None and body_status >= 400 and body_status != 407):
+                outcome = "client_error"
+                raise MidtransError(
+                    f"Midtrans API error {body_status or response.status_code}: {response.text[:200]}",
+                    status_code=body_status or response.status_code,
+                    response=body,
+                )
+
+            outcome = "success"
+            return body
+        finally:
+            if outcome == "cancelled":
+                self.breaker.cancel_trial()
+            semaphore.release()
+            elapsed = time.perf_counter() - started
+            self._record(operation, outcome, elapsed)
+            if outcome == "client_error":
+                logger.info(f"Midtrans {operation} {outcome} ({elapsed * 1000:.0f} ms)")
+            elif outcome != "success":
+                logger.warning(f"Midtrans {operation} {outcome} ({elapsed * 1000:.0f} ms)")
+
+    def _record(self, operation: str, outcome: str, elapsed: float):
+        entry = self._stats.setdefault((operation, outcome), {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+        entry["count"] += 1
+        entry["total_seconds"] += elapsed
+        entry["max_seconds"] = max(entry["max_seconds"], elapsed)
+        if self.observer is not None:
+            try:
+                self.observer(operation, outcome, elapsed)
+            except Exception as e:
+                logger.debug(f"Observer Midtrans error: {e}")
+
+    def stats(self) -> dict:
+        """Ringkasan latency & outcome per operasi (untuk health/monitoring)"""
+        outcomes = {}
+        for (operation, outcome), entry in self._stats.items():
+            outcomes.setdefault(operation, {})[outcome] = {
+                "count": entry["count"],
+                "avg_ms": round(entry["total_seconds"] / entry["count"] * 1000, 1) if entry["count"] else 0,
+                "max_ms": round(entry["max_seconds"] * 1000, 1),
+            }
+        return {
+            "circuit": self.breaker.state,
+            "consecutive_failures": self.breaker.consecutive_failures,
+            "operations": outcomes,
+        }
+
+
+def _int_or_none(value) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
@@ -9,22 +9,36 @@ echo "✅ Current directory: $(pwd)"
 echo "📝 Files in directory:"
 ls -la
 
-echo "🤖 Starting Telegram Bot in background..."
-python bot.py &
-BOT_PID=$!
-echo "   Bot PID: $BOT_PID"
-
-# Wait a moment for bot to initialize
-sleep 2
-
 echo "🔥 Starting FastAPI Backend..."
 # Backend API runs on port from environment (Railway/Render) or defaults to 8000
 BACKEND_PORT=${PORT:-8000}
 echo "   Listening on port: $BACKEND_PORT"
-uvicorn main:app --host 0.0.0.0 --port $BACKEND_PORT &
+# WEB_CONCURRENCY > 1 → gunicorn multi-worker (lihat gunicorn.conf.py)
+if [ "${WEB_CONCURRENCY:-1}" -gt 1 ]; then
+    # Rate limit harus pakai storage bersama (redis://), memory:// per worker
+    case "${RATE_LIMIT_STORAGE_URI:-memory://}" in
+        memory://*)
+            if [ "${RATE_LIMIT_ENABLED:-true}" = "true" ]; then
+                echo "❌ WEB_CONCURRENCY=$WEB_CONCURRENCY butuh RATE_LIMIT_STORAGE_URI bersama (mis. redis://host:6379/0)"
+                exit 1
+            fi
+            ;;
+    esac
+    echo "   Workers: $WEB_CONCURRENCY (gunicorn)"
+    PORT=$BACKEND_PORT gunicorn main:app -c gunicorn.conf.py &
+else
+    uvicorn main:app --host 0.0.0.0 --port $BACKEND_PORT &
+fi
 API_PID=$!
 echo "   API PID: $API_PID"
 
+# Tanpa sleep: bot langsung init, lalu menunggu /readyz API lokal
+# (handshake di post_init bot.py) sebelum mulai polling
+echo "🤖 Starting Telegram Bot in background..."
+BACKEND_READY_URL=${BACKEND_READY_URL:-http://127.0.0.1:$BACKEND_PORT/readyz} python bot.py &
+BOT_PID=$!
+echo "   Bot PID: $BOT_PID"
+
 echo ""
 echo "✅ Both services started successfully!"
 echo "🤖 Telegram Bot: Running (PID: $BOT_PID)"
@@ -32,10 +46,10 @@ echo "🔥 FastAPI Backend: http://0.0.0.0:$BACKEND_PORT (PID: $API_PID)"
 echo ""
 if [ -n "$RAILWAY_PUBLIC_DOMAIN" ]; then
     echo "💡 Backend URL: https://$RAILWAY_PUBLIC_DOMAIN"
-    echo "🧪 Health check: https://$RAILWAY_PUBLIC_DOMAIN/health"
+    echo "🧪 Health check: https://$RAILWAY_PUBLIC_DOMAIN/readyz (liveness: /livez)"
 else
     echo "💡 Backend running on port: $BACKEND_PORT"
-    echo "🧪 Health check: http://localhost:$BACKEND_PORT/health"
+    echo "🧪 Health check: http://localhost:$BACKEND_PORT/readyz (liveness: /livez)"
 fi
 echo ""
 echo "Waiting for processes..."
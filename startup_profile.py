@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Profil Cold Start Dramamu
+=========================
+Ukur berapa lama proses API / bot siap setelah deploy atau autoscale:
+
+1. Import time per modul (python -X importtime, di subprocess bersih):
+   total, import langsung paling mahal (kumulatif), dan modul dengan
+   self time terbesar.
+2. --serve: jalankan uvicorn main:app lalu ukur waktu sampai /livez dan
+   /readyz menjawab 200 (termasuk warm-up pool di lifespan).
+
+Usage:
+    python startup_profile.py                       # import main + bot
+    python startup_profile.py --modules main --top 20
+    python startup_profile.py --serve --json startup.json
+"""
+
+import argparse
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def profile_import(module, repeat):
+    """Import `module` di subprocess bersih `repeat` kali; ambil run dengan total median"""
+    runs = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=BASE_DIR, capture_output=True, text=True,
+            # Import bot/main tidak boleh konek ke apa pun
+            env={**os.environ, "LOG_LEVEL": "WARNING"},
+        )
+        wall = time.perf_counter() - started
+        if result.returncode != 0:
+            raise RuntimeError(f"import {module} gagal:\n{result.stderr[-2000:]}")
+
+        entries = []
+        for line in result.stderr.splitlines():
+            match = IMPORTTIME_LINE.match(line)
+            if match:
+                self_us, cumulative_us, indent, name = match.groups()
+                entries.append({
+                    "module": name,
+                    "depth": (len(indent) - 1) // 2,
+                    "self_ms": int(self_us) / 1000,
+                    "cumulative_ms": int(cumulative_us) / 1000,
+                })
+        root = next((e for e in reversed(entries) if e["module"] == module and e["depth"] == 0), None)
+        runs.append({"wall_ms": wall * 1000, "import_ms": root["cumulative_ms"] if root else 0.0,
+                     "entries": entries})
+
+    runs.sort(key=lambda r: r["import_ms"])
+    median = runs[len(runs) // 2]
+    # Import langsung dari modul target = baris depth 1 tepat sebelum baris root
+    direct, collecting = [], False
+    for entry in reversed(median["entries"]):
+        if entry["module"] == module and entry["depth"] == 0:
+            collecting = True
+            continue
+        if collecting:
+            if entry["depth"] == 0:
+                break
+            if entry["depth"] == 1:
+                direct.append(entry)
+    return {
+        "module": module,
+        "runs": repeat,
+        "import_ms": round(median["import_ms"], 1),
+        "import_ms_all": [round(r["import_ms"], 1) for r in runs],
+        "process_wall_ms": round(median["wall_ms"], 1),
+        "direct_imports": sorted(direct, key=lambda e: e["cumulative_ms"], reverse=True),
+        "self_time": sorted(median["entries"], key=lambda e: e["self_ms"], reverse=True),
+    }
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def profile_serve(timeout):
+    """Waktu dari spawn uvicorn sampai /livez dan /readyz 200"""
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=BASE_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        env={**os.environ, "LOG_LEVEL": "WARNING"},
+    )
+    result = {"livez_ms": None, "readyz_ms": None, "readyz_status": None}
+    try:
+        deadline = started + timeout
+        while time.perf_counter() < deadline and result["readyz_ms"] is None:
+            if process.poll() is not None:
+                raise RuntimeError(f"uvicorn keluar dengan kode {process.returncode}")
+            try:
+                if result["livez_ms"] is None and httpx.get(f"{url}/livez", timeout=1.0).status_code == 200:
+                    result["livez_ms"] = round((time.perf_counter() - started) * 1000, 1)
+                if result["livez_ms"] is not None:
+                    response = httpx.get(f"{url}/readyz", timeout=1.0)
+                    result["readyz_status"] = response.json().get("status")
+                    if response.status_code == 200:
+                        result["readyz_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.02)
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+    return result
+
+
+def print_import(report, top):
+    print("=" * 60)
+    print(f"📦 import {report['module']}: {report['import_ms']:.1f}ms "
+          f"(median {report['runs']} run, proses total {report['process_wall_ms']:.1f}ms)")
+    print("=" * 60)
+    print("Import langsung (kumulatif):")
+    for entry in report["direct_imports"][:top]:
+        print(f"   {entry['cumulative_ms']:>9.1f}ms  {entry['module']}")
+    print("Self time terbesar:")
+    for entry in report["self_time"][:top]:
+        print(f"   {entry['self_ms']:>9.1f}ms  {entry['module']}")
+    print()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Profil import time dan waktu siap API / bot")
+    parser.add_argument("--modules", nargs="+", default=["main", "bot"], help="Modul yang diukur (default main bot)")
+    parser.add_argument("--repeat", type=int, default=3, help="Jumlah run per modul (diambil median)")
+    parser.add_argument("--top", type=int, default=10, help="Jumlah baris per daftar")
+    parser.add_argument("--serve", action="store_true", help="Ukur juga waktu uvicorn sampai /livez & /readyz 200")
+    parser.add_argument("--serve-timeout", type=float, default=60.0)
+    parser.add_argument("--json", dest="json_out", help="Tulis hasil ke file JSON")
+    args = parser.parse_args()
+
+    result = {"python": sys.version.split()[0], "imports": []}
+    for module in args.modules:
+        report = profile_import(module, max(1, args.repeat))
+        print_import(report, args.top)
+        result["imports"].append(report)
+
+    if args.serve:
+        print("🚀 Mengukur waktu siap uvicorn main:app...")
+        result["serve"] = profile_serve(args.serve_timeout)
+        serve = result["serve"]
+        fmt = lambda v: f"{v:.1f}ms" if v is not None else "-"
+        print(f"   /livez 200  : {fmt(serve['livez_ms'])}")
+        print(f"   /readyz 200 : {fmt(serve['readyz_ms'])} (status terakhir: {serve['readyz_status']})")
+        print()
+
+    if args.json_out:
+        with open(args.json_out, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+        print(f"💾 Hasil disimpan: {args.json_out}")
@@ -0,0 +1,96 @@
+"""
+Klaim payment (create_snap_payment) harus dilepas di semua jalur keluar
+tanpa token tersimpan, supaya retry dengan Idempotency-Key yang sama jalan.
+Database diganti dict in-memory; Midtrans diganti client palsu.
+"""
+
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import main
+
+
+class FakePayments:
+    """Tabel payments minimal: order_id → (idempotency_key, snap_token)"""
+
+    def __init__(self):
+        self.rows = {}
+
+    def claim(self, payment_data, order_id, idempotency_key):
+        for key, token in self.rows.values():
+            if key == idempotency_key:
+                if token is None:
+                    raise main.PaymentConflict(409, "Payment dengan Idempotency-Key ini sedang diproses, coba lagi")
+                return {"order_id": order_id, "snap_token": token}
+        self.rows[order_id] = (idempotency_key, None)
+        return None
+
+    def update(self, order_id, snap_token):
+        if snap_token:
+            key, _ = self.rows[order_id]
+            self.rows[order_id] = (key, snap_token)
+        elif self.rows.get(order_id, (None, None))[1] is None:
+            self.rows.pop(order_id, None)
+        return True
+
+
+class FakeMidtrans:
+    def __init__(self, block: bool):
+        self.block = block
+        self.entered = asyncio.Event()
+
+    async def create_transaction(self, transaction_data):
+        self.entered.set()
+        if self.block:
+            await asyncio.Event().wait()
+        return {"token": f"snap-{transaction_data['transaction_details']['order_id']}"}
+
+
+@pytest.fixture
+def payments(monkeypatch):
+    table = FakePayments()
+    monkeypatch.setattr(main, "find_reusable_payment", lambda *args: None)
+    monkeypatch.setattr(main, "claim_payment", table.claim)
+    monkeypatch.setattr(main, "update_payment_row", table.update)
+    return table
+
+
+def payment_request():
+    return main.PaymentRequest(telegram_id=777, paket_id=1, nama_paket="VIP 1 Bulan", gross_amount=15000)
+
+
+def test_cancelled_request_releases_claim(payments, monkeypatch):
+    async def scenario():
+        midtrans = FakeMidtrans(block=True)
+        monkeypatch.setattr(main, "get_midtrans_client", lambda: midtrans)
+        task = asyncio.create_task(main.create_snap_payment(payment_request(), "key-1"))
+        await midtrans.entered.wait()
+        assert len(payments.rows) == 1
+
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert payments.rows == {}
+
+        # Retry dengan key yang sama dapat token baru, bukan 409
+        monkeypatch.setattr(main, "get_midtrans_client", lambda: FakeMidtrans(block=False))
+        return await main.create_snap_payment(payment_request(), "key-1")
+
+    result = asyncio.run(scenario())
+    assert result["snap_token"].startswith("snap-")
+    assert result["reused"] is False
+    assert payments.rows[result["order_id"]] == ("key-1", result["snap_token"])
+
+
+def test_failed_token_store_releases_claim(payments, monkeypatch):
+    monkeypatch.setattr(main, "get_midtrans_client", lambda: FakeMidtrans(block=False))
+    original_update = payments.update
+    monkeypatch.setattr(main, "update_payment_row",
+                        lambda order_id, token: False if token else original_update(order_id, token))
+
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(main.create_snap_payment(payment_request(), "key-2"))
+    assert exc.value.status_code == 503
+    assert payments.rows == {}
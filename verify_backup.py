@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Script Verifikasi Backup Dramamu
+================================
+Round-trip export_database.py → import_database.py ke Postgres scratch,
+lalu bandingkan database sumber dengan hasil restore:
+- jumlah baris per tabel
+- hash isi per kolom (urut id); kolom yang beda dilaporkan + contoh id
+- throughput export dan restore (rows/s, MB/s) untuk benchmark format
+
+Perbandingan sumber dan export memakai snapshot yang sama, jadi hasilnya
+tetap valid walaupun database sumber sedang dipakai.
+
+Usage:
+    python verify_backup.py
+    python verify_backup.py --format csv --jobs 4 --compress zstd
+    python verify_backup.py --format binary --json hasil.json --keep
+
+Environment:
+    DATABASE_URL          database sumber
+    VERIFY_DATABASE_URL   database scratch (default postgresql://localhost/dramamu_verify)
+                          ⚠️  DI-DROP dan dibuat ulang setiap run!
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+
+import psycopg2
+from psycopg2 import sql
+from psycopg2.extensions import make_dsn, parse_dsn
+
+from backup_io import COMPRESSIONS, sidecar_manifest_path
+from export_database import (
+    COPY_FORMATS, MANIFEST_FILE, TABLES, export_database, export_database_copy,
+    export_snapshot, get_database_url, get_table_columns, open_snapshot_connection,
+)
+from import_database import import_database
+
+DEFAULT_SCRATCH_URL = 'postgresql://localhost/dramamu_verify'
+
+# Contoh id yang ditampilkan per kolom yang beda
+SAMPLE_LIMIT = 5
+
+
+def prepare_session(conn):
+    """Samakan representasi teks (timezone, format tanggal, float) di kedua sisi"""
+    cursor = conn.cursor()
+    cursor.execute("SET TimeZone = 'UTC'")
+    cursor.execute("SET DateStyle = 'ISO, YMD'")
+    cursor.execute("SET extra_float_digits = 3")
+    cursor.close()
+
+
+# ==========================================================
+# 🧪 DATABASE SCRATCH
+# ==========================================================
+def recreate_scratch_database(scratch_url):
+    """Drop + create database scratch, lalu pasang database_schema.sql"""
+    params = parse_dsn(scratch_url)
+    dbname = params.get('dbname')
+    if not dbname:
+        raise RuntimeError("VERIFY_DATABASE_URL harus menyebut nama database")
+
+    admin = psycopg2.connect(make_dsn(scratch_url, dbname='postgres'))
+    admin.autocommit = True
+    cursor = admin.cursor()
+    cursor.execute(sql.SQL("DROP DATABASE IF EXISTS {}").format(sql.Identifier(dbname)))
+    cursor.execute(sql.SQL("CREATE DATABASE {}").format(sql.Identifier(dbname)))
+    cursor.close()
+    admin.close()
+
+    schema_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'database_schema.sql')
+    with open(schema_file, 'r', encoding='utf-8') as f:
+        schema_sql = f.read()
+    conn = psycopg2.connect(scratch_url)
+    cursor = conn.cursor()
+    cursor.execute(schema_sql)
+    conn.commit()
+    cursor.close()
+    conn.close()
+
+
+def remove_backup(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    else:
+        os.remove(path)
+        manifest_path = sidecar_manifest_path(path)
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+
+
+def backup_size(path):
+    """(jumlah baris, byte mentah) dari manifest backup"""
+    if os.path.isdir(path):
+        with open(os.path.join(path, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        return (sum(t["rows"] for t in manifest["tables"]),
+                sum(t["bytes"] for t in manifest["tables"]))
+    with open(sidecar_manifest_path(path), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    return sum(t["rows"] for t in manifest["tables"]), manifest["bytes"]
+
+
+def throughput(seconds, rows, size):
+    seconds = max(seconds, 1e-6)
+    return {
+        "seconds": round(seconds, 3),
+        "rows": rows,
+        "bytes": size,
+        "rows_per_s": round(rows / seconds, 1),
+        "mb_per_s": round(size / 1024 / 1024 / seconds, 2),
+    }
+
+
+# ==========================================================
+# 🔍 PERBANDINGAN ISI TABEL
+# ==========================================================
+def table_fingerprint(cursor, table, columns):
+    """Jumlah baris + hash md5 per kolom, diurutkan berdasarkan id"""
+    hashes = ', '.join(
+        f"md5(string_agg(COALESCE(md5({col}::text), 'null'), ',' ORDER BY id))"
+        for col in columns
+    )
+    cursor.execute(f"SELECT COUNT(*), {hashes} FROM {table}")
+    row = cursor.fetchone()
+    return row[0], dict(zip(columns, row[1:]))
+
+
+def column_differences(src_conn, dst_conn, table, column, limit=SAMPLE_LIMIT):
+    """
+    Cari contoh id yang nilainya beda di satu kolom: stream (id, md5)
+    dari kedua sisi berurutan lalu merge, berhenti setelah `limit` contoh.
+    """
+    query = f"SELECT id, md5({column}::text) FROM {table} ORDER BY id"
+    src = src_conn.cursor(name=f"verify_src_{table}_{column}")
+    dst = dst_conn.cursor(name=f"verify_dst_{table}_{column}")
+    src.execute(query)
+    dst.execute(query)
+
+    samples = []
+    a = src.fetchone()
+    b = dst.fetchone()
+    while (a or b) and len(samples) < limit:
+        if b is None or (a is not None and a[0] < b[0]):
+            samples.append({"id": a[0], "issue": "hilang di restore"})
+            a = src.fetchone()
+        elif a is None or b[0] < a[0]:
+            samples.append({"id": b[0], "issue": "tidak ada di sumber"})
+            b = dst.fetchone()
+        else:
+            if a[1] != b[1]:
+                samples.append({"id": a[0], "issue": "nilai beda"})
+            a = src.fetchone()
+            b = dst.fetchone()
+
+    src.close()
+    dst.close()
+    return samples
+
+
+def compare_tables(src_conn, dst_conn, tables):
+    src = src_conn.cursor()
+    dst = dst_conn.cursor()
+    results = []
+    for table in tables:
+        columns = get_table_columns(src_conn, table)
+        src_rows, src_hashes = table_fingerprint(src, table, columns)
+        dst_rows, dst_hashes = table_fingerprint(dst, table, columns)
+        mismatched = [col for col in columns if src_hashes[col] != dst_hashes.get(col)]
+        results.append({
+            "table": table,
+            "source_rows": src_rows,
+            "restored_rows": dst_rows,
+            "ok": src_rows == dst_rows and not mismatched,
+            "columns": {
+                col: column_differences(src_conn, dst_conn, table, col)
+                for col in mismatched
+            },
+        })
+    src.close()
+    dst.close()
+    return results
+
+
+def verify_backup(fmt='sql', compression='none', jobs=4, scratch_url=DEFAULT_SCRATCH_URL,
+                  keep=False, json_out=None):
+    """Export → restore ke scratch → bandingkan. Return True kalau identik."""
+    db_url = get_database_url()
+    if parse_dsn(scratch_url) == parse_dsn(db_url):
+        print("❌ ERROR: VERIFY_DATABASE_URL sama dengan DATABASE_URL!")
+        sys.exit(1)
+
+    print(f"🧪 Verifikasi backup (format {fmt}, kompresi {compression}, {jobs} worker)")
+    print(f"📍 Sumber: {db_url.split('@')[1] if '@' in db_url else 'local'}")
+    print(f"📍 Scratch: {scratch_url.split('@')[1] if '@' in scratch_url else scratch_url}")
+    print()
+
+    # Transaksi sumber dipegang sampai perbandingan selesai; export
+    # menempel ke snapshot yang sama
+    src_conn = open_snapshot_connection(db_url)
+    prepare_session(src_conn)
+    snapshot = export_snapshot(src_conn)
+
+    backup_path = None
+    try:
+        started = time.perf_counter()
+        if fmt == 'sql':
+            backup_path = export_database(compression=compression, snapshot=snapshot)
+        else:
+            backup_path = export_database_copy(fmt=fmt, jobs=jobs, compression=compression, snapshot=snapshot)
+        rows, size = backup_size(backup_path)
+        export_stats = throughput(time.perf_counter() - started, rows, size)
+
+        print("🧪 Menyiapkan database scratch...")
+        recreate_scratch_database(scratch_url)
+
+        started = time.perf_counter()
+        import_database([backup_path], assume_yes=True, jobs=jobs, db_url=scratch_url)
+        restore_stats = throughput(time.perf_counter() - started, rows, size)
+
+        print("🔍 Membandingkan isi tabel...")
+        dst_conn = psycopg2.connect(scratch_url)
+        dst_conn.set_session(readonly=True)
+        prepare_session(dst_conn)
+        tables = compare_tables(src_conn, dst_conn, TABLES)
+        dst_conn.close()
+    finally:
+        src_conn.close()
+        if backup_path and not keep:
+            remove_backup(backup_path)
+
+    ok = all(t["ok"] for t in tables)
+    result = {
+        "format": fmt,
+        "compression": compression,
+        "jobs": jobs,
+        "ok": ok,
+        "export": export_stats,
+        "restore": restore_stats,
+        "tables": tables,
+    }
+    if json_out:
+        with open(json_out, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2, default=str)
+
+    # Summary
+    print()
+    print("=" * 60)
+    print("✅ BACKUP IDENTIK DENGAN SUMBER" if ok else "❌ BACKUP TIDAK IDENTIK!")
+    print("=" * 60)
+    for t in tables:
+        icon = "✅" if t["ok"] else "❌"
+        print(f"{icon} {t['table']}: {t['source_rows']} → {t['restored_rows']} rows")
+        for col, samples in t["columns"].items():
+            detail = ', '.join(f"id {s['id']} ({s['issue']})" for s in samples)
+            print(f"   ↳ kolom {col}: {detail or 'urutan/isi beda'}")
+    for label, stats in (("Export", export_stats), ("Restore", restore_stats)):
+        print(f"⏱️  {label}: {stats['seconds']}s, {stats['rows_per_s']:.0f} rows/s, {stats['mb_per_s']} MB/s")
+    if keep:
+        print(f"📁 Backup disimpan: {backup_path}")
+    print()
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Verifikasi round-trip export/import + benchmark throughput")
+    parser.add_argument("--format", choices=["sql"] + list(COPY_FORMATS), default="sql")
+    parser.add_argument("--compress", choices=list(COMPRESSIONS), default="none")
+    parser.add_argument("--jobs", type=int, default=4, help="Worker paralel untuk export/restore COPY")
+    parser.add_argument("--scratch-url", default=os.getenv('VERIFY_DATABASE_URL', DEFAULT_SCRATCH_URL),
+                        help="Database scratch (akan di-drop dan dibuat ulang)")
+    parser.add_argument("--keep", action="store_true", help="Jangan hapus file backup setelah verifikasi")
+    parser.add_argument("--json", dest="json_out", help="Tulis hasil (termasuk throughput) ke file JSON")
+    args = parser.parse_args()
+
+    ok = verify_backup(args.format, args.compress, args.jobs, args.scratch_url, args.keep, args.json_out)
+    sys.exit(0 if ok else 1)
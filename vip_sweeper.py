@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+VIP Expiry Sweeper Dramamu
+==========================
+Turunkan user VIP yang `vip_expires_at`-nya sudah lewat dengan UPDATE
+set-based per chunk (pakai partial index idx_users_vip_expires), lalu
+kabari listener (invalidasi cache VIP, antrian notifikasi expired).
+
+Usage:
+    python vip_sweeper.py                 # sekali jalan
+    python vip_sweeper.py --notify        # + antre notifikasi expired
+    python vip_sweeper.py --loop 300      # jalan terus tiap 5 menit
+"""
+
+import argparse
+import os
+import sys
+import time
+from typing import Callable, List
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+DEFAULT_CHUNK_SIZE = 5000
+
+# Listener dipanggil dengan list telegram_id yang baru saja expired
+_expiry_listeners: List[Callable[[List[int]], None]] = []
+
+
+def register_expiry_listener(listener: Callable[[List[int]], None]):
+    """Daftarkan callback untuk telegram_id yang VIP-nya baru di-expire"""
+    _expiry_listeners.append(listener)
+
+
+def get_database_url():
+    """Get DATABASE_URL dari environment variable"""
+    db_url = os.getenv('DATABASE_URL')
+    if not db_url:
+        print("❌ ERROR: DATABASE_URL tidak ditemukan!")
+        print("   Set environment variable DATABASE_URL terlebih dahulu.")
+        sys.exit(1)
+    return db_url
+
+
+def sweep_expired_vips(conn, chunk_size: int = DEFAULT_CHUNK_SIZE, notify: bool = False) -> List[int]:
+    """
+    Downgrade semua VIP yang sudah expired, `chunk_size` baris per transaksi
+    supaya lock pendek. SKIP LOCKED biar tidak rebutan dengan worker lain.
+    Return list telegram_id yang terdampak.
+    """
+    expired_ids: List[int] = []
+    cur = conn.cursor()
+    try:
+        while True:
+            cur.execute(
+                """WITH expired AS (
+                       SELECT id FROM users
+                       WHERE is_vip AND vip_expires_at < NOW()
+                       ORDER BY vip_expires_at
+                       LIMIT %s
+                       FOR UPDATE SKIP LOCKED
+                   )
+                   UPDATE users u
+                   SET is_vip = FALSE
+                   FROM expired
+                   WHERE u.id = expired.id
+                   RETURNING u.telegram_id;""",
+                (chunk_size,)
+            )
+            chunk = [row[0] for row in cur.fetchall()]
+
+            if chunk and notify:
+                # Antrekan notifikasi; dikirim oleh proses yang membaca activity_logs
+                execute_values(
+                    cur,
+                    "INSERT INTO activity_logs (telegram_id, action, status, created_at) VALUES %s;",
+                    [(telegram_id, "vip_expired", "notice_queued") for telegram_id in chunk],
+                    template="(%s, %s, %s, NOW())",
+                )
+
+            conn.commit()
+            expired_ids.extend(chunk)
+
+            if chunk:
+                for listener in _expiry_listeners:
+                    try:
+                        listener(chunk)
+                    except Exception as e:
+                        print(f"Error di listener VIP expiry: {e}")
+
+            if len(chunk) < chunk_size:
+                break
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+    return expired_ids
+
+
+def run_sweep(db_url: str, chunk_size: int = DEFAULT_CHUNK_SIZE, notify: bool = False) -> List[int]:
+    """Buka koneksi sendiri, sweep, lalu tutup (dipakai CLI & background task)"""
+    conn = psycopg2.connect(db_url)
+    try:
+        return sweep_expired_vips(conn, chunk_size=chunk_size, notify=notify)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Downgrade VIP yang sudah expired")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--notify", action="store_true", help="Antre notifikasi vip_expired di activity_logs")
+    parser.add_argument("--loop", type=int, default=0, metavar="DETIK", help="Ulangi sweep tiap N detik")
+    args = parser.parse_args()
+
+    db_url = get_database_url()
+
+    while True:
+        started = time.perf_counter()
+        try:
+            expired = run_sweep(db_url, chunk_size=args.chunk_size, notify=args.notify)
+            elapsed = time.perf_counter() - started
+            print(f"✅ {len(expired)} VIP expired di-downgrade ({elapsed:.2f}s)")
+        except Exception as e:
+            print(f"❌ ERROR: {e}")
+            if not args.loop:
+                sys.exit(1)
+
+        if not args.loop:
+            break
+        time.sleep(args.loop)